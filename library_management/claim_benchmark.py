@@ -0,0 +1,126 @@
+# Copyright (c) 2026, Vtech Technologies and contributors
+# For license information, please see license.txt
+
+"""Multi-process contention benchmark for copy claiming
+
+A throwaway article is provisioned with a fixed number of copies and
+several worker processes, each with its own database connection, race to
+claim them one transaction at a time. Two strategies can be compared:
+
+- skip-locked: claim_available_books, which skips copies other
+  transactions hold
+- check-then-act: read an Available copy without a lock and save it as
+  Reserved, the way reservations used to claim copies
+
+Every attempt ends as a claim, a clean "none left", or a conflict (a
+rolled-back transaction). Claims are checked against the copies actually
+marked Reserved afterwards, so any copy handed out twice shows up as a
+double claim.
+"""
+
+import multiprocessing
+import time
+
+import frappe
+
+BENCHMARK_ARTICLE_TITLE = '_Claim Benchmark'
+
+def claim_skip_locked(article):
+	from library_management.library_management.doctype.book.book import claim_available_books
+	return bool(claim_available_books(article))
+
+def claim_check_then_act(article):
+	book = frappe.db.get_value('Book', {'article': article, 'status': 'Available'}, 'name')
+	if not book:
+		return False
+
+	book = frappe.get_doc('Book', book)
+	book.status = 'Reserved'
+	book.save(ignore_permissions=True)
+	return True
+
+CLAIM_MODES = {
+	'skip-locked': claim_skip_locked,
+	'check-then-act': claim_check_then_act
+}
+
+def run_claim_worker(args):
+	"""Claim copies in a fresh connection until `attempts` transactions have run"""
+	site, sites_path, article, attempts, mode = args
+	frappe.init(site=site, sites_path=sites_path)
+	frappe.connect()
+
+	claim = CLAIM_MODES[mode]
+	stats = {'claimed': 0, 'none_left': 0, 'conflicts': 0}
+	start = time.monotonic()
+	try:
+		for i in range(attempts):
+			try:
+				stats['claimed' if claim(article) else 'none_left'] += 1
+				frappe.db.commit()
+			except Exception:
+				frappe.db.rollback()
+				stats['conflicts'] += 1
+	finally:
+		stats['seconds'] = time.monotonic() - start
+		frappe.destroy()
+
+	return stats
+
+def make_benchmark_article(copies):
+	from library_management.library_management.doctype.article_new.article_new import provision_book_copies
+
+	article = frappe.get_doc({
+		'doctype': 'Article_New',
+		'title': f"{BENCHMARK_ARTICLE_TITLE} {frappe.generate_hash(length=6)}",
+		'copies_to_create': copies
+	})
+	# The copies are provisioned here, before the race, not by a background
+	# job that could retire or add copies while the workers are claiming
+	article.flags.skip_copy_job = True
+	article.insert(ignore_permissions=True)
+	provision_book_copies(article.name, copies)
+	frappe.db.commit()
+	return article.name
+
+def drop_benchmark_article(article):
+	from library_management.library_management.doctype.book_search_trigram.book_search_trigram import unindex_books
+
+	unindex_books(frappe.get_all('Book', filters={'article': article}, pluck='name'))
+	frappe.db.delete('Book', {'article': article})
+	frappe.db.delete('Article_New', {'name': article})
+	frappe.db.commit()
+
+def benchmark_copy_claims(processes=8, attempts=50, copies=100, mode='skip-locked'):
+	"""Race `processes` workers for `copies` copies and report throughput and conflicts
+
+	Must be called with a connected site. Returns a dict of totals.
+	"""
+	if mode not in CLAIM_MODES:
+		frappe.throw(f"Unknown claim mode {mode}. Use one of: {', '.join(CLAIM_MODES)}")
+
+	site, sites_path = frappe.local.site, frappe.local.sites_path
+	article = make_benchmark_article(copies)
+	try:
+		start = time.monotonic()
+		with multiprocessing.get_context('spawn').Pool(processes) as pool:
+			results = pool.map(run_claim_worker, [(site, sites_path, article, attempts, mode)] * processes)
+		elapsed = time.monotonic() - start
+
+		reserved = frappe.db.count('Book', {'article': article, 'status': 'Reserved'})
+	finally:
+		drop_benchmark_article(article)
+
+	totals = {key: sum(result[key] for result in results) for key in ('claimed', 'none_left', 'conflicts')}
+	total_attempts = processes * attempts
+	totals.update({
+		'mode': mode,
+		'processes': processes,
+		'attempts': total_attempts,
+		'copies': copies,
+		'seconds': elapsed,
+		'claims_per_second': totals['claimed'] / elapsed if elapsed else 0,
+		'conflict_rate': totals['conflicts'] / total_attempts if total_attempts else 0,
+		'double_claims': max(totals['claimed'] - reserved, 0)
+	})
+	return totals
@@ -0,0 +1,107 @@
+# Copyright (c) 2026, Vtech Technologies and contributors
+# For license information, please see license.txt
+
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+@click.command('rebuild-copy-counts')
+@click.option('--article', help='Only rebuild the counters of this article')
+@pass_context
+def rebuild_copy_counts(context, article=None):
+	"""Recount Article_New copy counters from the Book table"""
+	from library_management.library_management.doctype.article_new.article_new import rebuild_copy_counts
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		rebuild_copy_counts(article)
+		frappe.db.commit()
+		click.echo(f"Rebuilt copy counts for {article or 'all articles'}")
+	finally:
+		frappe.destroy()
+
+@click.command('audit-query-plans')
+@click.option('--verbose', is_flag=True, help='Print the full EXPLAIN output of every query')
+@pass_context
+def audit_query_plans(context, verbose=False):
+	"""EXPLAIN the app's hot queries and fail if any of them scans a table without an index"""
+	from library_management.query_audit import audit_hot_queries
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		results = audit_hot_queries()
+	finally:
+		frappe.destroy()
+
+	failed = [result for result in results if result.full_scans]
+	for result in results:
+		status = f"FULL SCAN on {', '.join(result.full_scans)}" if result.full_scans else "ok"
+		click.echo(f"{result.label}: {status}")
+		if verbose:
+			for row in result.plan:
+				click.echo(f"    {row.get('table')}: type={row.get('type')} key={row.get('key')} rows={row.get('rows')}")
+
+	if failed:
+		click.echo(f"{len(failed)} of {len(results)} hot queries fall back to full scans")
+		raise SystemExit(1)
+
+@click.command('reconcile-circulation')
+@click.option('--dry-run', is_flag=True, help='Only report inconsistencies')
+@click.option('--article', help='Only reconcile copies of this article')
+@pass_context
+def reconcile_circulation(context, dry_run=False, article=None):
+	"""Pair issues and returns library-wide and repair what disagrees"""
+	from library_management.reconciler import reconcile_circulation
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		report = reconcile_circulation(repair=not dry_run, article=article)
+		frappe.db.commit()
+	finally:
+		frappe.destroy()
+
+	verb = "Found" if dry_run else "Repaired"
+	click.echo(f"{verb} {len(report.stale_issues)} stale issues")
+	click.echo(f"{verb} {len(report.loans_to_register)} unregistered open loans")
+	click.echo(f"{verb} {len(report.books_to_mark_issued)} copies on loan but not marked Issued")
+	click.echo(f"{verb} {len(report.books_to_release)} copies marked Issued with no open loan")
+	for conflict in report.conflicts:
+		click.echo(f"Needs review: {conflict['issue']} is open but {conflict['book']} is {conflict['book_status']}")
+
+@click.command('benchmark-copy-claims')
+@click.option('--processes', default=8, type=int, help='Concurrent worker processes')
+@click.option('--attempts', default=50, type=int, help='Claim transactions per worker')
+@click.option('--copies', default=100, type=int, help='Copies of the throwaway benchmark article')
+@click.option('--mode', default='skip-locked', type=click.Choice(['skip-locked', 'check-then-act']), help='Claiming strategy to measure')
+@pass_context
+def benchmark_copy_claims(context, processes=8, attempts=50, copies=100, mode='skip-locked'):
+	"""Race worker processes for the copies of one article and report claim throughput and conflicts"""
+	from library_management.claim_benchmark import benchmark_copy_claims
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		result = benchmark_copy_claims(processes, attempts, copies, mode)
+	finally:
+		frappe.destroy()
+
+	click.echo(f"{result['mode']}: {result['processes']} processes, {result['attempts']} attempts, {result['copies']} copies")
+	click.echo(f"Claimed {result['claimed']}, none left {result['none_left']}, conflicts {result['conflicts']} in {result['seconds']:.2f}s")
+	click.echo(f"Throughput {result['claims_per_second']:.1f} claims/s, conflict rate {result['conflict_rate']:.1%}")
+	if result['double_claims']:
+		click.echo(f"{result['double_claims']} copies were claimed more than once")
+		raise SystemExit(1)
+
+commands = [
+	rebuild_copy_counts,
+	audit_query_plans,
+	reconcile_circulation,
+	benchmark_copy_claims
+]
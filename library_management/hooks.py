@@ -133,6 +133,19 @@ app_license = "MIT"
 # 	],
 # }
 
+scheduler_events = {
+	"all": [
+		"library_management.outbox.process_outbox",
+		"library_management.library_management.doctype.reservation_notification.reservation_notification.send_reservation_notifications"
+	],
+	"daily": [
+		"library_management.outbox.purge_processed_events",
+		"library_management.library_management.doctype.library_transaction.library_transaction.accrue_overdue_fines",
+		"library_management.reconciler.run_nightly_reconciliation",
+		"library_management.library_management.doctype.book_reservation.book_reservation.process_expired_reservations"
+	]
+}
+
 # Testing
 # -------
 
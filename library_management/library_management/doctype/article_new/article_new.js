@@ -2,7 +2,24 @@
 // For license information, please see license.txt
 
 frappe.ui.form.on('Article_New', {
-	// refresh: function(frm) {
+	setup: function(frm) {
+		// Progress of the background job that creates book copies
+		frappe.realtime.on('book_copies_progress', function(data) {
+			if (data.article !== frm.doc.name) {
+				return;
+			}
 
-	// }
+			frappe.show_progress(
+				__('Creating Book Copies'),
+				data.created,
+				data.total,
+				__('Created {0} of {1} copies', [data.created, data.total])
+			);
+
+			if (data.created >= data.total) {
+				frappe.hide_progress();
+				frm.reload_doc();
+			}
+		});
+	}
 });
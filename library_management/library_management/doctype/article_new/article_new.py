@@ -1,115 +1,87 @@
 # Copyright (c) 2022, Vtech Technologies and contributors
 # For license information, please see license.txt
 
+import time
+
 import frappe
 from frappe.model.document import Document
 from frappe.utils import flt
 import pymysql
+from library_management.library_management.doctype.book.book import (
+	BOOK_INSERT_BATCH_SIZE,
+	bulk_create_books,
+	reserve_copy_numbers,
+	retire_books
+)
+
+# Copies created per committed chunk by the background copy job
+COPY_JOB_CHUNK_SIZE = 500
+# RQ timeout of one copy job run, and how long a run keeps taking new chunks
+COPY_JOB_TIMEOUT = 300
+COPY_JOB_TIME_BUDGET = 240
+# Failed runs are re-enqueued this many times before giving up
+COPY_JOB_MAX_ATTEMPTS = 3
 
 class Article_New(Document):
 	def validate(self):
 		self.validate_isbn()
-		# Only update copy counts if this is not a new document
-		# For new documents, counts will be updated after book creation
+		# Copy counters and the copy number sequence are maintained in SQL,
+		# so never write back whatever stale values the form happened to load
 		if not self.is_new():
-			self.update_copy_counts()
+			self.load_copy_counts()
 
 	def after_insert(self):
 		"""Create book copies after article is saved"""
 		# Use enqueue to avoid modification timestamp conflicts
-		frappe.enqueue(
-			'library_management.library_management.doctype.article_new.article_new.create_book_copies_async',
-			article_name=self.name,
-			copies_to_create=self.copies_to_create,
-			title=self.title,
-			queue='default',
-			timeout=300
-		)
+		# Callers that provision the copies themselves set flags.skip_copy_job
+		if self.copies_to_create and self.copies_to_create > 0 and not self.flags.skip_copy_job:
+			enqueue_book_copy_job(self.name, self.copies_to_create)
 
 	def on_update(self):
 		"""Handle updates to copy count"""
-		if self.has_value_changed('copies_to_create'):
+		if self.has_value_changed('copies_to_create') and not self.flags.in_insert:
 			# Use enqueue to avoid modification timestamp conflicts
-			frappe.enqueue(
-				'library_management.library_management.doctype.article_new.article_new.manage_book_copies_async',
-				article_name=self.name,
-				required_copies=self.copies_to_create,
-				queue='default',
-				timeout=300
-			)
+			enqueue_book_copy_job(self.name, self.copies_to_create)
 
 	def create_book_copies(self):
 		"""Create initial book copies for the article"""
 		if not self.copies_to_create or self.copies_to_create <= 0:
 			return
 
-		created_copies = 0
-		for copy_num in range(1, self.copies_to_create + 1):
-			try:
-				book_doc = frappe.new_doc('Book')
-				book_doc.article = self.name
-				book_doc.copy_number = copy_num
-				book_doc.status = 'Available'
-				book_doc.condition = 'Good'
-				book_doc.acquisition_date = frappe.utils.today()
-
-				# Generate barcode if not exists
-				if not book_doc.barcode:
-					book_doc.barcode = f"{self.name}-{copy_num:03d}"
-
-				book_doc.save(ignore_permissions=True)
-				created_copies += 1
-			except Exception as e:
-				frappe.log_error(f"Error creating book copy {copy_num}: {str(e)}")
+		try:
+			created_copies = provision_book_copies(self.name, self.copies_to_create)
+		except Exception as e:
+			frappe.log_error(f"Error creating book copies for {self.name}: {str(e)}")
+			created_copies = 0
 
 		if created_copies > 0:
 			frappe.msgprint(f"Created {created_copies} book copies for '{self.title}'")
-			# Update counts after creating copies (without saving)
-			self.update_copy_counts()
+			# Pick up the counters written by the provisioning engine
+			self.load_copy_counts()
 
 	def manage_book_copies(self):
 		"""Manage book copies when copies_to_create changes"""
-		current_copies = frappe.db.count('Book', {'article': self.name})
+		current_copies = get_copy_count(self.name)
 		required_copies = self.copies_to_create or 0
 
 		if required_copies > current_copies:
 			# Create additional copies
-			for copy_num in range(current_copies + 1, required_copies + 1):
-				try:
-					book_doc = frappe.new_doc('Book')
-					book_doc.article = self.name
-					book_doc.copy_number = copy_num
-					book_doc.status = 'Available'
-					book_doc.condition = 'Good'
-					book_doc.barcode = f"{self.name}-{copy_num:03d}"
-					book_doc.save(ignore_permissions=True)
-				except Exception as e:
-					frappe.log_error(f"Error creating additional copy {copy_num}: {str(e)}")
-
-			frappe.msgprint(f"Added {required_copies - current_copies} more copies")
+			try:
+				created_copies = provision_book_copies(self.name, required_copies - current_copies)
+				frappe.msgprint(f"Added {created_copies} more copies")
+			except Exception as e:
+				frappe.log_error(f"Error creating additional copies for {self.name}: {str(e)}")
 		elif required_copies < current_copies:
-			# Remove excess copies (only if they're available)
-			excess_books = frappe.get_all('Book',
-				filters={
-					'article': self.name,
-					'status': 'Available'
-				},
-				fields=['name'],
-				order_by='copy_number desc',
-				limit=(current_copies - required_copies)
-			)
-
-			for book in excess_books:
-				try:
-					frappe.delete_doc('Book', book.name, ignore_permissions=True)
-				except Exception as e:
-					frappe.log_error(f"Error removing excess copy {book.name}: {str(e)}")
-
-			if excess_books:
-				frappe.msgprint(f"Removed {len(excess_books)} excess available copies")
+			# Retire excess copies (only if they're available)
+			try:
+				retired_books = retire_books(self.name, current_copies - required_copies)
+				if retired_books:
+					frappe.msgprint(f"Retired {len(retired_books)} excess available copies")
+			except Exception as e:
+				frappe.log_error(f"Error retiring excess copies of {self.name}: {str(e)}")
 
-		# Update counts (without saving)
-		self.update_copy_counts()
+		# Pick up the counters written by Book deltas (without saving)
+		self.load_copy_counts()
 
 	def validate_isbn(self):
 		"""Validate ISBN format"""
@@ -125,35 +97,12 @@ class Article_New(Document):
 			if len(isbn13_clean) != 13 or not isbn13_clean.isdigit():
 				frappe.throw("Invalid ISBN-13 format")
 
-	def update_copy_counts(self):
-		"""Update total and available copy counts from linked books"""
-		try:
-			# Get all books linked to this article
-			books = frappe.get_all('Book',
-				filters={'article': self.name},
-				fields=['name', 'status'])
-
-			self.total_copies = len(books)
-
-			# Count available and issued books
-			available_count = 0
-			issued_count = 0
-			for book in books:
-				if book.status == 'Available':
-					available_count += 1
-				elif book.status == 'Issued':
-					issued_count += 1
-
-			self.available_copies = available_count
-			self.issued_copies = issued_count
-
-		except (pymysql.err.OperationalError, Exception) as e:
-			# Handle case where article field doesn't exist yet in Book doctype
-			if "Unknown column 'article'" in str(e):
-				frappe.log_error(f"Article field not found in Book: {str(e)}")
-			self.total_copies = 0
-			self.available_copies = 0
-			self.issued_copies = 0
+	def load_copy_counts(self):
+		"""Load the current copy counters and copy number sequence from the database"""
+		counts = frappe.db.get_value('Article_New', self.name,
+			['total_copies', 'available_copies', 'issued_copies', 'last_copy_number'], as_dict=True)
+		if counts:
+			self.update(counts)
 
 	def get_available_books(self):
 		"""Get list of available books for this article"""
@@ -218,9 +167,9 @@ class Article_New(Document):
 
 	@frappe.whitelist()
 	def refresh_copy_counts(self):
-		"""Manually refresh copy counts from linked books"""
-		self.update_copy_counts()
-		self.save(ignore_permissions=True)
+		"""Manually rebuild copy counts from linked books"""
+		rebuild_copy_counts(self.name)
+		self.load_copy_counts()
 		frappe.msgprint(f"Updated: {self.total_copies} total, {self.available_copies} available")
 
 	@frappe.whitelist()
@@ -229,32 +178,21 @@ class Article_New(Document):
 		if not self.copies_to_create or self.copies_to_create <= 0:
 			frappe.throw("Please specify number of copies to create")
 
-		current_copies = frappe.db.count('Book', {'article': self.name})
+		current_copies = get_copy_count(self.name)
 		if current_copies >= self.copies_to_create:
 			frappe.msgprint(f"Already have {current_copies} copies. No additional copies needed.")
 			return
 
 		# Create the copies immediately
-		created_copies = 0
-		for copy_num in range(current_copies + 1, self.copies_to_create + 1):
-			try:
-				book_doc = frappe.new_doc('Book')
-				book_doc.article = self.name
-				book_doc.copy_number = copy_num
-				book_doc.status = 'Available'
-				book_doc.condition = 'Good'
-				book_doc.acquisition_date = frappe.utils.today()
-				book_doc.barcode = f"{self.name}-{copy_num:03d}"
-				book_doc.save(ignore_permissions=True)
-				created_copies += 1
-			except Exception as e:
-				frappe.log_error(f"Error creating book copy {copy_num}: {str(e)}")
-				frappe.throw(f"Error creating copy {copy_num}: {str(e)}")
+		try:
+			created_copies = provision_book_copies(self.name, self.copies_to_create - current_copies)
+		except Exception as e:
+			frappe.log_error(f"Error creating book copies for {self.name}: {str(e)}")
+			frappe.throw(f"Error creating copies: {str(e)}")
 
 		if created_copies > 0:
-			# Update counts
-			self.update_copy_counts()
-			self.save(ignore_permissions=True)
+			# Counters were written by the provisioning engine
+			self.reload()
 			frappe.msgprint(f"Successfully created {created_copies} book copies!")
 		else:
 			frappe.throw("No copies were created due to errors")
@@ -280,95 +218,192 @@ def get_popular_articles(limit=10):
 
 	return popular_articles
 
+def get_copy_count(article_name):
+	"""Number of copies of an article that are still part of the collection"""
+	return frappe.db.count('Book', {'article': article_name, 'status': ['!=', 'Disposed']})
+
+def in_collection(status):
+	"""Whether a copy with this status counts towards total_copies"""
+	return status is not None and status != 'Disposed'
+
+def get_copy_count_delta(old_status, new_status):
+	"""Counter delta for a Book moving from old_status to new_status
+
+	A status of None means the copy does not exist on that side, so
+	(None, status) is an insert and (status, None) is a deletion. Disposed
+	copies stay in tabBook but no longer count as part of the collection.
+	"""
+	total = in_collection(new_status) - in_collection(old_status)
+	available = (new_status == 'Available') - (old_status == 'Available')
+	issued = (new_status == 'Issued') - (old_status == 'Issued')
+	return total, available, issued
+
+def apply_copy_count_delta(article_name, total=0, available=0, issued=0):
+	"""Atomically shift an article's copy counters"""
+	if not article_name or not (total or available or issued):
+		return
+
+	frappe.db.sql("""
+		UPDATE `tabArticle_New`
+		SET total_copies = IFNULL(total_copies, 0) + %(total)s,
+			available_copies = IFNULL(available_copies, 0) + %(available)s,
+			issued_copies = IFNULL(issued_copies, 0) + %(issued)s
+		WHERE name = %(article)s
+	""", {
+		'article': article_name,
+		'total': total,
+		'available': available,
+		'issued': issued
+	})
+
+def apply_status_transition(article_name, old_status, new_status, count=1):
+	"""Apply the counter delta for `count` copies changing status"""
+	total, available, issued = get_copy_count_delta(old_status, new_status)
+	apply_copy_count_delta(article_name, total * count, available * count, issued * count)
+
+def rebuild_copy_counts(article=None):
+	"""Recount copy counters from tabBook, for one article or the whole catalogue"""
+	condition = "WHERE a.name = %(article)s" if article else ""
+	frappe.db.sql(f"""
+		UPDATE `tabArticle_New` a
+		LEFT JOIN (
+			SELECT
+				article,
+				SUM(status != 'Disposed') AS total_copies,
+				SUM(status = 'Available') AS available_copies,
+				SUM(status = 'Issued') AS issued_copies
+			FROM `tabBook`
+			GROUP BY article
+		) b ON b.article = a.name
+		SET a.total_copies = IFNULL(b.total_copies, 0),
+			a.available_copies = IFNULL(b.available_copies, 0),
+			a.issued_copies = IFNULL(b.issued_copies, 0)
+		{condition}
+	""", {'article': article})
+
+def provision_book_copies(article_name, count, batch_size=BOOK_INSERT_BATCH_SIZE):
+	"""Create `count` new book copies for an article in batches
+
+	Copy numbers (and the barcodes derived from them) are reserved from the
+	article's sequence for a whole batch at once, rows are bulk inserted and
+	the article counters are shifted once per batch.
+	Returns the number of copies created.
+	"""
+	created_copies = 0
+	while created_copies < count:
+		batch = min(batch_size, count - created_copies)
+		created = len(bulk_create_books(article_name, reserve_copy_numbers(article_name, batch)))
+		apply_status_transition(article_name, None, 'Available', count=created)
+		created_copies += created
+
+	return created_copies
+
 # Async functions to avoid timestamp conflicts
-def create_book_copies_async(article_name, copies_to_create, title):
+def enqueue_book_copy_job(article_name, required_copies, attempt=0, after_commit=True):
+	"""Queue the chunked copy job that brings an article to `required_copies`"""
+	frappe.enqueue(
+		'library_management.library_management.doctype.article_new.article_new.manage_book_copies_async',
+		article_name=article_name,
+		required_copies=required_copies,
+		attempt=attempt,
+		queue='default',
+		timeout=COPY_JOB_TIMEOUT,
+		enqueue_after_commit=after_commit
+	)
+
+def get_copy_job_checkpoint(article_name):
+	"""Last committed state of the copy job for an article, if one is running"""
+	return frappe.cache().hget('book_copy_job_checkpoint', article_name)
+
+def set_copy_job_checkpoint(article_name, checkpoint):
+	frappe.cache().hset('book_copy_job_checkpoint', article_name, checkpoint)
+
+def clear_copy_job_checkpoint(article_name):
+	frappe.cache().hdel('book_copy_job_checkpoint', article_name)
+
+def publish_copy_job_progress(article_name, checkpoint):
+	"""Push copy job progress to the article form"""
+	to_create = checkpoint['required_copies'] - checkpoint['starting_copies']
+	created = checkpoint['created']
+	frappe.publish_realtime('book_copies_progress', {
+		'article': article_name,
+		'created': created,
+		'total': to_create,
+		'last_copy_number': checkpoint['last_copy_number'],
+		'percent': flt(created * 100.0 / to_create, 1) if to_create > 0 else 100
+	}, doctype='Article_New', docname=article_name)
+
+def create_book_copies_async(article_name, copies_to_create, title=None):
 	"""Create book copies asynchronously"""
 	if not copies_to_create or copies_to_create <= 0:
 		return
 
-	created_copies = 0
-	for copy_num in range(1, copies_to_create + 1):
-		try:
-			book_doc = frappe.new_doc('Book')
-			book_doc.article = article_name
-			book_doc.copy_number = copy_num
-			book_doc.status = 'Available'
-			book_doc.condition = 'Good'
-			book_doc.acquisition_date = frappe.utils.today()
-
-			# Generate barcode
-			book_doc.barcode = f"{article_name}-{copy_num:03d}"
-
-			book_doc.save(ignore_permissions=True)
-			created_copies += 1
-		except Exception as e:
-			frappe.log_error(f"Error creating book copy {copy_num} for {article_name}: {str(e)}")
-
-	if created_copies > 0:
-		# Update article counts
-		try:
-			article_doc = frappe.get_doc('Article_New', article_name)
-			article_doc.update_copy_counts()
-			article_doc.save(ignore_permissions=True)
-			frappe.publish_realtime('msgprint', f"Created {created_copies} book copies for '{title}'")
-		except Exception as e:
-			frappe.log_error(f"Error updating article counts for {article_name}: {str(e)}")
+	manage_book_copies_async(article_name, copies_to_create)
 
-	frappe.db.commit()
+def manage_book_copies_async(article_name, required_copies, attempt=0):
+	"""Manage book copies asynchronously
 
-def manage_book_copies_async(article_name, required_copies):
-	"""Manage book copies asynchronously"""
-	current_copies = frappe.db.count('Book', {'article': article_name})
+	Copies are created in chunks of COPY_JOB_CHUNK_SIZE and every chunk is
+	committed on its own, followed by a checkpoint of the last copy number.
+	When the run nears its timeout, or a chunk fails, the job re-enqueues
+	itself and the next run resumes from the committed copies instead of
+	starting over.
+	"""
+	current_copies = get_copy_count(article_name)
 	required_copies = required_copies or 0
 
-	if required_copies > current_copies:
-		# Create additional copies
-		created_copies = 0
-		for copy_num in range(current_copies + 1, required_copies + 1):
-			try:
-				book_doc = frappe.new_doc('Book')
-				book_doc.article = article_name
-				book_doc.copy_number = copy_num
-				book_doc.status = 'Available'
-				book_doc.condition = 'Good'
-				book_doc.barcode = f"{article_name}-{copy_num:03d}"
-				book_doc.save(ignore_permissions=True)
-				created_copies += 1
-			except Exception as e:
-				frappe.log_error(f"Error creating additional copy {copy_num} for {article_name}: {str(e)}")
+	if required_copies < current_copies:
+		# Retire excess copies (only if they're available)
+		try:
+			retired_books = retire_books(article_name, current_copies - required_copies)
+			if retired_books:
+				frappe.publish_realtime('msgprint', f"Retired {len(retired_books)} excess available copies")
+		except Exception as e:
+			frappe.db.rollback()
+			frappe.log_error(f"Error retiring excess copies of {article_name}: {str(e)}")
 
-		if created_copies > 0:
-			frappe.publish_realtime('msgprint', f"Added {created_copies} more copies")
-
-	elif required_copies < current_copies:
-		# Remove excess copies (only if they're available)
-		excess_books = frappe.get_all('Book',
-			filters={
-				'article': article_name,
-				'status': 'Available'
-			},
-			fields=['name'],
-			order_by='copy_number desc',
-			limit=(current_copies - required_copies)
-		)
-
-		removed_copies = 0
-		for book in excess_books:
-			try:
-				frappe.delete_doc('Book', book.name, ignore_permissions=True)
-				removed_copies += 1
-			except Exception as e:
-				frappe.log_error(f"Error removing excess copy {book.name}: {str(e)}")
+		frappe.db.commit()
+		return
+
+	checkpoint = get_copy_job_checkpoint(article_name)
+	if not checkpoint or checkpoint.get('required_copies') != required_copies:
+		checkpoint = {
+			'required_copies': required_copies,
+			'starting_copies': current_copies,
+			'created': 0,
+			'last_copy_number': None
+		}
+
+	started = time.monotonic()
+	while True:
+		try:
+			# Row lock on the article serialises chunks of overlapping jobs,
+			# so the count below cannot go stale before the chunk is committed
+			frappe.db.sql("SELECT name FROM `tabArticle_New` WHERE name = %s FOR UPDATE", article_name)
+			current_copies = get_copy_count(article_name)
+			chunk = min(COPY_JOB_CHUNK_SIZE, required_copies - current_copies)
+			if chunk <= 0:
+				frappe.db.commit()
+				break
+
+			checkpoint['created'] += provision_book_copies(article_name, chunk)
+			checkpoint['last_copy_number'] = frappe.db.get_value('Article_New', article_name, 'last_copy_number')
+			frappe.db.commit()
+		except Exception as e:
+			frappe.db.rollback()
+			frappe.log_error(f"Error creating copies for {article_name} (attempt {attempt + 1}): {str(e)}")
+			if attempt + 1 < COPY_JOB_MAX_ATTEMPTS:
+				enqueue_book_copy_job(article_name, required_copies, attempt + 1, after_commit=False)
+			return
 
-		if removed_copies > 0:
-			frappe.publish_realtime('msgprint', f"Removed {removed_copies} excess available copies")
+		set_copy_job_checkpoint(article_name, checkpoint)
+		publish_copy_job_progress(article_name, checkpoint)
 
-	# Update article counts
-	try:
-		article_doc = frappe.get_doc('Article_New', article_name)
-		article_doc.update_copy_counts()
-		article_doc.save(ignore_permissions=True)
-	except Exception as e:
-		frappe.log_error(f"Error updating article counts for {article_name}: {str(e)}")
+		if time.monotonic() - started > COPY_JOB_TIME_BUDGET:
+			# Hand the rest over to a fresh run before RQ kills this one
+			enqueue_book_copy_job(article_name, required_copies, attempt, after_commit=False)
+			return
 
-	frappe.db.commit()
+	clear_copy_job_checkpoint(article_name)
+	if checkpoint['created'] > 0:
+		frappe.publish_realtime('msgprint', f"Added {checkpoint['created']} more copies")
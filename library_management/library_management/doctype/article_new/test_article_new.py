@@ -1,8 +1,123 @@
 # Copyright (c) 2022, Vtech Technologies and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 import unittest
+from unittest.mock import patch
+from library_management.library_management.doctype.article_new import article_new
+from library_management.library_management.doctype.article_new.article_new import provision_book_copies
 
 class TestArticle_New(unittest.TestCase):
-	pass
+	def setUp(self):
+		frappe.db.rollback()
+		self.article = frappe.get_doc({
+			"doctype": "Article_New",
+			"title": "_Test Provisioning Article",
+			"copies_to_create": 1
+		}).insert(ignore_permissions=True, ignore_if_duplicate=True)
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_provision_book_copies_in_batches(self):
+		"""Copies are numbered as one sequence across batches and counted once per batch"""
+		existing = frappe.db.count("Book", {"article": self.article.name})
+
+		created = provision_book_copies(self.article.name, 7, batch_size=3)
+		self.assertEqual(created, 7)
+
+		copy_numbers = frappe.get_all("Book",
+			filters={"article": self.article.name},
+			pluck="copy_number", order_by="copy_number")
+		self.assertEqual(len(copy_numbers), existing + 7)
+		self.assertEqual(len(set(copy_numbers)), len(copy_numbers))
+
+		total_copies, available_copies = frappe.db.get_value("Article_New",
+			self.article.name, ["total_copies", "available_copies"])
+		self.assertEqual(total_copies, existing + 7)
+		self.assertEqual(available_copies, existing + 7)
+
+	def test_book_status_changes_shift_counters(self):
+		"""Book inserts, status changes and deletions apply deltas to the article"""
+		def counts():
+			return frappe.db.get_value("Article_New", self.article.name,
+				["total_copies", "available_copies", "issued_copies"])
+
+		provision_book_copies(self.article.name, 1)
+		total, available, issued = counts()
+
+		book = frappe.get_last_doc("Book", filters={"article": self.article.name})
+		book.status = "Issued"
+		book.save(ignore_permissions=True)
+		self.assertEqual(counts(), (total, available - 1, issued + 1))
+
+		book.status = "Maintenance"
+		book.save(ignore_permissions=True)
+		self.assertEqual(counts(), (total, available - 1, issued))
+
+		book.delete(ignore_permissions=True)
+		self.assertEqual(counts(), (total - 1, available - 1, issued))
+
+	def test_reserved_copy_number_ranges_are_disjoint(self):
+		"""Back-to-back reservations never hand out the same copy number"""
+		from library_management.library_management.doctype.book.book import reserve_copy_numbers
+
+		first = reserve_copy_numbers(self.article.name, 5)
+		second = reserve_copy_numbers(self.article.name, 3)
+
+		self.assertEqual(len(first), 5)
+		self.assertEqual(second[0], first[-1] + 1)
+		self.assertEqual(frappe.db.get_value("Article_New", self.article.name, "last_copy_number"), second[-1])
+
+	def test_retire_books_archives_highest_available_copies(self):
+		"""Excess copies are marked Disposed in one pass and leave the counters"""
+		from library_management.library_management.doctype.book.book import retire_books
+
+		provision_book_copies(self.article.name, 4)
+		total = frappe.db.get_value("Article_New", self.article.name, "total_copies")
+
+		retired = retire_books(self.article.name, 2)
+		self.assertEqual(len(retired), 2)
+
+		for book in retired:
+			status, disposal_date = frappe.db.get_value("Book", book, ["status", "disposal_date"])
+			self.assertEqual(status, "Disposed")
+			self.assertIsNotNone(disposal_date)
+
+		self.assertEqual(frappe.db.get_value("Article_New", self.article.name, "total_copies"), total - 2)
+
+	def test_copy_job_resumes_from_checkpoint_after_failure(self):
+		"""A failed chunk keeps the committed ones and the retry picks up from there"""
+		article = self.article.name
+		article_new.clear_copy_job_checkpoint(article)
+		existing = article_new.get_copy_count(article)
+		required = existing + 5
+
+		calls = []
+		def flaky_provision(article_name, count):
+			calls.append(count)
+			if len(calls) == 2:
+				raise Exception("_Test chunk failure")
+			return provision_book_copies(article_name, count)
+
+		with patch.object(article_new, "COPY_JOB_CHUNK_SIZE", 2), \
+				patch.object(article_new, "provision_book_copies", side_effect=flaky_provision), \
+				patch.object(article_new, "enqueue_book_copy_job") as enqueue, \
+				patch.object(frappe.db, "commit"), patch.object(frappe.db, "rollback"):
+			article_new.manage_book_copies_async(article, required)
+
+		self.assertEqual(article_new.get_copy_count(article), existing + 2)
+		self.assertEqual(article_new.get_copy_job_checkpoint(article)["created"], 2)
+		enqueue.assert_called_once_with(article, required, 1, after_commit=False)
+
+		with patch.object(article_new, "COPY_JOB_CHUNK_SIZE", 2), \
+				patch.object(article_new, "enqueue_book_copy_job") as enqueue, \
+				patch.object(frappe.db, "commit"):
+			article_new.manage_book_copies_async(article, required, attempt=1)
+
+		enqueue.assert_not_called()
+		self.assertEqual(article_new.get_copy_count(article), required)
+		self.assertIsNone(article_new.get_copy_job_checkpoint(article))
+
+		copy_numbers = frappe.get_all("Book", filters={"article": article}, pluck="copy_number")
+		self.assertEqual(len(set(copy_numbers)), len(copy_numbers))
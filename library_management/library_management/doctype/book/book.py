@@ -3,14 +3,33 @@
 
 import frappe
 from frappe.model.document import Document
-from frappe.utils import flt
+from frappe.utils import flt, now, today
 import pymysql
+from library_management.library_management.doctype.book_search_trigram.book_search_trigram import (
+	index_books,
+	unindex_books
+)
+
+# Number of Book rows written per INSERT when provisioning copies in bulk
+BOOK_INSERT_BATCH_SIZE = 500
+# Redis hash of a token per article that changes whenever any of its copies changes
+AVAILABILITY_VERSION_CACHE_KEY = 'article_availability_version'
 
 class Book(Document):
+	def before_insert(self):
+		"""Take the copy number from the article's sequence before naming"""
+		if not self.copy_number:
+			self.copy_number = reserve_copy_numbers(self.article)[0]
+		else:
+			# Keep the sequence ahead of manually numbered copies
+			advance_copy_sequence(self.article, self.copy_number)
+
+		if not self.barcode:
+			self.barcode = make_copy_barcode(self.article, self.copy_number)
+
 	def validate(self):
 		self.validate_copy_number()
 		self.validate_barcode()
-		self.update_article_counts()
 
 	def validate_copy_number(self):
 		"""Validate copy number is unique within the article"""
@@ -34,28 +53,51 @@ class Book(Document):
 				frappe.throw(f"Barcode {self.barcode} already exists")
 
 	def update_article_counts(self):
-		"""Update parent article's copy counts"""
-		if self.article:
-			try:
-				article_doc = frappe.get_doc('Article_New', self.article)
-				article_doc.update_copy_counts()
-				article_doc.save(ignore_permissions=True)
-			except Exception as e:
-				frappe.log_error(f"Error updating article counts: {str(e)}")
+		"""Apply this copy's status change to the parent article's counters"""
+		from library_management.library_management.doctype.article_new.article_new import apply_status_transition
+
+		before = self.get_doc_before_save()
+		if not before:
+			return
+
+		if before.article != self.article:
+			apply_status_transition(before.article, before.status, None)
+			apply_status_transition(self.article, None, self.status)
+		elif before.status != self.status:
+			apply_status_transition(self.article, before.status, self.status)
+
+	def after_insert(self):
+		"""Count the new copy on its article"""
+		from library_management.library_management.doctype.article_new.article_new import apply_status_transition
+
+		apply_status_transition(self.article, None, self.status)
+		index_books([(self.name, self.barcode)])
+		bump_availability_version([self.article])
 
 	def on_update(self):
 		"""Update article copy counts when book is updated"""
 		self.update_article_counts()
+		self.clear_barcode_cache()
+
+		before = self.get_doc_before_save()
+		if before and before.barcode != self.barcode:
+			index_books([(self.name, self.barcode)])
+
+		bump_availability_version([self.article, before and before.article])
 
 	def on_trash(self):
 		"""Update article copy counts when book is deleted"""
-		if self.article:
-			try:
-				article_doc = frappe.get_doc('Article_New', self.article)
-				article_doc.update_copy_counts()
-				article_doc.save(ignore_permissions=True)
-			except Exception as e:
-				frappe.log_error(f"Error updating article counts on deletion: {str(e)}")
+		from library_management.library_management.doctype.article_new.article_new import apply_status_transition
+
+		apply_status_transition(self.article, self.status, None)
+		self.clear_barcode_cache()
+		unindex_books([self.name])
+		bump_availability_version([self.article])
+
+	def clear_barcode_cache(self):
+		"""Drop cached barcode resolutions for this copy"""
+		before = self.get_doc_before_save()
+		clear_barcode_cache([self.barcode, before and before.barcode])
 
 	def is_available_for_issue(self):
 		"""Check if this specific book copy is available for issue"""
@@ -77,15 +119,11 @@ class Book(Document):
 	def get_current_issuer(self):
 		"""Get current member who has issued this book"""
 		if self.status == "Issued":
-			try:
-				transaction = frappe.db.get_value('Library Transaction', {
-					'book': self.name,
-					'status': 'Issued',
-					'returned': 0
-				}, ['library_member', 'date'])
-				return transaction
-			except Exception as e:
-				frappe.log_error(f"Error getting current issuer: {str(e)}")
+			from library_management.library_management.doctype.open_loan.open_loan import get_open_loan
+
+			loan = get_open_loan(self.name)
+			if loan:
+				return loan.library_member, loan.issue_date
 		return None
 
 	@frappe.whitelist()
@@ -114,6 +152,10 @@ class Book(Document):
 			frappe.msgprint(f"Book {self.name} marked as available")
 
 
+def on_doctype_update():
+	# Copies of an article in a given status
+	frappe.db.add_index('Book', ['article', 'status'])
+
 def get_books_by_article(article, status=None):
 	"""Get all book copies for a specific article"""
 	filters = {'article': article}
@@ -131,11 +173,283 @@ def get_available_books_for_article(article):
 	return get_books_by_article(article, 'Available')
 
 def get_next_copy_number(article):
-	"""Get the next available copy number for an article"""
-	max_copy = frappe.db.sql("""
-		SELECT MAX(copy_number)
+	"""Get the next available copy number for an article (does not reserve it)"""
+	last_copy_number = frappe.db.get_value('Article_New', article, 'last_copy_number')
+	return (last_copy_number or 0) + 1
+
+def reserve_copy_numbers(article, count=1):
+	"""Atomically reserve `count` consecutive copy numbers for an article
+
+	The article's last_copy_number is advanced in a single UPDATE and the new
+	value read back through LAST_INSERT_ID on the same connection. The row
+	lock taken by the UPDATE is held until commit, so concurrent allocators
+	always receive disjoint ranges. Returns the reserved copy numbers.
+	"""
+	frappe.db.sql("""
+		UPDATE `tabArticle_New`
+		SET last_copy_number = LAST_INSERT_ID(IFNULL(last_copy_number, 0) + %(count)s)
+		WHERE name = %(article)s
+	""", {'article': article, 'count': count})
+
+	last_copy_number = frappe.db.sql("SELECT LAST_INSERT_ID()")[0][0]
+	return range(last_copy_number - count + 1, last_copy_number + 1)
+
+def advance_copy_sequence(article, copy_number):
+	"""Move an article's sequence past a copy number assigned by hand"""
+	frappe.db.sql("""
+		UPDATE `tabArticle_New`
+		SET last_copy_number = GREATEST(IFNULL(last_copy_number, 0), %(copy_number)s)
+		WHERE name = %(article)s
+	""", {'article': article, 'copy_number': copy_number})
+
+def make_copy_barcode(article, copy_number):
+	"""Default barcode for a book copy"""
+	return f"{article}-{copy_number:03d}"
+
+def bulk_create_books(article, copy_numbers, acquisition_date=None):
+	"""Insert book copies for an article without saving them one by one
+
+	Rows are written with a single multi-row INSERT, so Book.validate and its
+	uniqueness probes are skipped: copy_numbers must come from
+	reserve_copy_numbers. Callers must shift the article counters once the
+	batch is in. Returns the names of created books.
+	"""
+	copy_numbers = list(copy_numbers)
+	if not copy_numbers:
+		return []
+
+	barcodes = [make_copy_barcode(article, copy_num) for copy_num in copy_numbers]
+
+	# Generated barcodes are unique per sequence; one lookup per batch
+	# catches clashes with barcodes that were entered by hand
+	taken_barcodes = set(frappe.db.sql_list("""
+		SELECT barcode
 		FROM `tabBook`
-		WHERE article = %s
-	""", [article])
+		WHERE barcode IN %(barcodes)s
+	""", {'barcodes': barcodes}))
+	if taken_barcodes:
+		frappe.log_error(f"Barcodes already in use, copies of {article} created without barcode: {sorted(taken_barcodes)}")
+
+	timestamp = now()
+	user = frappe.session.user
+	acquisition_date = acquisition_date or today()
+
+	fields = ['name', 'creation', 'modified', 'owner', 'modified_by', 'docstatus', 'idx',
+		'article', 'copy_number', 'barcode', 'status', 'condition', 'acquisition_date']
+	values = []
+	for copy_num, barcode in zip(copy_numbers, barcodes):
+		values.append((
+			f"BK-{article}-{copy_num}", timestamp, timestamp, user, user, 0, 0,
+			article, copy_num, None if barcode in taken_barcodes else barcode,
+			'Available', 'Good', acquisition_date
+		))
+
+	frappe.db.bulk_insert('Book', fields, values, chunk_size=BOOK_INSERT_BATCH_SIZE)
+	index_books((row[0], row[9]) for row in values)
+	bump_availability_version([article])
+
+	return [row[0] for row in values]
+
+def get_availability_version(article):
+	"""Current availability version of an article's copies"""
+	return frappe.cache().hget(AVAILABILITY_VERSION_CACHE_KEY, article,
+		generator=lambda: frappe.generate_hash(length=10))
+
+def bump_availability_version(articles):
+	"""Move the availability version of articles whose copies changed
+
+	Bumped again after commit so nothing rendered from uncommitted rows is
+	served under the new version.
+	"""
+	articles = {article for article in articles if article}
+
+	def bump():
+		for article in articles:
+			frappe.cache().hset(AVAILABILITY_VERSION_CACHE_KEY, article, frappe.generate_hash(length=10))
+
+	bump()
+	frappe.db.after_commit.add(bump)
+
+def load_barcode(barcode):
+	"""Exact lookup of a barcode on the unique barcode index"""
+	book = frappe.db.sql("""
+		SELECT name AS book, article, status, copy_number
+		FROM `tabBook`
+		WHERE barcode = %s
+		LIMIT 1
+	""", [barcode], as_dict=True)
+
+	return book[0] if book else None
+
+@frappe.whitelist()
+def resolve_barcode(barcode):
+	"""Resolve a scanned barcode to its book, article, status and copy number"""
+	barcode = (barcode or '').strip()
+	if not barcode:
+		return None
+
+	return frappe.cache().hget('book_barcode', barcode,
+		generator=lambda: load_barcode(barcode))
+
+def clear_barcode_cache(barcodes):
+	"""Invalidate cached resolutions for the given barcodes
+
+	Cleared again after commit so a lookup that cached the uncommitted row
+	in between does not outlive the change.
+	"""
+	barcodes = {barcode for barcode in barcodes if barcode}
+
+	def clear():
+		for barcode in barcodes:
+			frappe.cache().hdel('book_barcode', barcode)
+
+	clear()
+	frappe.db.after_commit.add(clear)
+
+def clear_barcode_cache_for_books(book_names):
+	"""Invalidate cached resolutions for books changed outside of Book.save"""
+	if not book_names:
+		return
+
+	clear_barcode_cache(frappe.db.sql_list("""
+		SELECT barcode
+		FROM `tabBook`
+		WHERE name IN %(books)s AND barcode IS NOT NULL
+	""", {'books': list(book_names)}))
+
+def retire_books(article, count, delete=False):
+	"""Retire up to `count` Available copies of an article, highest copy numbers first
+
+	By default the copies are archived: one UPDATE marks them Disposed and
+	stamps disposal_date, keeping circulation history intact. With
+	delete=True only copies that never circulated are removed, in one
+	DELETE. Article counters are shifted once for the whole set; callers
+	get back the names of the retired books.
+	"""
+	if not count or count <= 0:
+		return []
+
+	never_circulated = """
+		AND NOT EXISTS (SELECT 1 FROM `tabLibrary Transaction` lt WHERE lt.book = b.name)
+		AND NOT EXISTS (SELECT 1 FROM `tabBook Reservation` br WHERE br.selected_book = b.name)
+	""" if delete else ""
+
+	books = frappe.db.sql_list(f"""
+		SELECT b.name
+		FROM `tabBook` b
+		WHERE b.article = %(article)s AND b.status = 'Available'
+		{never_circulated}
+		ORDER BY b.copy_number DESC
+		LIMIT %(count)s
+		FOR UPDATE
+	""", {'article': article, 'count': count})
+
+	if not books:
+		return []
+
+	clear_barcode_cache_for_books(books)
+
+	if delete:
+		frappe.db.sql("""
+			DELETE FROM `tabBook`
+			WHERE name IN %(books)s
+		""", {'books': books})
+		unindex_books(books)
+	else:
+		frappe.db.sql("""
+			UPDATE `tabBook`
+			SET status = 'Disposed', disposal_date = %(disposal_date)s,
+				modified = %(modified)s, modified_by = %(user)s
+			WHERE name IN %(books)s
+		""", {
+			'books': books,
+			'disposal_date': today(),
+			'modified': now(),
+			'user': frappe.session.user
+		})
+
+	from library_management.library_management.doctype.article_new.article_new import apply_status_transition
+	apply_status_transition(article, 'Available', None, count=len(books))
+	bump_availability_version([article])
+
+	return books
+
+
+def update_books_status(books, status, values=None):
+	"""Move a set of copies to `status` with one UPDATE
+
+	`books` are rows with name, article and the current status, read under a
+	row lock by the caller. Article counters are shifted once per article and
+	previous status, and cached barcode resolutions are dropped.
+	"""
+	if not books:
+		return
+
+	from library_management.library_management.doctype.article_new.article_new import apply_status_transition
+
+	values = dict(values or {})
+	values.update({
+		'status': status,
+		'modified': now(),
+		'modified_by': frappe.session.user
+	})
+	assignments = ", ".join(f"`{field}` = %({field})s" for field in values)
+
+	frappe.db.sql(f"""
+		UPDATE `tabBook`
+		SET {assignments}
+		WHERE name IN %(books)s
+	""", dict(values, books=[book.name for book in books]))
+
+	transitions = {}
+	for book in books:
+		key = (book.article, book.status)
+		transitions[key] = transitions.get(key, 0) + 1
+
+	for (article, old_status), count in transitions.items():
+		apply_status_transition(article, old_status, status, count=count)
+
+	clear_barcode_cache_for_books([book.name for book in books])
+	bump_availability_version(book.article for book in books)
+
+def lock_books(book_names):
+	"""Read copies with a row lock, for status changes outside of Book.save"""
+	if not book_names:
+		return []
+
+	return frappe.db.sql("""
+		SELECT name, article, status, copy_number, barcode
+		FROM `tabBook`
+		WHERE name IN %(books)s
+		FOR UPDATE
+	""", {'books': list(book_names)}, as_dict=True)
+
+def claim_available_books(article, count=1, status='Reserved', preferred=None):
+	"""Move up to `count` Available copies of an article to `status`
+
+	Copies another transaction has locked are skipped rather than waited
+	on, so concurrent claims for the same title each get distinct copies
+	and a claim that finds nothing left returns an empty list instead of
+	failing late. `preferred` is tried first when given.
+	"""
+	books = []
+	if preferred:
+		books = frappe.db.sql("""
+			SELECT name, article, status, copy_number, barcode
+			FROM `tabBook`
+			WHERE name = %(book)s AND article = %(article)s AND status = 'Available'
+			FOR UPDATE SKIP LOCKED
+		""", {'book': preferred, 'article': article}, as_dict=True)
+
+	if len(books) < count:
+		books += frappe.db.sql("""
+			SELECT name, article, status, copy_number, barcode
+			FROM `tabBook`
+			WHERE article = %(article)s AND status = 'Available' AND name != %(preferred)s
+			ORDER BY copy_number
+			LIMIT %(count)s
+			FOR UPDATE SKIP LOCKED
+		""", {'article': article, 'preferred': preferred or '', 'count': count - len(books)}, as_dict=True)
 
-	return (max_copy[0][0] or 0) + 1 if max_copy else 1
\ No newline at end of file
+	update_books_status(books, status)
+	return books
@@ -0,0 +1,60 @@
+# Copyright (c) 2026, Vtech Technologies and Contributors
+# See license.txt
+
+import frappe
+import unittest
+from library_management.library_management.doctype.book.book import resolve_barcode
+
+class TestBook(unittest.TestCase):
+	def setUp(self):
+		frappe.db.rollback()
+		from library_management.library_management.doctype.article_new.article_new import provision_book_copies
+
+		article = frappe.get_doc({
+			"doctype": "Article_New",
+			"title": "_Test Barcode Article",
+			"copies_to_create": 1
+		}).insert(ignore_permissions=True)
+		provision_book_copies(article.name, 1)
+		self.book = frappe.get_last_doc("Book", filters={"article": article.name})
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_barcode_resolution_follows_barcode_changes(self):
+		"""Cached resolutions are dropped when a barcode is changed or cleared"""
+		old_barcode = self.book.barcode
+		self.assertEqual(resolve_barcode(old_barcode).book, self.book.name)
+
+		# A miss is cached too, and must not hide the barcode once it is assigned
+		new_barcode = f"_TEST-{frappe.generate_hash(length=8)}"
+		self.assertIsNone(resolve_barcode(new_barcode))
+
+		self.book.barcode = new_barcode
+		self.book.save(ignore_permissions=True)
+		self.assertIsNone(resolve_barcode(old_barcode))
+		self.assertEqual(resolve_barcode(new_barcode).book, self.book.name)
+
+		self.book.barcode = None
+		self.book.save(ignore_permissions=True)
+		self.assertIsNone(resolve_barcode(new_barcode))
+
+	def test_barcode_resolution_follows_status_changes(self):
+		"""A cached resolution reports the copy's current status"""
+		self.assertEqual(resolve_barcode(self.book.barcode).status, "Available")
+
+		self.book.status = "Maintenance"
+		self.book.save(ignore_permissions=True)
+		self.assertEqual(resolve_barcode(self.book.barcode).status, "Maintenance")
+
+	def test_barcode_resolution_is_cleared_again_after_commit(self):
+		"""A resolution cached before the change commits is dropped once it does"""
+		barcode = self.book.barcode
+		self.book.status = "Maintenance"
+		self.book.save(ignore_permissions=True)
+
+		# Another request resolves the barcode before this transaction commits
+		frappe.cache().hset("book_barcode", barcode, frappe._dict(book=self.book.name, status="Available"))
+
+		frappe.db.after_commit.run()
+		self.assertEqual(resolve_barcode(barcode).status, "Maintenance")
@@ -49,6 +49,8 @@ frappe.ui.form.on('Book Reservation', {
 		if (frm.doc.docstatus === 1 && frm.doc.name) {
 			show_workflow_status(frm);
 		}
+
+		render_available_books_list(frm, (frm.doc.__onload || {}).available_books_list);
 	},
 
 	setup: function(frm) {
@@ -77,11 +79,40 @@ frappe.ui.form.on('Book Reservation', {
 			frm.set_value('selected_book', '');
 		}
 		// Refresh available books list and book field
-		frm.refresh_field('available_books_list');
+		load_available_books_list(frm);
 		frm.refresh_field('selected_book');
 	}
 });
 
+function load_available_books_list(frm) {
+	if (!frm.doc.article) {
+		render_available_books_list(frm, '');
+		return;
+	}
+
+	frappe.call({
+		method: 'library_management.library_management.doctype.book_reservation.book_reservation.get_available_books_panel',
+		args: {
+			article: frm.doc.article
+		},
+		callback: function(r) {
+			render_available_books_list(frm, r.message || '');
+		}
+	});
+}
+
+function render_available_books_list(frm, html) {
+	let wrapper = frm.get_field('available_books_list').$wrapper;
+	wrapper.html(frm.doc.article ? (html || '') : '');
+
+	// Select buttons in the cached panel pick the copy for this form
+	wrapper.off('click', '.select-book').on('click', '.select-book', function() {
+		if (frm.doc.docstatus === 0) {
+			frm.set_value('selected_book', $(this).attr('data-book'));
+		}
+	});
+}
+
 function fulfill_reservation(frm) {
 	frappe.confirm(
 		__('Are you sure you want to fulfill this reservation? This will issue the book to the member.'),
@@ -3,7 +3,28 @@
 
 import frappe
 from frappe.model.document import Document
-from frappe.utils import today, add_days, getdate
+from frappe.utils import today, add_days, cint, getdate
+from library_management.library_management.doctype.book.book import (
+	claim_available_books,
+	get_availability_version,
+	lock_books,
+	update_books_status
+)
+from library_management.library_management.doctype.book_search_trigram.book_search_trigram import get_book_search
+from library_management.library_management.doctype.open_loan.open_loan import get_open_loan
+from library_management.library_management.doctype.reservation_notification.reservation_notification import queue_availability_notification
+from library_management.library_management.doctype.library_member_history.library_member_history import (
+	queue_history_entry,
+	queue_history_update
+)
+
+# Redis hash of each article's Active reservations in queue order
+RESERVATION_QUEUE_CACHE_KEY = 'reservation_queue'
+# Redis hash of rendered available-copies panels with the availability version they show
+AVAILABLE_BOOKS_PANEL_CACHE_KEY = 'available_books_panel'
+AVAILABLE_BOOKS_PANEL_TEMPLATE = 'templates/includes/available_books_list.html'
+# Days a member has to collect a copy held for them on return
+PICKUP_WINDOW_DAYS = 3
 
 class BookReservation(Document):
 	def validate(self):
@@ -12,61 +33,20 @@ class BookReservation(Document):
 		self.validate_selected_book()
 		self.set_priority_level()
 		self.set_expiry_date()
-		self.update_available_books_list()
 
 	def validate_selected_book(self):
 		"""Validate selected book belongs to article and is available"""
 		if self.selected_book:
-			book_doc = frappe.get_doc('Book', self.selected_book)
-			if book_doc.article != self.article:
+			book = frappe.db.get_value('Book', self.selected_book, ['article', 'status'], as_dict=True) or frappe._dict()
+			if book.article != self.article:
 				frappe.throw("Selected book does not belong to this article")
-			if book_doc.status != 'Available':
-				frappe.throw(f"Selected book is not available. Current status: {book_doc.status}")
+			# On submit the copy is claimed under a lock instead, see claim_selected_book
+			if self.docstatus == 0 and book.status != 'Available':
+				frappe.throw(f"Selected book is not available. Current status: {book.status}")
 
-	def update_available_books_list(self):
-		"""Update the HTML field with available books"""
-		if not self.article:
-			self.available_books_list = ""
-			return
-
-		available_books = frappe.get_all('Book',
-			filters={
-				'article': self.article,
-				'status': 'Available'
-			},
-			fields=['name', 'copy_number', 'barcode', 'condition', 'location'],
-			order_by='copy_number'
-		)
-
-		if not available_books:
-			self.available_books_list = "<p><em>No copies available for reservation</em></p>"
-			return
-
-		html_content = "<div class='available-books-list'>"
-		html_content += "<h5>Available Copies:</h5>"
-		html_content += "<table class='table table-bordered table-condensed'>"
-		html_content += "<thead><tr><th>Copy #</th><th>Barcode</th><th>Condition</th><th>Location</th><th>Action</th></tr></thead>"
-		html_content += "<tbody>"
-
-		for book in available_books:
-			html_content += f"<tr>"
-			html_content += f"<td>{book.copy_number}</td>"
-			html_content += f"<td>{book.barcode or '-'}</td>"
-			html_content += f"<td>{book.condition}</td>"
-			html_content += f"<td>{book.location or '-'}</td>"
-			html_content += f"<td><button type='button' class='btn btn-xs btn-primary' onclick='selectBook(\"{book.name}\")'>"
-			html_content += f"Select</button></td>"
-			html_content += f"</tr>"
-
-		html_content += "</tbody></table></div>"
-		html_content += """<script>
-			function selectBook(bookName) {
-				cur_frm.set_value('selected_book', bookName);
-				frappe.msgprint('Book copy selected: ' + bookName);
-			}
-		</script>"""
-
-		self.available_books_list = html_content
+	def onload(self):
+		if self.article:
+			self.set_onload('available_books_list', get_available_books_panel(self.article))
 
 	def validate_member_eligibility(self):
 		"""Validate member can make reservations"""
@@ -107,20 +87,22 @@ class BookReservation(Document):
 			frappe.throw(error_msg)
 
 		# Check for outstanding fines
-		outstanding_fines = frappe.db.sql("""
-			SELECT SUM(fine_amount)
-			FROM `tabLibrary Transaction`
-			WHERE library_member = %s AND fine_amount > 0 AND docstatus = 1
-		""", [self.member])
+		outstanding_fines = getattr(member, 'outstanding_fines', 0)
+		if outstanding_fines and outstanding_fines > 0:
+			frappe.msgprint(f"Member has outstanding fines of {outstanding_fines}")
 
-		if outstanding_fines[0][0] and outstanding_fines[0][0] > 0:
-			frappe.msgprint(f"Member has outstanding fines of {outstanding_fines[0][0]}")
+		accrued_fines = getattr(member, 'accrued_fines', 0)
+		if accrued_fines and accrued_fines > 0:
+			frappe.msgprint(f"Member has {accrued_fines} in fines accruing on overdue loans")
 
 	def validate_duplicate_reservation(self):
 		"""Prevent duplicate active reservations"""
 		if not self.is_new():
 			return
 
+		# Serialise a member's concurrent reservations on their member row
+		frappe.db.sql("SELECT name FROM `tabLibrary Member` WHERE name = %s FOR UPDATE", [self.member])
+
 		existing_reservation = frappe.db.exists('Book Reservation', {
 			'article': self.article,
 			'member': self.member,
@@ -151,9 +133,10 @@ class BookReservation(Document):
 
 	def on_submit(self):
 		"""Actions after submitting reservation"""
+		clear_reservation_queue_cache([self.article])
+		self.claim_selected_book()
 		self.check_article_availability()
 		self.create_reservation_history()
-		self.update_book_status_if_selected()
 
 	def check_article_availability(self):
 		"""Check if article has available copies"""
@@ -161,87 +144,36 @@ class BookReservation(Document):
 
 		if article.is_available_for_issue():
 			# Article has available copies, notify member immediately
-			self.send_availability_notification()
+			self.queue_availability_notification()
 		else:
 			# Article not available, add to queue
 			queue_position = self.get_queue_position()
 			if queue_position <= 1:
 				frappe.msgprint(f"You are next in queue for '{self.article_title}'")
 
-	def send_availability_notification(self):
-		"""Send notification when article becomes available"""
+	def queue_availability_notification(self):
+		"""Queue the availability email; a worker sends it and sets notification_sent"""
 		if self.notification_sent:
 			return
 
-		try:
-			member = frappe.get_doc("Library Member", self.member)
-			member_email = getattr(member, 'email_address', None) or getattr(member, 'email_id', None)
-
-			if member_email:
-				frappe.sendmail(
-					recipients=[member_email],
-					subject=f"Article Available for Pickup: {self.article_title}",
-					message=f"""
-					Dear {getattr(member, 'full_name', member.name)},
-
-					The article "{self.article_title}" by {self.author} that you reserved is now available for pickup.
-
-					Please visit the library within 3 days to collect a copy.
-					After this period, the reservation will expire and the article will be available to the next person in queue.
-
-					Best regards,
-					Library Management System
-					""",
-					reference_doctype=self.doctype,
-					reference_name=self.name
-				)
-
-				self.notification_sent = 1
-				self.notified_date = today()
-				self.save(ignore_permissions=True)
-		except Exception as e:
-			frappe.log_error(f"Error sending availability notification: {str(e)}")
+		queue_availability_notification(self.name, self.member, self.article)
 
 	def get_queue_position(self):
 		"""Get position in reservation queue"""
-		reservations_ahead = frappe.db.count('Book Reservation', {
-			'article': self.article,
-			'status': 'Active',
-			'reservation_date': ['<', self.reservation_date],
-			'priority_level': ['>=', self.priority_level],
-			'docstatus': 1
-		})
-
-		# Also count higher priority reservations made after this one
-		higher_priority = frappe.db.count('Book Reservation', {
-			'article': self.article,
-			'status': 'Active',
-			'priority_level': ['>', self.priority_level],
-			'docstatus': 1
-		})
-
-		return reservations_ahead + higher_priority + 1
+		key = queue_sort_key(self)
+		return 1 + sum(1 for entry in get_reservation_queue_entries(self.article)
+			if entry.name != self.name and queue_sort_key(entry) < key)
 
 	def create_reservation_history(self):
-		"""Create or update member history record for reservation"""
+		"""Queue the reservation line in member history, written once before commit"""
 		try:
-			# Check if history record exists
-			history_name = frappe.db.get_value('Library Member History',
-				{'member_name': self.member}, 'name')
-
-			if history_name:
-				history_doc = frappe.get_doc('Library Member History', history_name)
-			else:
-				history_doc = frappe.new_doc('Library Member History')
-				history_doc.member_name = self.member
-
 			# Get copy number if book is selected
 			copy_number = None
 			if self.selected_book:
 				copy_number = frappe.db.get_value('Book', self.selected_book, 'copy_number')
 
 			# Add reservation to history
-			history_doc.append("transaction_history", {
+			queue_history_entry(self.member, {
 				"transaction_type": "Reservation",
 				"article": self.article,
 				"article_title": self.article_title,
@@ -254,21 +186,25 @@ class BookReservation(Document):
 				"fine_amount": 0
 			})
 
-			history_doc.save(ignore_permissions=True)
-
 		except Exception as e:
 			frappe.log_error(f"Error creating reservation history: {str(e)}")
 
-	def update_book_status_if_selected(self):
-		"""Update book status to Reserved if a specific book is selected"""
-		if self.selected_book:
-			try:
-				book_doc = frappe.get_doc('Book', self.selected_book)
-				book_doc.status = 'Reserved'
-				book_doc.save(ignore_permissions=True)
-				frappe.msgprint(f"Book {self.selected_book} has been marked as Reserved")
-			except Exception as e:
-				frappe.log_error(f"Error updating book status to Reserved: {str(e)}")
+	def claim_selected_book(self):
+		"""Hold the chosen copy, or another Available copy if it was taken first"""
+		if not self.selected_book:
+			return
+
+		books = claim_available_books(self.article, preferred=self.selected_book)
+		if not books:
+			frappe.msgprint(f"No copies of '{self.article_title}' are left. The reservation has joined the queue")
+			self.db_set('selected_book', None)
+			return
+
+		if books[0].name != self.selected_book:
+			frappe.msgprint(f"Book {self.selected_book} was just taken. Book {books[0].name} is held instead")
+			self.db_set('selected_book', books[0].name)
+		else:
+			frappe.msgprint(f"Book {self.selected_book} has been marked as Reserved")
 
 	@frappe.whitelist()
 	def fulfill_reservation(self):
@@ -287,11 +223,9 @@ class BookReservation(Document):
 		transaction.transaction_type = 'Issue'
 		transaction.date = frappe.utils.now_datetime()
 		transaction.save(ignore_permissions=True)
+		# Submitting the issue marks this reservation Fulfilled
 		transaction.submit()
-
-		self.status = "Fulfilled"
-		self.update_reservation_history_status()
-		self.save()
+		self.reload()
 
 		# Notify next person in queue
 		self.notify_next_in_queue()
@@ -309,14 +243,9 @@ class BookReservation(Document):
 		if not self.selected_book:
 			frappe.throw("No book selected for this reservation")
 
-		# Check if there's an active issue for this book and member
-		issue_transaction = frappe.db.get_value('Library Transaction', {
-			'book': self.selected_book,
-			'library_member': self.member,
-			'transaction_type': 'Issue',
-			'status': 'Issued',
-			'docstatus': 1
-		}, 'name')
+		# Check if the book is on loan to this member
+		loan = get_open_loan(self.selected_book)
+		issue_transaction = loan.issue_transaction if loan and loan.library_member == self.member else None
 
 		if not issue_transaction:
 			# Get all transactions for debugging
@@ -351,29 +280,19 @@ class BookReservation(Document):
 		}
 
 	def update_reservation_history_status(self):
-		"""Update the status of the corresponding reservation entry in history"""
-		try:
-			# Get the history record
-			history_name = frappe.db.get_value('Library Member History',
-				{'member_name': self.member}, 'name')
-
-			if history_name:
-				history_doc = frappe.get_doc('Library Member History', history_name)
-
-				# Find the corresponding reservation entry
-				for row in history_doc.transaction_history:
-					if (row.transaction_type == "Reservation" and
-						row.article == self.article and
-						row.book == self.selected_book and
-						row.status == "Active"):
-						row.status = "Reservation Fulfilled"
-						row.return_date = frappe.utils.now_datetime()
-						break
-
-				history_doc.save(ignore_permissions=True)
-
-		except Exception as e:
-			frappe.log_error(f"Error updating reservation history status: {str(e)}")
+		"""Queue the fulfilment of the corresponding reservation entry in history"""
+		self.queue_reservation_history_status("Reservation Fulfilled")
+
+	def queue_reservation_history_status(self, status):
+		"""Queue a status change of this reservation's active history entry"""
+		queue_history_update(self.member, {
+			"transaction_type": "Reservation",
+			"article": self.article,
+			"status": "Active"
+		}, {
+			"status": status,
+			"return_date": frappe.utils.now_datetime()
+		})
 
 	@frappe.whitelist()
 	def get_available_books(self):
@@ -396,67 +315,44 @@ class BookReservation(Document):
 		if self.status not in ["Active"]:
 			frappe.throw("Can only cancel active reservations")
 
-		# Release the reserved book if one was selected
-		if self.selected_book:
-			try:
-				book_doc = frappe.get_doc('Book', self.selected_book)
-				book_doc.status = 'Available'
-				book_doc.save(ignore_permissions=True)
-			except Exception as e:
-				frappe.log_error(f"Error releasing reserved book: {str(e)}")
-
 		self.status = "Cancelled"
 		self.cancelled_by = frappe.session.user
 		self.cancellation_reason = reason
-		self.update_cancelled_reservation_history()
+		# The copy, history and queue are handled by handle_status_change on save
 		self.save()
 
-		# Notify next person in queue
-		self.notify_next_in_queue()
-
-	def update_cancelled_reservation_history(self):
-		"""Update the status of cancelled reservation in history"""
-		try:
-			# Get the history record
-			history_name = frappe.db.get_value('Library Member History',
-				{'member_name': self.member}, 'name')
-
-			if history_name:
-				history_doc = frappe.get_doc('Library Member History', history_name)
+	def release_selected_book(self):
+		"""Hand the copy this reservation was holding to the next in queue, or back to the shelf"""
+		if not self.selected_book:
+			return
 
-				# Find the corresponding reservation entry
-				for row in history_doc.transaction_history:
-					if (row.transaction_type == "Reservation" and
-						row.article == self.article and
-						row.book == self.selected_book and
-						row.status == "Active"):
-						row.status = "Cancelled"
-						row.return_date = frappe.utils.now_datetime()
-						break
+		# Not caught: the copy must change hands together with the cancellation
+		books = lock_books([self.selected_book])
+		if frappe.db.exists('Book Reservation', {
+			'selected_book': self.selected_book,
+			'status': 'Active',
+			'docstatus': 1,
+			'name': ['!=', self.name]
+		}):
+			# The copy has since gone out and come back for another reservation
+			return
 
-				history_doc.save(ignore_permissions=True)
+		release_books_to_queue([book for book in books if book.status == 'Reserved'])
 
-		except Exception as e:
-			frappe.log_error(f"Error updating cancelled reservation history: {str(e)}")
+	def update_cancelled_reservation_history(self):
+		"""Queue the cancellation of the corresponding reservation entry in history"""
+		self.queue_reservation_history_status("Cancelled")
 
 	def notify_next_in_queue(self):
 		"""Notify next person in reservation queue"""
-		next_reservation = frappe.db.get_value('Book Reservation',
-			filters={
-				'article': self.article,
-				'status': 'Active',
-				'docstatus': 1
-			},
-			fieldname='name',
-			order_by='priority_level desc, reservation_date asc'
-		)
+		next_reservation = get_queue_head(self.article, exclude=self.name)
 
 		if next_reservation:
-			next_res_doc = frappe.get_doc('Book Reservation', next_reservation)
+			next_res_doc = frappe.get_doc('Book Reservation', next_reservation.name)
 			article = frappe.get_doc("Article_New", self.article)
 
 			if article.is_available_for_issue():
-				next_res_doc.send_availability_notification()
+				next_res_doc.queue_availability_notification()
 
 	def before_save(self):
 		"""Handle status changes and validation before saving"""
@@ -464,16 +360,6 @@ class BookReservation(Document):
 		if not self.is_new() and self.docstatus == 1:
 			self.handle_status_change()
 
-		# Check for expiry
-		if self.status == "Active" and self.expiry_date and getdate(today()) > getdate(self.expiry_date):
-			if not self.notification_sent:
-				# Never notified, just expire
-				self.status = "Expired"
-			else:
-				# Was notified but member didn't pick up
-				self.status = "Expired"
-				self.notify_next_in_queue()
-
 	def handle_status_change(self):
 		"""Handle status changes after submission"""
 		if self.has_value_changed('status'):
@@ -482,15 +368,7 @@ class BookReservation(Document):
 
 			# Handle cancellation
 			if new_status == "Cancelled" and old_status != "Cancelled":
-				# Release reserved book if one was selected
-				if self.selected_book:
-					try:
-						book_doc = frappe.get_doc('Book', self.selected_book)
-						if book_doc.status == 'Reserved':
-							book_doc.status = 'Available'
-							book_doc.save(ignore_permissions=True)
-					except Exception as e:
-						frappe.log_error(f"Error releasing reserved book: {str(e)}")
+				self.release_selected_book()
 
 				# Set cancellation info
 				self.cancelled_by = frappe.session.user
@@ -505,56 +383,238 @@ class BookReservation(Document):
 			elif new_status == "Fulfilled" and old_status == "Active":
 				self.update_reservation_history_status()
 
-def process_expired_reservations():
-	"""Process expired reservations (called by scheduler)"""
-	expired_reservations = frappe.get_all('Book Reservation',
-		filters={
-			'status': 'Active',
-			'expiry_date': ['<', today()]
-		},
-		fields=['name']
-	)
+	def on_update_after_submit(self):
+		clear_reservation_queue_cache([self.article])
 
-	for reservation in expired_reservations:
-		doc = frappe.get_doc('Book Reservation', reservation.name)
-		doc.status = "Expired"
-		doc.save()
-		doc.notify_next_in_queue()
+	def on_cancel(self):
+		clear_reservation_queue_cache([self.article])
 
-	if expired_reservations:
-		frappe.db.commit()
+	def on_trash(self):
+		clear_reservation_queue_cache([self.article])
+
+def on_doctype_update():
+	# An article's reservation queue, in queue order
+	frappe.db.add_index('Book Reservation', ['article', 'status', 'priority_level', 'reservation_date'])
+	# Overdue Active reservations for the expiry sweep
+	frappe.db.add_index('Book Reservation', ['status', 'expiry_date'])
+
+@frappe.whitelist()
+def get_available_books_panel(article):
+	"""Available-copies panel of an article, re-rendered only when its availability version moves"""
+	# The cached panel is served without going through get_all's permission checks
+	frappe.has_permission('Book Reservation', 'read', throw=True)
 
-def check_article_availability_for_reservations(article):
-	"""Check if article becomes available and notify reservations"""
-	active_reservations = frappe.get_all('Book Reservation',
+	if not article:
+		return ""
+
+	version = get_availability_version(article)
+	panel = frappe.cache().hget(AVAILABLE_BOOKS_PANEL_CACHE_KEY, article)
+	if panel and panel.get('version') == version:
+		return panel['html']
+
+	books = frappe.get_all('Book',
 		filters={
 			'article': article,
-			'status': 'Active',
-			'docstatus': 1
+			'status': 'Available'
 		},
-		fields=['name'],
-		order_by='priority_level desc, reservation_date asc',
-		limit=1
+		fields=['name', 'copy_number', 'barcode', 'condition', 'location'],
+		order_by='copy_number'
 	)
+	html = frappe.render_template(AVAILABLE_BOOKS_PANEL_TEMPLATE, {'books': books})
+
+	frappe.cache().hset(AVAILABLE_BOOKS_PANEL_CACHE_KEY, article, {'version': version, 'html': html})
+	return html
+
+def load_reservation_queue(article):
+	"""Active reservations of an article in queue order, read on the queue index"""
+	return frappe.db.sql("""
+		SELECT name, member, reservation_date, priority_level
+		FROM `tabBook Reservation`
+		WHERE article = %s AND status = 'Active' AND docstatus = 1
+		ORDER BY priority_level DESC, reservation_date ASC, name ASC
+	""", [article], as_dict=True)
+
+def get_reservation_queue_entries(article):
+	"""Cached queue of an article; rebuilt on the first read after any change"""
+	return [frappe._dict(entry) for entry in frappe.cache().hget(RESERVATION_QUEUE_CACHE_KEY, article,
+		generator=lambda: load_reservation_queue(article))]
+
+def get_queue_head(article, exclude=None):
+	"""Reservation at the front of an article's queue"""
+	for entry in get_reservation_queue_entries(article):
+		if entry.name != exclude:
+			return entry
+	return None
+
+def queue_sort_key(reservation):
+	return (-cint(reservation.priority_level), getdate(reservation.reservation_date), reservation.name or '')
+
+def clear_reservation_queue_cache(articles):
+	"""Drop cached queues now and again once the change is committed"""
+	def clear():
+		for article in set(articles):
+			if article:
+				frappe.cache().hdel(RESERVATION_QUEUE_CACHE_KEY, article)
+
+	clear()
+	frappe.db.after_commit.add(clear)
+
+def process_expired_reservations(as_of=None):
+	"""Expire every overdue Active reservation in one pass
+
+	Runs daily. Overdue reservations are marked Expired with one UPDATE, their
+	member history lines are queued as Cancelled, and the copies they were
+	holding are handed to the next reservation in their article's queue, or
+	go back to Available. The queue head of every other affected article
+	that has copies on the shelf is notified once.
+	"""
+	as_of = getdate(as_of)
+	held_books = frappe.db.sql_list("""
+		SELECT selected_book
+		FROM `tabBook Reservation`
+		WHERE status = 'Active' AND docstatus = 1
+		AND expiry_date < %(as_of)s AND IFNULL(selected_book, '') != ''
+	""", {'as_of': as_of})
+
+	# Copies before reservations, the same lock order as a return
+	books = lock_books(held_books)
+
+	expired = frappe.db.sql("""
+		SELECT name, member, article, selected_book
+		FROM `tabBook Reservation`
+		WHERE status = 'Active' AND docstatus = 1
+		AND expiry_date < %(as_of)s
+		FOR UPDATE
+	""", {'as_of': as_of}, as_dict=True)
+
+	if not expired:
+		frappe.db.commit()
+		return 0
+
+	frappe.db.sql("""
+		UPDATE `tabBook Reservation`
+		SET status = 'Expired', modified = %(modified)s, modified_by = %(user)s
+		WHERE name IN %(reservations)s
+	""", {
+		'reservations': [reservation.name for reservation in expired],
+		'modified': frappe.utils.now(),
+		'user': frappe.session.user
+	})
+
+	held_books = {reservation.selected_book for reservation in expired}
+	if books:
+		# A copy may since have gone out and come back for another reservation
+		held_books -= set(frappe.db.sql_list("""
+			SELECT selected_book
+			FROM `tabBook Reservation`
+			WHERE selected_book IN %(books)s AND status = 'Active' AND docstatus = 1
+		""", {'books': [book.name for book in books]}))
+	released = [book for book in books if book.name in held_books and book.status == 'Reserved']
+	held = set(release_books_to_queue(released))
+
+	articles = {reservation.article for reservation in expired}
+	clear_reservation_queue_cache(articles)
+
+	for reservation in expired:
+		queue_history_update(reservation.member, {
+			"transaction_type": "Reservation",
+			"article": reservation.article,
+			"status": "Active"
+		}, {
+			"status": "Cancelled",
+			"return_date": frappe.utils.now_datetime()
+		})
+
+	# Queues that just had a copy held for them were notified on allocation
+	notify_queue_heads(articles - {book.article for book in released if book.name in held})
+
+	frappe.db.commit()
+	return len(expired)
+
+def notify_queue_heads(articles):
+	"""Notify the front of each article's queue if the article has copies on the shelf"""
+	if not articles:
+		return
+
+	for article in frappe.db.sql_list("""
+		SELECT DISTINCT article
+		FROM `tabBook`
+		WHERE article IN %(articles)s AND status = 'Available'
+	""", {'articles': list(articles)}):
+		head = get_queue_head(article)
+		if head:
+			queue_availability_notification(head.name, head.member, article)
+
+def release_books_to_queue(books):
+	"""Hold copies coming back into circulation for the front of their queues
+
+	`books` are rows with name, article, status and copy_number, read under a
+	row lock by the caller. Each copy goes to the highest-priority Active
+	reservation of its article that has no copy yet: the reservation gets
+	the copy and a fresh pickup window and the copy is marked Reserved.
+	Copies nobody is waiting for go back to Available. Queue rows are locked
+	too, so concurrent returns of the same title hold distinct copies for
+	distinct reservations. Returns the names of the copies that were held.
+	"""
+	if not books:
+		return []
 
-	if active_reservations:
-		reservation_doc = frappe.get_doc('Book Reservation', active_reservations[0].name)
-		reservation_doc.send_availability_notification()
+	waiting = frappe.db.sql("""
+		SELECT name, article, member
+		FROM `tabBook Reservation`
+		WHERE article IN %(articles)s AND status = 'Active' AND docstatus = 1
+		AND IFNULL(selected_book, '') = ''
+		ORDER BY article, priority_level DESC, reservation_date ASC, name ASC
+		FOR UPDATE
+	""", {'articles': list({book.article for book in books})}, as_dict=True)
+
+	queues = {}
+	for reservation in waiting:
+		queues.setdefault(reservation.article, []).append(reservation)
+
+	allocations = []
+	for book in sorted(books, key=lambda book: (book.article, cint(book.copy_number))):
+		queue = queues.get(book.article)
+		if queue:
+			allocations.append((queue.pop(0), book))
+
+	held = {book.name for reservation, book in allocations}
+	update_books_status([book for book in books if book.name in held], 'Reserved')
+	update_books_status([book for book in books if book.name not in held], 'Available')
+
+	if allocations:
+		params = {
+			'reservations': [reservation.name for reservation, book in allocations],
+			'expiry_date': add_days(today(), PICKUP_WINDOW_DAYS),
+			'modified': frappe.utils.now()
+		}
+		cases = []
+		for i, (reservation, book) in enumerate(allocations):
+			params[f'reservation_{i}'] = reservation.name
+			params[f'book_{i}'] = book.name
+			cases.append(f"WHEN %(reservation_{i})s THEN %(book_{i})s")
+
+		frappe.db.sql(f"""
+			UPDATE `tabBook Reservation`
+			SET
+				selected_book = CASE name {' '.join(cases)} END,
+				expiry_date = %(expiry_date)s,
+				notification_sent = 0,
+				notified_date = NULL,
+				modified = %(modified)s
+			WHERE name IN %(reservations)s
+		""", params)
+
+		clear_reservation_queue_cache({book.article for reservation, book in allocations})
+		for reservation, book in allocations:
+			queue_availability_notification(reservation.name, reservation.member, reservation.article)
+
+	return list(held)
 
 @frappe.whitelist()
 def get_reservation_queue(article):
 	"""Get reservation queue for a specific article"""
-	queue = frappe.get_all('Book Reservation',
-		filters={
-			'article': article,
-			'status': 'Active',
-			'docstatus': 1
-		},
-		fields=['member', 'reservation_date', 'priority_level', 'name'],
-		order_by='priority_level desc, reservation_date asc'
-	)
-
-	return queue
+	return get_reservation_queue_entries(article)
 
 @frappe.whitelist()
 def get_available_books_for_reservation(doctype, txt, searchfield, start, page_len, filters):
@@ -569,26 +629,21 @@ def get_available_books_for_reservation(doctype, txt, searchfield, start, page_l
 		# If no article is selected, return empty result
 		return []
 
-	# Build query conditions
-	conditions = ["article = %(article)s"]
 	query_params = {
-		'txt': f"%{txt}%",
 		'article': article,
-		'start': start,
-		'page_len': page_len
+		'start': cint(start),
+		'page_len': cint(page_len)
 	}
+	search_join, search_condition = get_book_search(txt, query_params)
 
 	# Only show available books for new reservations
-	conditions.append("status = 'Available'")
-
-	where_clause = " AND ".join(conditions)
-
 	return frappe.db.sql(f"""
-		SELECT name, copy_number, barcode, status, `condition`
-		FROM `tabBook`
-		WHERE {where_clause}
-		AND (name LIKE %(txt)s OR barcode LIKE %(txt)s)
-		ORDER BY copy_number
+		SELECT b.name, b.copy_number, b.barcode, b.status, b.`condition`
+		FROM `tabBook` b
+		{search_join}
+		WHERE b.article = %(article)s AND b.status = 'Available'
+		AND {search_condition}
+		ORDER BY b.copy_number
 		LIMIT %(start)s, %(page_len)s
 	""", query_params)
 
@@ -664,34 +719,30 @@ def debug_member_article_status(member, article):
 @frappe.whitelist()
 def fix_transaction_status_inconsistencies(member, article):
 	"""Fix data inconsistencies where issue transactions are not marked as returned"""
-	debug_info = debug_member_article_status(member, article)
+	from library_management.reconciler import reconcile_circulation
+
+	frappe.only_for(['Librarian', 'System Manager'])
 
-	if not debug_info.get('orphaned_issues'):
+	if not member or not article:
 		return {
 			'message': 'No data inconsistencies found',
 			'fixed_count': 0
 		}
 
-	fixed_count = 0
-	for orphaned in debug_info['orphaned_issue_details']:
-		try:
-			issue_doc = frappe.get_doc('Library Transaction', orphaned['issue']['name'])
-			issue_doc.status = 'Returned'
-			issue_doc.save(ignore_permissions=True)
-			fixed_count += 1
+	report = reconcile_circulation(article=article, member=member)
+	fixed_count = sum(len(report[key]) for key in
+		('stale_issues', 'loans_to_register', 'books_to_mark_issued', 'books_to_release'))
 
-			frappe.logger().info(f"Fixed issue transaction {issue_doc.name}: status changed from 'Issued' to 'Returned'")
-
-		except Exception as e:
-			frappe.logger().error(f"Error fixing transaction {orphaned['issue']['name']}: {str(e)}")
-
-	if fixed_count > 0:
-		frappe.db.commit()
+	if not fixed_count:
+		return {
+			'message': 'No data inconsistencies found',
+			'fixed_count': 0
+		}
 
 	return {
 		'message': f'Fixed {fixed_count} transaction status inconsistencies',
 		'fixed_count': fixed_count,
-		'total_inconsistencies_found': len(debug_info['orphaned_issue_details'])
+		'total_inconsistencies_found': fixed_count + len(report.conflicts)
 	}
 
 @frappe.whitelist()
@@ -713,13 +764,17 @@ def get_reservation_workflow_status(reservation_name):
 		# Get current book status
 		workflow_status['book_status'] = frappe.db.get_value('Book', reservation.selected_book, 'status')
 
-		# Check for issue transaction
-		issue_transaction = frappe.db.get_value('Library Transaction', {
-			'book': reservation.selected_book,
-			'library_member': reservation.member,
-			'transaction_type': 'Issue',
-			'docstatus': 1
-		}, ['name', 'status'], as_dict=True)
+		# Check for issue transaction, the open loan first
+		loan = get_open_loan(reservation.selected_book)
+		if loan and loan.library_member == reservation.member:
+			issue_transaction = frappe._dict({'name': loan.issue_transaction, 'status': 'Issued'})
+		else:
+			issue_transaction = frappe.db.get_value('Library Transaction', {
+				'book': reservation.selected_book,
+				'library_member': reservation.member,
+				'transaction_type': 'Issue',
+				'docstatus': 1
+			}, ['name', 'status'], as_dict=True)
 
 		if issue_transaction:
 			workflow_status['issue_transaction'] = issue_transaction
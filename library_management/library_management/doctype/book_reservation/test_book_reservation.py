@@ -0,0 +1,209 @@
+# Copyright (c) 2026, Vtech Technologies and Contributors
+# See license.txt
+
+import frappe
+import unittest
+from unittest.mock import patch
+from library_management.library_management.doctype.book_reservation.book_reservation import (
+	PICKUP_WINDOW_DAYS,
+	clear_reservation_queue_cache,
+	get_available_books_panel,
+	get_queue_head,
+	get_reservation_queue,
+	process_expired_reservations
+)
+from library_management.library_management.doctype.library_transaction.test_library_transaction import (
+	make_article,
+	make_member
+)
+
+def make_reservation(article, member, priority_level=5, submit=True):
+	reservation = frappe.get_doc({
+		"doctype": "Book Reservation",
+		"article": article,
+		"member": member,
+		"reservation_date": frappe.utils.today()
+	}).insert(ignore_permissions=True)
+	if submit:
+		reservation.submit()
+	if priority_level != 5:
+		# Priority normally comes from the member's type
+		reservation.db_set("priority_level", priority_level)
+		clear_reservation_queue_cache([article])
+	return reservation
+
+class TestBookReservation(unittest.TestCase):
+	def setUp(self):
+		frappe.db.rollback()
+		self.article = make_article("_Test Reservation Article", copies=0)
+		self.members = [make_member(f"_Test Reserver {i}").name for i in range(3)]
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_queue_follows_priority_then_date(self):
+		"""The cached queue orders by priority and is refreshed on every change"""
+		first = make_reservation(self.article.name, self.members[0])
+		second = make_reservation(self.article.name, self.members[1])
+		priority = make_reservation(self.article.name, self.members[2], priority_level=9)
+
+		queue = [entry.name for entry in get_reservation_queue(self.article.name)]
+		self.assertEqual(queue, [priority.name, first.name, second.name])
+		self.assertEqual(second.get_queue_position(), 3)
+
+		priority.reload()
+		priority.cancel_reservation("_Test")
+		self.assertEqual(get_queue_head(self.article.name).name, first.name)
+		self.assertEqual(second.get_queue_position(), 2)
+
+	def test_available_books_panel_follows_copy_changes(self):
+		"""The cached panel is reused until a copy of the article changes"""
+		from library_management.library_management.doctype.article_new.article_new import provision_book_copies
+
+		provision_book_copies(self.article.name, 2)
+		books = frappe.get_all("Book", filters={"article": self.article.name}, pluck="name")
+
+		panel = get_available_books_panel(self.article.name)
+		self.assertIn(books[0], panel)
+		self.assertEqual(get_available_books_panel(self.article.name), panel)
+
+		book = frappe.get_doc("Book", books[0])
+		book.status = "Maintenance"
+		book.save(ignore_permissions=True)
+
+		panel = get_available_books_panel(self.article.name)
+		self.assertNotIn(books[0], panel)
+		self.assertIn(books[1], panel)
+
+	def test_expiry_sweep_passes_held_copies_on(self):
+		"""Overdue reservations expire together and their copies go to the next in queue"""
+		from library_management.library_management.doctype.article_new.article_new import provision_book_copies
+
+		provision_book_copies(self.article.name, 1)
+		book = frappe.get_all("Book", filters={"article": self.article.name}, pluck="name")[0]
+
+		held = make_reservation(self.article.name, self.members[0])
+		held.db_set({"selected_book": book, "expiry_date": frappe.utils.add_days(frappe.utils.today(), -1)})
+		frappe.db.set_value("Book", book, "status", "Reserved")
+		waiting = make_reservation(self.article.name, self.members[1])
+
+		with patch.object(frappe.db, "commit"):
+			self.assertEqual(process_expired_reservations(), 1)
+
+		self.assertEqual(frappe.db.get_value("Book Reservation", held.name, "status"), "Expired")
+		self.assertEqual(frappe.db.get_value("Book Reservation", waiting.name, ["status", "selected_book"]), ("Active", book))
+		self.assertEqual(frappe.db.get_value("Book", book, "status"), "Reserved")
+		self.assertEqual(get_queue_head(self.article.name).name, waiting.name)
+
+	def test_returned_copy_is_held_for_queue_head(self):
+		"""A return hands the copy to the highest-priority reservation, not the shelf"""
+		from library_management.library_management.doctype.article_new.article_new import provision_book_copies
+		from library_management.library_management.doctype.library_transaction.library_transaction import create_return_transaction
+		from library_management.library_management.doctype.library_transaction.test_library_transaction import make_issue
+
+		provision_book_copies(self.article.name, 1)
+		book = frappe.get_all("Book", filters={"article": self.article.name}, pluck="name")[0]
+		issue = make_issue(self.article.name, book, self.members[0])
+
+		first = make_reservation(self.article.name, self.members[1])
+		priority = make_reservation(self.article.name, self.members[2], priority_level=9)
+
+		create_return_transaction(issue.name).submit()
+
+		self.assertEqual(frappe.db.get_value("Book", book, "status"), "Reserved")
+		selected_book, expiry_date = frappe.db.get_value("Book Reservation", priority.name, ["selected_book", "expiry_date"])
+		self.assertEqual(selected_book, book)
+		self.assertEqual(str(expiry_date), frappe.utils.add_days(frappe.utils.today(), PICKUP_WINDOW_DAYS))
+		self.assertFalse(frappe.db.get_value("Book Reservation", first.name, "selected_book"))
+		self.assertTrue(frappe.db.exists("Reservation Notification", {"reservation": priority.name, "status": "Pending"}))
+
+	def test_taken_copy_is_replaced_or_reservation_queues(self):
+		"""Reservations that picked the same copy each end up with a distinct copy or none"""
+		from library_management.library_management.doctype.article_new.article_new import provision_book_copies
+
+		provision_book_copies(self.article.name, 2)
+		books = frappe.get_all("Book", filters={"article": self.article.name}, pluck="name", order_by="copy_number")
+
+		drafts = [make_reservation(self.article.name, member, submit=False) for member in self.members]
+		for draft in drafts:
+			draft.db_set("selected_book", books[0])
+
+		for draft in drafts:
+			draft.reload()
+			draft.submit()
+
+		selected = [frappe.db.get_value("Book Reservation", draft.name, "selected_book") for draft in drafts]
+		self.assertEqual(selected[:2], books)
+		self.assertFalse(selected[2])
+		self.assertEqual(frappe.get_all("Book", filters={"article": self.article.name}, pluck="status"), ["Reserved", "Reserved"])
+
+	def test_issue_fulfils_hold_and_sweep_keeps_other_holds(self):
+		"""Issuing a held copy fulfils its reservation; stale reservations never release another's copy"""
+		from library_management.library_management.doctype.article_new.article_new import provision_book_copies
+		from library_management.library_management.doctype.library_transaction.test_library_transaction import make_issue
+
+		provision_book_copies(self.article.name, 1)
+		book = frappe.get_all("Book", filters={"article": self.article.name}, pluck="name")[0]
+
+		held = make_reservation(self.article.name, self.members[0], submit=False)
+		held.selected_book = book
+		held.save(ignore_permissions=True)
+		held.submit()
+
+		make_issue(self.article.name, book, self.members[0])
+		self.assertEqual(frappe.db.get_value("Book Reservation", held.name, "status"), "Fulfilled")
+
+		# An older reservation still pointing at the copy expires while another holds it
+		stale = make_reservation(self.article.name, self.members[1])
+		stale.db_set({"selected_book": book, "expiry_date": frappe.utils.add_days(frappe.utils.today(), -1)})
+		holder = make_reservation(self.article.name, self.members[2])
+		holder.db_set("selected_book", book)
+		frappe.db.set_value("Book", book, "status", "Reserved")
+
+		with patch.object(frappe.db, "commit"):
+			process_expired_reservations()
+
+		self.assertEqual(frappe.db.get_value("Book Reservation", stale.name, "status"), "Expired")
+		self.assertEqual(frappe.db.get_value("Book Reservation", holder.name, "selected_book"), book)
+		self.assertEqual(frappe.db.get_value("Book", book, "status"), "Reserved")
+
+	def test_expiry_sweep_records_history_and_notifies_queue_head(self):
+		"""Expired reservations get their history line closed and the next reserver hears of shelf copies"""
+		from library_management.library_management.doctype.article_new.article_new import provision_book_copies
+		from library_management.write_behind import get_dirty_aggregates
+
+		provision_book_copies(self.article.name, 1)
+
+		expired = make_reservation(self.article.name, self.members[0])
+		expired.db_set("expiry_date", frappe.utils.add_days(frappe.utils.today(), -1))
+		waiting = make_reservation(self.article.name, self.members[1])
+		frappe.db.delete("Reservation Notification", {"article": self.article.name})
+
+		with patch.object(frappe.db, "commit"):
+			process_expired_reservations()
+
+		changes = get_dirty_aggregates()["Library Member History"][self.members[0]]
+		self.assertIn(("update",
+			{"transaction_type": "Reservation", "article": self.article.name, "status": "Active"}
+		), [change[:2] for change in changes])
+		self.assertEqual(changes[-1][2]["status"], "Cancelled")
+		self.assertTrue(frappe.db.exists("Reservation Notification", {"reservation": waiting.name, "status": "Pending"}))
+
+	def test_cancelled_hold_goes_to_next_in_queue(self):
+		"""Cancelling a reservation that holds a copy hands the copy to the next reserver"""
+		from library_management.library_management.doctype.article_new.article_new import provision_book_copies
+
+		provision_book_copies(self.article.name, 1)
+		book = frappe.get_all("Book", filters={"article": self.article.name}, pluck="name")[0]
+
+		held = make_reservation(self.article.name, self.members[0], submit=False)
+		held.selected_book = book
+		held.save(ignore_permissions=True)
+		held.submit()
+		waiting = make_reservation(self.article.name, self.members[1])
+
+		held.reload()
+		held.cancel_reservation("_Test")
+
+		self.assertEqual(frappe.db.get_value("Book Reservation", waiting.name, "selected_book"), book)
+		self.assertEqual(frappe.db.get_value("Book", book, "status"), "Reserved")
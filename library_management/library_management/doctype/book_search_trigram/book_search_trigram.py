@@ -0,0 +1,159 @@
+# Copyright (c) 2026, Vtech Technologies and contributors
+# For license information, please see license.txt
+
+"""Trigram index over book names and barcodes for the Book link pickers
+
+Every book copy has one row per distinct three-character slice of its
+lowercased name and barcode. A search matches name and barcode prefixes on
+their own indexes and, for substrings, looks up the selective trigrams of
+the typed text on the (trigram, book) index and keeps books that have all
+of them; a final LIKE on the few survivors drops false positives.
+Trigrams shared by a large part of the catalogue, such as the "bk-" of
+every book name, narrow nothing and are left out. Input shorter than a
+trigram is matched by prefix alone; input made only of common trigrams is
+matched by substring over the rows the rest of the query already keeps.
+"""
+
+import frappe
+from frappe.model.document import Document
+
+TRIGRAM_SIZE = 3
+# Books re-indexed per batch when rebuilding
+TRIGRAM_INDEX_BATCH_SIZE = 1000
+# Trigrams found in more than this share of books are too common to narrow a search
+COMMON_TRIGRAM_SHARE = 0.1
+# Seconds trigram frequencies and the book count are cached for
+TRIGRAM_STATS_TTL = 3600
+
+class BookSearchTrigram(Document):
+	pass
+
+def on_doctype_update():
+	frappe.db.add_index('Book Search Trigram', ['trigram', 'book'])
+
+def make_trigrams(*texts):
+	"""Distinct lowercase trigrams of the given texts"""
+	trigrams = set()
+	for text in texts:
+		text = (text or '').lower()
+		trigrams.update(text[i:i + TRIGRAM_SIZE] for i in range(len(text) - TRIGRAM_SIZE + 1))
+	return trigrams
+
+def index_books(books):
+	"""(Re)index `books`, given as (name, barcode) pairs"""
+	books = list(books)
+	if not books:
+		return
+
+	unindex_books([name for name, barcode in books])
+
+	timestamp = frappe.utils.now()
+	user = frappe.session.user
+	values = [
+		(frappe.generate_hash(length=12), timestamp, timestamp, user, user, name, trigram)
+		for name, barcode in books
+		for trigram in make_trigrams(name, barcode)
+	]
+	frappe.db.bulk_insert('Book Search Trigram',
+		['name', 'creation', 'modified', 'owner', 'modified_by', 'book', 'trigram'], values)
+
+def unindex_books(book_names):
+	if book_names:
+		frappe.db.sql("""
+			DELETE FROM `tabBook Search Trigram`
+			WHERE book IN %(books)s
+		""", {'books': list(book_names)})
+
+def rebuild_book_search_index():
+	"""Index every book copy from scratch"""
+	frappe.db.sql("DELETE FROM `tabBook Search Trigram`")
+
+	last_name = ''
+	while True:
+		books = frappe.db.sql("""
+			SELECT name, barcode
+			FROM `tabBook`
+			WHERE name > %s
+			ORDER BY name
+			LIMIT %s
+		""", [last_name, TRIGRAM_INDEX_BATCH_SIZE])
+		if not books:
+			break
+
+		index_books(books)
+		frappe.db.commit()
+		last_name = books[-1][0]
+
+def get_trigram_frequencies(trigrams):
+	"""Approximate number of books having each trigram"""
+	cache = frappe.cache()
+	frequencies = {trigram: cache.get_value(f'book_search_trigram_frequency:{trigram}') for trigram in trigrams}
+
+	missing = [trigram for trigram, frequency in frequencies.items() if frequency is None]
+	if missing:
+		counts = dict(frappe.db.sql("""
+			SELECT trigram, COUNT(*)
+			FROM `tabBook Search Trigram`
+			WHERE trigram IN %(trigrams)s
+			GROUP BY trigram
+		""", {'trigrams': missing}))
+		for trigram in missing:
+			frequencies[trigram] = counts.get(trigram, 0)
+			cache.set_value(f'book_search_trigram_frequency:{trigram}', frequencies[trigram],
+				expires_in_sec=TRIGRAM_STATS_TTL)
+
+	return frequencies
+
+def get_indexed_book_count():
+	"""Approximate number of book copies"""
+	count = frappe.cache().get_value('book_search_book_count')
+	if count is None:
+		count = frappe.db.count('Book')
+		frappe.cache().set_value('book_search_book_count', count, expires_in_sec=TRIGRAM_STATS_TTL)
+	return count
+
+def select_search_trigrams(txt):
+	"""Trigrams of `txt` that are rare enough to narrow a search"""
+	frequencies = get_trigram_frequencies(make_trigrams(txt))
+	limit = max(get_indexed_book_count() * COMMON_TRIGRAM_SHARE, 1)
+	return [trigram for trigram, frequency in frequencies.items() if frequency <= limit]
+
+def get_book_search(txt, params, alias='b'):
+	"""SQL join and condition matching picker input against book name or barcode
+
+	Returns a (join, condition) pair; the join is empty when the condition
+	alone does the matching. Adds its values to `params`; `alias` is the
+	Book table alias.
+	"""
+	txt = (txt or '').strip()
+	if not txt:
+		return "", "1=1"
+
+	if len(txt) < TRIGRAM_SIZE:
+		params['search_prefix'] = f"{txt}%"
+		return "", f"({alias}.name LIKE %(search_prefix)s OR {alias}.barcode LIKE %(search_prefix)s)"
+
+	params['search_txt'] = f"%{txt}%"
+	condition = f"({alias}.name LIKE %(search_txt)s OR {alias}.barcode LIKE %(search_txt)s)"
+
+	trigrams = select_search_trigrams(txt)
+	if not trigrams:
+		# Nothing selective to look up: scan the rows the rest of the query keeps
+		return "", condition
+
+	params['search_prefix'] = f"{txt}%"
+	params['search_trigrams'] = trigrams
+	params['search_trigram_count'] = len(trigrams)
+	# Prefix matches come straight off the name and barcode indexes
+	join = f"""INNER JOIN (
+		SELECT name AS book FROM `tabBook` WHERE name LIKE %(search_prefix)s
+		UNION
+		SELECT name FROM `tabBook` WHERE barcode LIKE %(search_prefix)s
+		UNION
+		SELECT t.book
+		FROM `tabBook Search Trigram` t
+		WHERE t.trigram IN %(search_trigrams)s
+		GROUP BY t.book
+		HAVING COUNT(*) = %(search_trigram_count)s
+	) book_search ON book_search.book = {alias}.name"""
+	return join, condition
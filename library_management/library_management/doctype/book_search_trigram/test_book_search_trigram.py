@@ -0,0 +1,67 @@
+# Copyright (c) 2026, Vtech Technologies and Contributors
+# See license.txt
+
+import frappe
+import unittest
+from library_management.library_management.doctype.book_search_trigram.book_search_trigram import (
+	get_book_search,
+	make_trigrams,
+	select_search_trigrams
+)
+
+class TestBookSearchTrigram(unittest.TestCase):
+	def setUp(self):
+		frappe.db.rollback()
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_make_trigrams(self):
+		self.assertEqual(make_trigrams("AB-12"), {"ab-", "b-1", "-12"})
+		self.assertEqual(make_trigrams("ab"), set())
+
+	def test_substring_search_finds_new_copies(self):
+		"""Copies are indexed on insert and found by any part of their barcode"""
+		from library_management.library_management.doctype.article_new.article_new import provision_book_copies
+
+		article = frappe.get_doc({
+			"doctype": "Article_New",
+			"title": "_Test Trigram Article",
+			"copies_to_create": 1
+		}).insert(ignore_permissions=True)
+		provision_book_copies(article.name, 2)
+		barcode = frappe.db.get_value("Book", {"article": article.name}, "barcode")
+
+		params = {}
+		join, condition = get_book_search(barcode[1:], params)
+		found = frappe.db.sql_list(f"SELECT b.barcode FROM `tabBook` b {join} WHERE {condition}", params)
+
+		self.assertIn(barcode, found)
+
+	def test_common_trigrams_are_left_out(self):
+		"""Trigrams every book name shares do not drive the search, and substrings still match"""
+		from library_management.library_management.doctype.article_new.article_new import provision_book_copies
+
+		article = frappe.get_doc({
+			"doctype": "Article_New",
+			"title": "_Test Common Trigram Article",
+			"copies_to_create": 1
+		}).insert(ignore_permissions=True)
+		provision_book_copies(article.name, 2)
+		name = frappe.db.get_value("Book", {"article": article.name}, "name")
+
+		self.assertNotIn(name[:3].lower(), select_search_trigrams(name))
+
+		params = {}
+		join, condition = get_book_search(name, params)
+		found = frappe.db.sql_list(f"SELECT b.name FROM `tabBook` b {join} WHERE {condition}", params)
+		self.assertIn(name, found)
+
+		# Only common trigrams: the substring is matched over the article's copies
+		params = {"article": article.name}
+		join, condition = get_book_search(name[:3], params)
+		found = frappe.db.sql_list(f"""
+			SELECT b.name FROM `tabBook` b {join}
+			WHERE b.article = %(article)s AND {condition}
+		""", params)
+		self.assertIn(name, found)
@@ -0,0 +1,105 @@
+# Copyright (c) 2026, Vtech Technologies and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt, today
+
+# Sign applied to the member's outstanding balance per entry type
+BALANCE_SIGN = {
+	'Accrual': 1,
+	'Payment': -1,
+	'Waiver': -1
+}
+
+class FineLedgerEntry(Document):
+	def validate(self):
+		if not self.is_new():
+			frappe.throw("Fine ledger entries cannot be modified. Post a new entry instead")
+
+		if flt(self.amount) <= 0:
+			frappe.throw("Amount must be greater than zero")
+
+		if self.entry_type in ('Payment', 'Waiver'):
+			self.validate_against_outstanding()
+
+	def validate_against_outstanding(self):
+		"""Payments and waivers cannot exceed what the member owes"""
+		# Lock the member row so concurrent payments see each other
+		outstanding = frappe.db.sql("""
+			SELECT outstanding_fines
+			FROM `tabLibrary Member`
+			WHERE name = %s
+			FOR UPDATE
+		""", [self.member])
+
+		outstanding = flt(outstanding[0][0]) if outstanding else 0
+		if flt(self.amount) > outstanding:
+			frappe.throw(f"{self.entry_type} of {self.amount} exceeds outstanding fines of {outstanding}")
+
+	def after_insert(self):
+		"""Apply the entry to the member's outstanding balance"""
+		apply_balance_delta(self.member, BALANCE_SIGN[self.entry_type] * flt(self.amount))
+
+	def on_trash(self):
+		"""Reverse the entry on the member's outstanding balance"""
+		apply_balance_delta(self.member, -BALANCE_SIGN[self.entry_type] * flt(self.amount))
+
+def apply_balance_delta(member, delta):
+	"""Atomically shift a member's outstanding fines"""
+	if not member or not delta:
+		return
+
+	frappe.db.sql("""
+		UPDATE `tabLibrary Member`
+		SET outstanding_fines = IFNULL(outstanding_fines, 0) + %(delta)s
+		WHERE name = %(member)s
+	""", {'member': member, 'delta': delta})
+
+def make_fine_entry(member, entry_type, amount, library_transaction=None, remarks=None, posting_date=None):
+	"""Post an entry to the fine ledger"""
+	return frappe.get_doc({
+		'doctype': 'Fine Ledger Entry',
+		'member': member,
+		'entry_type': entry_type,
+		'amount': amount,
+		'library_transaction': library_transaction,
+		'remarks': remarks,
+		'posting_date': posting_date or today()
+	}).insert(ignore_permissions=True)
+
+def get_outstanding_fines(member):
+	"""Outstanding fine balance of a member"""
+	return flt(frappe.db.get_value('Library Member', member, 'outstanding_fines'))
+
+@frappe.whitelist()
+def record_fine_payment(member, amount, remarks=None):
+	"""Record a fine payment made by a member"""
+	frappe.only_for(['Librarian', 'System Manager'])
+	entry = make_fine_entry(member, 'Payment', flt(amount), remarks=remarks)
+	frappe.msgprint(f"Payment of {entry.amount} recorded. Outstanding fines: {get_outstanding_fines(member)}")
+	return entry.name
+
+@frappe.whitelist()
+def waive_fine(member, amount, remarks=None):
+	"""Waive part or all of a member's outstanding fines"""
+	frappe.only_for(['Librarian', 'System Manager'])
+	entry = make_fine_entry(member, 'Waiver', flt(amount), remarks=remarks)
+	frappe.msgprint(f"Waived {entry.amount}. Outstanding fines: {get_outstanding_fines(member)}")
+	return entry.name
+
+def rebuild_outstanding_fines(member=None):
+	"""Recompute outstanding balances from the ledger, for one member or all"""
+	condition = "WHERE m.name = %(member)s" if member else ""
+	frappe.db.sql(f"""
+		UPDATE `tabLibrary Member` m
+		LEFT JOIN (
+			SELECT
+				member,
+				SUM(CASE WHEN entry_type = 'Accrual' THEN amount ELSE -amount END) AS balance
+			FROM `tabFine Ledger Entry`
+			GROUP BY member
+		) l ON l.member = m.name
+		SET m.outstanding_fines = IFNULL(l.balance, 0)
+		{condition}
+	""", {'member': member})
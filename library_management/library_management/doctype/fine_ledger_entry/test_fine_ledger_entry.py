@@ -0,0 +1,32 @@
+# Copyright (c) 2026, Vtech Technologies and Contributors
+# See license.txt
+
+import frappe
+import unittest
+from library_management.library_management.doctype.fine_ledger_entry.fine_ledger_entry import (
+	get_outstanding_fines,
+	make_fine_entry
+)
+
+class TestFineLedgerEntry(unittest.TestCase):
+	def setUp(self):
+		frappe.db.rollback()
+		self.member = frappe.get_doc({
+			"doctype": "Library Member",
+			"first_name": "_Test Fined"
+		}).insert(ignore_permissions=True)
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_balance_follows_ledger(self):
+		"""Accruals raise and payments/waivers lower the outstanding balance"""
+		make_fine_entry(self.member.name, "Accrual", 12)
+		make_fine_entry(self.member.name, "Payment", 5)
+		make_fine_entry(self.member.name, "Waiver", 2)
+
+		self.assertEqual(get_outstanding_fines(self.member.name), 5)
+
+	def test_payment_cannot_exceed_outstanding(self):
+		make_fine_entry(self.member.name, "Accrual", 3)
+		self.assertRaises(frappe.ValidationError, make_fine_entry, self.member.name, "Payment", 4)
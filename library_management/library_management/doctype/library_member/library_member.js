@@ -14,7 +14,103 @@ frappe.ui.form.on('Library Member', {
 			library_member: frm.doc.name
 		})
 	})
+
+	frm.add_custom_button(__('Issue Books'), () => {
+		issue_books(frm);
+	});
+
+	if (frm.doc.open_loans > 0) {
+		frm.add_custom_button(__('Renew Loans'), () => {
+			renew_member_loans(frm);
+		});
+	}
+
+	if (frm.doc.outstanding_fines > 0) {
+		frm.add_custom_button(__('Record Payment'), () => {
+			post_fine_entry(frm, 'record_fine_payment', __('Record Fine Payment'));
+		}, __('Fines'));
+
+		frm.add_custom_button(__('Waive Fine'), () => {
+			post_fine_entry(frm, 'waive_fine', __('Waive Fine'));
+		}, __('Fines'));
+	}
 }
 
 	
 });
+
+function issue_books(frm) {
+	frappe.prompt([
+		{
+			fieldname: 'barcodes',
+			fieldtype: 'Small Text',
+			label: __('Barcodes'),
+			description: __('Scan one barcode per line'),
+			reqd: 1
+		}
+	],
+	function(data) {
+		frappe.call({
+			method: 'library_management.library_management.doctype.library_transaction.library_transaction.issue_books',
+			args: {
+				member: frm.doc.name,
+				barcodes: data.barcodes
+			},
+			freeze: true,
+			callback: function() {
+				frm.reload_doc();
+			}
+		});
+	},
+	__('Issue Books'),
+	__('Issue')
+	);
+}
+
+function renew_member_loans(frm) {
+	frappe.call({
+		method: 'library_management.library_management.doctype.library_transaction.library_transaction.renew_loans',
+		args: {
+			member: frm.doc.name
+		},
+		freeze: true,
+		callback: function(r) {
+			if (r.message) {
+				frappe.msgprint(__('Renewed {0} of {1} open loans', [r.message.renewed.length, frm.doc.open_loans]));
+			}
+		}
+	});
+}
+
+function post_fine_entry(frm, method, title) {
+	frappe.prompt([
+		{
+			fieldname: 'amount',
+			fieldtype: 'Currency',
+			label: __('Amount'),
+			default: frm.doc.outstanding_fines,
+			reqd: 1
+		},
+		{
+			fieldname: 'remarks',
+			fieldtype: 'Small Text',
+			label: __('Remarks')
+		}
+	],
+	function(data) {
+		frappe.call({
+			method: 'library_management.library_management.doctype.fine_ledger_entry.fine_ledger_entry.' + method,
+			args: {
+				member: frm.doc.name,
+				amount: data.amount,
+				remarks: data.remarks
+			},
+			callback: function() {
+				frm.reload_doc();
+			}
+		});
+	},
+	title,
+	__('Submit')
+	);
+}
@@ -3,11 +3,19 @@
 
 import frappe
 from frappe.model.document import Document
+from frappe.utils import cint, flt
 
 class LibraryMember(Document):
 	def before_save(self):
 		self.set_full_name()
 		self.generate_email_if_missing()
+		self.load_maintained_values()
+
+	def load_maintained_values(self):
+		"""Keep the SQL-maintained balances and counters instead of the values loaded in the form"""
+		if not self.is_new():
+			self.outstanding_fines, self.accrued_fines, self.open_loans = frappe.db.get_value('Library Member',
+				self.name, ['outstanding_fines', 'accrued_fines', 'open_loans'])
 
 	def set_full_name(self):
 		"""Set full name from first and last name"""
@@ -41,3 +49,48 @@ class LibraryMember(Document):
 				self.email_address = "member@fakemail.com"
 
 	
+
+def claim_loan_slots(member, count=1, max_books_allowed=0):
+	"""Count `count` new loans against a member, enforcing their borrowing limit"""
+	# The row lock serialises concurrent issues to the same member
+	open_loans = frappe.db.sql("""
+		SELECT open_loans
+		FROM `tabLibrary Member`
+		WHERE name = %s
+		FOR UPDATE
+	""", [member])
+	open_loans = cint(open_loans[0][0]) if open_loans else 0
+
+	if max_books_allowed and open_loans + count > max_books_allowed:
+		frappe.throw(f"Borrowing limit reached: {member} has {open_loans} of {max_books_allowed} books allowed on loan")
+
+	frappe.db.sql("""
+		UPDATE `tabLibrary Member`
+		SET open_loans = IFNULL(open_loans, 0) + %(count)s
+		WHERE name = %(member)s
+	""", {'member': member, 'count': count})
+
+def release_loan_slots(member, count=1, accrued_fines=0):
+	"""Take `count` loans, and the fines they had accrued, off a member's counters"""
+	frappe.db.sql("""
+		UPDATE `tabLibrary Member`
+		SET
+			open_loans = GREATEST(IFNULL(open_loans, 0) - %(count)s, 0),
+			accrued_fines = GREATEST(IFNULL(accrued_fines, 0) - %(accrued_fines)s, 0)
+		WHERE name = %(member)s
+	""", {'member': member, 'count': count, 'accrued_fines': flt(accrued_fines)})
+
+def rebuild_open_loans(member=None):
+	"""Recount open loans from Issue transactions, for one member or all"""
+	condition = "WHERE m.name = %(member)s" if member else ""
+	frappe.db.sql(f"""
+		UPDATE `tabLibrary Member` m
+		LEFT JOIN (
+			SELECT library_member, COUNT(*) AS loans
+			FROM `tabLibrary Transaction`
+			WHERE transaction_type = 'Issue' AND status = 'Issued' AND docstatus = 1
+			GROUP BY library_member
+		) l ON l.library_member = m.name
+		SET m.open_loans = IFNULL(l.loans, 0)
+		{condition}
+	""", {'member': member})
@@ -46,3 +46,69 @@ class LibraryMemberHistory(Document):
 
 		history_doc.save()
 		return history_doc
+
+def queue_history_entry(member_name, entry):
+	"""Append a transaction line to the member's history before commit"""
+	from library_management.write_behind import mark_dirty
+	mark_dirty('Library Member History', member_name, ('append', entry))
+
+def queue_history_update(member_name, match, values):
+	"""Update the latest history line matching `match` before commit"""
+	from library_management.write_behind import mark_dirty
+	mark_dirty('Library Member History', member_name, ('update', match, values))
+
+def post_history_changes(member_name, changes):
+	"""Hand a member's queued history changes to the outbox
+
+	Appends, and updates of lines appended in the same batch, travel as one
+	event. Every other update gets an event of its own, so an update whose
+	line is not there yet is retried alone instead of holding the appends back.
+	"""
+	from library_management.outbox import post_event
+
+	bundled, separate = [], []
+	for change in changes:
+		if change[0] == 'update' and not any(
+			other[0] == 'append' and history_line_matches(other[1], change[1]) for other in bundled
+		):
+			separate.append(change)
+		else:
+			bundled.append(change)
+
+	for event_changes in ([bundled] if bundled else []) + [[change] for change in separate]:
+		post_event('Member History', {'member': member_name, 'changes': event_changes},
+			reference_doctype='Library Member', reference_name=member_name)
+
+def history_line_matches(line, match):
+	return all(line.get(field) == value for field, value in match.items())
+
+def apply_history_event(payload):
+	"""Outbox handler for Member History events"""
+	flush_history_changes(payload['member'], payload['changes'])
+
+def flush_history_changes(member_name, changes):
+	"""Apply all queued history changes for a member with a single save"""
+	history_name = frappe.db.get_value('Library Member History',
+		{'member_name': member_name}, 'name')
+
+	if history_name:
+		history_doc = frappe.get_doc('Library Member History', history_name)
+	else:
+		history_doc = frappe.new_doc('Library Member History')
+		history_doc.member_name = member_name
+
+	for change in changes:
+		if change[0] == 'append':
+			history_doc.append('transaction_history', change[1])
+		else:
+			match, values = change[1], change[2]
+			for row in reversed(history_doc.transaction_history):
+				if history_line_matches(row, match):
+					row.update(values)
+					break
+			else:
+				# The line may come from an event still waiting to be retried;
+				# failing makes the outbox retry this one instead of dropping it
+				frappe.throw(f"No history line of {member_name} matches {match}")
+
+	history_doc.save(ignore_permissions=True)
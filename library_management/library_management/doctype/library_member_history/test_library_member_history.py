@@ -3,7 +3,15 @@
 
 import frappe
 import unittest
-from library_management.library_management.doctype.library_member_history.library_member_history import LibraryMemberHistory
+from unittest.mock import patch
+from library_management.library_management.doctype.library_member_history.library_member_history import (
+	LibraryMemberHistory,
+	flush_history_changes,
+	queue_history_entry,
+	queue_history_update
+)
+from library_management.outbox import process_outbox
+from library_management.write_behind import flush_dirty_aggregates
 
 class TestLibraryMemberHistory(unittest.TestCase):
 	def setUp(self):
@@ -50,3 +58,62 @@ class TestLibraryMemberHistory(unittest.TestCase):
 
 		history_doc = frappe.get_doc("Library Member History", history_records[0].name)
 		self.assertEqual(len(history_doc.transaction_history), 2)
+
+	def test_queued_changes_are_written_once(self):
+		"""Queued history changes for a member are applied with a single save"""
+		member_name = "test-member-1"
+
+		queue_history_entry(member_name, {"transaction_type": "Issue", "book": "BK-1", "status": "Active"})
+		queue_history_entry(member_name, {"transaction_type": "Issue", "book": "BK-2", "status": "Active"})
+		queue_history_update(member_name,
+			{"transaction_type": "Issue", "book": "BK-1", "status": "Active"},
+			{"status": "Completed"})
+
+		# Nothing is written until the transaction is about to commit
+		self.assertFalse(frappe.db.exists("Library Member History", {"member_name": member_name}))
+
+		flush_dirty_aggregates()
+
+		# The changes travel as one outbox event
+		with patch.object(frappe.db, "commit"):
+			process_outbox()
+
+		history_doc = frappe.get_doc("Library Member History", {"member_name": member_name})
+		self.assertEqual([row.status for row in history_doc.transaction_history], ["Completed", "Active"])
+
+	def test_update_without_matching_line_fails(self):
+		"""An update that arrives before its line raises so the outbox retries it"""
+		member_name = "test-member-1"
+
+		with self.assertRaises(frappe.ValidationError):
+			flush_history_changes(member_name, [
+				("update", {"transaction_type": "Issue", "book": "BK-1", "status": "Active"}, {"status": "Completed"})
+			])
+
+		flush_history_changes(member_name, [("append", {"transaction_type": "Issue", "book": "BK-1", "status": "Active"})])
+		flush_history_changes(member_name, [
+			("update", {"transaction_type": "Issue", "book": "BK-1", "status": "Active"}, {"status": "Completed"})
+		])
+
+		history_doc = frappe.get_doc("Library Member History", {"member_name": member_name})
+		self.assertEqual([row.status for row in history_doc.transaction_history], ["Completed"])
+
+	def test_unmatched_update_does_not_hold_back_appends(self):
+		"""Appends are written even when an update in the same batch has no line yet"""
+		member_name = "test-member-1"
+
+		queue_history_entry(member_name, {"transaction_type": "Issue", "book": "BK-2", "status": "Active"})
+		queue_history_update(member_name,
+			{"transaction_type": "Issue", "book": "BK-1", "status": "Active"},
+			{"status": "Completed"})
+		flush_dirty_aggregates()
+
+		with patch.object(frappe.db, "commit"):
+			process_outbox()
+
+		history_doc = frappe.get_doc("Library Member History", {"member_name": member_name})
+		self.assertEqual([row.book for row in history_doc.transaction_history], ["BK-2"])
+		# The update waits in its own event for a retry
+		self.assertTrue(frappe.db.exists("Library Outbox Event", {
+			"topic": "Member History", "reference_name": member_name, "status": "Pending"
+		}))
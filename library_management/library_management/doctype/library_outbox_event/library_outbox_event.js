@@ -0,0 +1,20 @@
+// Copyright (c) 2026, Vtech Technologies and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on('Library Outbox Event', {
+	refresh: function(frm) {
+		if (frm.doc.status === 'Failed') {
+			frm.add_custom_button(__('Retry'), function() {
+				frappe.call({
+					method: 'library_management.library_management.doctype.library_outbox_event.library_outbox_event.retry_event',
+					args: {
+						name: frm.doc.name
+					},
+					callback: function() {
+						frm.reload_doc();
+					}
+				});
+			});
+		}
+	}
+});
@@ -0,0 +1,21 @@
+# Copyright (c) 2026, Vtech Technologies and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+class LibraryOutboxEvent(Document):
+	pass
+
+@frappe.whitelist()
+def retry_event(name):
+	"""Put a failed event back in the queue"""
+	frappe.only_for(['System Manager'])
+	frappe.db.set_value('Library Outbox Event', name, {
+		'status': 'Pending',
+		'attempts': 0,
+		'next_attempt_at': None
+	})
+
+	from library_management.outbox import enqueue_outbox_processing
+	enqueue_outbox_processing()
@@ -0,0 +1,58 @@
+# Copyright (c) 2026, Vtech Technologies and Contributors
+# See license.txt
+
+import frappe
+import unittest
+from unittest.mock import patch
+from library_management import outbox
+
+HANDLER = "library_management.library_management.doctype.library_outbox_event.test_library_outbox_event.record_payload"
+FAILING_HANDLER = "library_management.library_management.doctype.library_outbox_event.test_library_outbox_event.fail"
+
+handled = []
+
+def record_payload(payload):
+	handled.append(payload)
+
+def fail(payload):
+	raise Exception("_Test outbox failure")
+
+class TestLibraryOutboxEvent(unittest.TestCase):
+	def setUp(self):
+		frappe.db.rollback()
+		handled.clear()
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def post(self, handler):
+		with patch.dict(outbox.OUTBOX_HANDLERS, {"_Test Topic": handler}):
+			outbox.post_event("_Test Topic", {"article": "_Test Article"})
+		return frappe.get_last_doc("Library Outbox Event", filters={"topic": "_Test Topic"})
+
+	def test_event_is_processed_once(self):
+		"""A processed event runs its handler and is not picked up again"""
+		event = self.post(HANDLER)
+
+		with patch.dict(outbox.OUTBOX_HANDLERS, {"_Test Topic": HANDLER}), patch.object(frappe.db, "commit"):
+			self.assertTrue(outbox.process_outbox_event(event.name))
+			self.assertFalse(outbox.process_outbox_event(event.name))
+
+		self.assertEqual(handled, [{"article": "_Test Article"}])
+		self.assertEqual(frappe.db.get_value("Library Outbox Event", event.name, "status"), "Done")
+
+	def test_failed_event_is_retried_then_parked(self):
+		"""Failures are rescheduled with backoff until the attempts run out"""
+		event = self.post(FAILING_HANDLER)
+
+		with patch.dict(outbox.OUTBOX_HANDLERS, {"_Test Topic": FAILING_HANDLER}), patch.object(frappe.db, "commit"):
+			self.assertFalse(outbox.process_outbox_event(event.name))
+			status, attempts, next_attempt_at = frappe.db.get_value("Library Outbox Event", event.name,
+				["status", "attempts", "next_attempt_at"])
+			self.assertEqual((status, attempts), ("Pending", 1))
+			self.assertIsNotNone(next_attempt_at)
+
+			for attempt in range(1, outbox.OUTBOX_MAX_ATTEMPTS):
+				outbox.process_outbox_event(event.name)
+
+		self.assertEqual(frappe.db.get_value("Library Outbox Event", event.name, "status"), "Failed")
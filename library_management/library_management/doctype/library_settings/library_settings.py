@@ -3,6 +3,9 @@
 
 # import frappe
 from frappe.model.document import Document
+from library_management.library_management.doctype.member_type.member_type import clear_loan_policy_cache
 
 class LibrarySettings(Document):
-	pass
+	def on_update(self):
+		# Library-wide values are the fallback of every policy
+		clear_loan_policy_cache()
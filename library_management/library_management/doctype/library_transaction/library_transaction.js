@@ -8,9 +8,19 @@ frappe.ui.form.on('Library Transaction', {
 			frm.add_custom_button(__('Create Return'), function() {
 				create_return_transaction(frm);
 			}, __('Actions'));
+
+			frm.add_custom_button(__('Renew'), function() {
+				renew_loan(frm);
+			}, __('Actions'));
 		}
 
 		// Helper buttons for book selection
+		if (frm.doc.docstatus === 0) {
+			frm.add_custom_button(__('Scan Barcode'), function() {
+				scan_book_barcode(frm);
+			}, __('Book Selection'));
+		}
+
 		if (frm.doc.article && frm.doc.transaction_type === 'Issue') {
 			frm.add_custom_button(__('Show Available Books'), function() {
 				show_available_books(frm);
@@ -149,6 +159,40 @@ function set_book_query_filters(frm) {
 	});
 }
 
+function scan_book_barcode(frm) {
+	frappe.prompt([
+		{
+			fieldname: 'barcode',
+			fieldtype: 'Data',
+			options: 'Barcode',
+			label: __('Barcode'),
+			reqd: 1
+		}
+	],
+	function(data) {
+		frappe.call({
+			method: 'library_management.library_management.doctype.book.book.resolve_barcode',
+			args: {
+				barcode: data.barcode
+			},
+			callback: function(r) {
+				if (!r.message) {
+					frappe.msgprint(__('No book copy found for barcode {0}', [data.barcode]));
+					return;
+				}
+
+				// Set article first, its change handler clears the book
+				frm.set_value('article', r.message.article).then(() => {
+					frm.set_value('book', r.message.book);
+				});
+			}
+		});
+	},
+	__('Scan Book'),
+	__('Select')
+	);
+}
+
 function create_return_transaction(frm) {
 	frappe.call({
 		method: 'library_management.library_management.doctype.library_transaction.library_transaction.create_return_transaction',
@@ -164,6 +208,26 @@ function create_return_transaction(frm) {
 	});
 }
 
+function renew_loan(frm) {
+	frappe.call({
+		method: 'library_management.library_management.doctype.library_transaction.library_transaction.renew_loans',
+		args: {
+			transactions: [frm.doc.name]
+		},
+		callback: function(r) {
+			if (r.message && r.message.renewed.length) {
+				frappe.show_alert({
+					message: __('Renewed until {0}', [frappe.datetime.str_to_user(r.message.renewed[0].due_date)]),
+					indicator: 'green'
+				});
+				frm.reload_doc();
+			} else {
+				frappe.msgprint(__('This loan cannot be renewed. It may be overdue, out of renewals or reserved by another member.'));
+			}
+		}
+	});
+}
+
 function show_available_books(frm) {
 	if (!frm.doc.article) {
 		frappe.msgprint(__('Please select an article first'));
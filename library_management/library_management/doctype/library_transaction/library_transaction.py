@@ -3,12 +3,31 @@
 
 import frappe
 from frappe.model.document import Document
-from frappe.utils import add_days, getdate, now_datetime
+from frappe.utils import add_days, cint, flt, getdate, now, now_datetime
 import pymysql
+from library_management.library_management.doctype.book.book import lock_books, update_books_status
+from library_management.library_management.doctype.book_reservation.book_reservation import (
+	clear_reservation_queue_cache,
+	release_books_to_queue
+)
+from library_management.library_management.doctype.book_search_trigram.book_search_trigram import get_book_search
+from library_management.library_management.doctype.fine_ledger_entry.fine_ledger_entry import make_fine_entry
+from library_management.library_management.doctype.library_member.library_member import claim_loan_slots, release_loan_slots
+from library_management.library_management.doctype.member_type.member_type import get_loan_policy
+from library_management.library_management.doctype.open_loan.open_loan import (
+	close_open_loans,
+	get_open_loan,
+	register_open_loans
+)
+from library_management.library_management.doctype.library_member_history.library_member_history import (
+	queue_history_entry,
+	queue_history_update
+)
 
 class LibraryTransaction(Document):
 
 	def validate(self):
+		self.load_validation_context()
 		self.validate_article_and_book()
 		self.validate_transaction_type()
 		self.validate_member_eligibility()
@@ -16,14 +35,56 @@ class LibraryTransaction(Document):
 		self.validate_return_eligibility()
 		self.set_due_date()
 
+	def load_validation_context(self):
+		"""Fetch everything the validators need in a single round-trip
+
+		Book, article, member, the member's open reservation on the copy, the
+		copy's open loan to the member, outstanding fines and the open loan
+		count are read in one joined query and shared by all validators.
+		The member's loan policy comes from the policy cache.
+		"""
+		context = frappe.db.sql("""
+			SELECT
+				b.name AS book,
+				b.article AS book_article,
+				b.status AS book_status,
+				a.name AS article,
+				a.status AS article_status,
+				m.name AS member,
+				m.member_type,
+				m.open_loans,
+				m.outstanding_fines,
+				m.accrued_fines,
+				(
+					SELECT br.name
+					FROM `tabBook Reservation` br
+					WHERE br.selected_book = ctx.book AND br.member = ctx.member
+					AND br.status = 'Active' AND br.docstatus = 1
+					LIMIT 1
+				) AS reservation,
+				IF(ol.library_member = ctx.member, ol.issue_transaction, NULL) AS active_issue
+			FROM (SELECT %(book)s AS book, %(member)s AS member) ctx
+			LEFT JOIN `tabBook` b ON b.name = ctx.book
+			LEFT JOIN `tabOpen Loan` ol ON ol.name = ctx.book
+			LEFT JOIN `tabArticle_New` a ON a.name = %(article)s
+			LEFT JOIN `tabLibrary Member` m ON m.name = ctx.member
+		""", {
+			'book': self.book,
+			'article': self.article,
+			'member': self.library_member
+		}, as_dict=True)
+
+		self.validation_context = context[0]
+		self.loan_policy = get_loan_policy(self.validation_context.member_type)
+		return self.validation_context
+
 	def validate_article_and_book(self):
 		"""Ensure article and book are properly linked"""
 		if not self.article or not self.book:
 			frappe.throw("Both Article and Book Copy must be specified")
 
 		# Validate that book belongs to the article
-		book_article = frappe.db.get_value('Book', self.book, 'article')
-		if book_article != self.article:
+		if self.validation_context.book_article != self.article:
 			frappe.throw(f"Selected book copy does not belong to the specified article")
 
 	def validate_transaction_type(self):
@@ -34,36 +95,28 @@ class LibraryTransaction(Document):
 
 	def validate_member_eligibility(self):
 		"""Check if member is eligible for transactions"""
-		member_doc = frappe.get_doc('Library Member', self.library_member)
-
-		# Check if member is active
-		if getattr(member_doc, 'status', '') == 'Inactive':
-			frappe.throw("Member is inactive and cannot perform transactions")
+		context = self.validation_context
+		if not context.member:
+			frappe.throw(f"Library Member {self.library_member} not found")
 
 		# Check for outstanding fines (if applicable)
-		outstanding_fines = frappe.db.sql("""
-			SELECT SUM(fine_amount)
-			FROM `tabLibrary Transaction`
-			WHERE library_member = %s AND fine_amount > 0 AND docstatus = 1
-		""", [self.library_member])
+		if context.outstanding_fines and context.outstanding_fines > 0:
+			frappe.msgprint(f"Member has outstanding fines of {context.outstanding_fines}")
+
+		if context.accrued_fines and context.accrued_fines > 0:
+			frappe.msgprint(f"Member has {context.accrued_fines} in fines accruing on overdue loans")
 
-		if outstanding_fines[0][0] and outstanding_fines[0][0] > 0:
-			frappe.msgprint(f"Member has outstanding fines of {outstanding_fines[0][0]}")
+		max_books_allowed = self.loan_policy.max_books_allowed
+		if self.transaction_type == "Issue" and max_books_allowed and cint(context.open_loans) >= max_books_allowed:
+			frappe.throw(f"Borrowing limit reached: member has {cint(context.open_loans)} of {max_books_allowed} books allowed on loan")
 
 	def validate_book_availability(self):
 		"""Validate book is available for issue"""
 		if self.transaction_type == "Issue":
-			book_status = frappe.db.get_value('Book', self.book, 'status')
+			book_status = self.validation_context.book_status
 			if book_status == 'Reserved':
 				# Check if this book is reserved for this member
-				reservation_exists = frappe.db.exists('Book Reservation', {
-					'selected_book': self.book,
-					'member': self.library_member,
-					'status': 'Active',
-					'docstatus': 1
-				})
-
-				if not reservation_exists:
+				if not self.validation_context.reservation:
 					frappe.throw(f"Book is reserved for another member. Cannot issue until reservation is cancelled or fulfilled.")
 			elif book_status != 'Available':
 				frappe.throw(f"Book is not available for issue. Current status: {book_status}")
@@ -108,21 +161,8 @@ class LibraryTransaction(Document):
 	def validate_return_eligibility(self):
 		"""Validate return transaction eligibility"""
 		if self.transaction_type == "Return":
-			# Build filter conditions properly
-			filters = {
-				'book': self.book,
-				'library_member': self.library_member,
-				'transaction_type': 'Issue',
-				'status': 'Issued',
-				'docstatus': 1
-			}
-
-			# Exclude current transaction if it's not new
-			if not self.is_new() and self.name:
-				filters['name'] = ['!=', self.name]
-
 			# Check if there's an active issue for this specific book and member
-			active_issue = frappe.db.exists('Library Transaction', filters)
+			active_issue = self.validation_context.active_issue
 
 			if not active_issue:
 				# Get debugging information
@@ -152,9 +192,7 @@ class LibraryTransaction(Document):
 	def set_due_date(self):
 		"""Set due date for issue transactions"""
 		if self.transaction_type == "Issue" and not self.due_date:
-			# Default loan period of 14 days
-			loan_period = frappe.db.get_single_value('Library Settings', 'loan_period') or 14
-			self.due_date = add_days(getdate(self.date), loan_period)
+			self.due_date = add_days(getdate(self.date), self.loan_policy.loan_period_days)
 
 	def before_submit(self):
 		"""Update status before submit"""
@@ -168,60 +206,120 @@ class LibraryTransaction(Document):
 	def on_submit(self):
 		"""Update related documents on submit"""
 		self.update_book_status()
-		self.update_article_counts()
+		self.fulfil_reservation()
+		self.count_open_loan()
+		self.register_open_loan()
+		self.close_issue()
+		self.accrue_fine()
 		self.create_member_history()
-		self.update_book_last_issue_date()
+
+	def on_cancel(self):
+		"""Undo what submitting the transaction recorded"""
+		self.release_cancelled_issue()
+		self.reverse_fine()
+
+	def release_cancelled_issue(self):
+		"""Release a cancelled issue that is still out: registry row, member counters and copy"""
+		if self.transaction_type != "Issue" or self.status != "Issued":
+			return
+
+		books = lock_books([self.book])
+		close_open_loans([self.name])
+		release_loan_slots(self.library_member, 1, self.accrued_fine)
+		release_books_to_queue(books)
+
+	def reverse_fine(self):
+		"""Waive the late-return fine a cancelled return posted"""
+		if self.transaction_type != "Return":
+			return
+
+		accrued = frappe.db.sql("""
+			SELECT SUM(amount)
+			FROM `tabFine Ledger Entry`
+			WHERE library_transaction = %s AND entry_type = 'Accrual'
+		""", [self.name])
+		accrued = flt(accrued[0][0]) if accrued else 0
+		if accrued > 0:
+			make_fine_entry(self.library_member, 'Waiver', accrued,
+				library_transaction=self.name, remarks=f"Cancelled return {self.name}")
 
 	def update_book_status(self):
 		"""Update book status based on transaction"""
-		try:
-			book_doc = frappe.get_doc('Book', self.book)
+		# Not caught: the copy's status must commit together with the transaction
+		books = lock_books([self.book])
 
-			if self.transaction_type == "Issue":
-				book_doc.status = "Issued"
-				book_doc.last_issue_date = self.date
-			elif self.transaction_type == "Return":
-				book_doc.status = "Available"
-				# Check for pending reservations when book becomes available
-				self.check_pending_reservations()
+		if self.transaction_type == "Issue":
+			update_books_status(books, "Issued", {'last_issue_date': self.date})
+		elif self.transaction_type == "Return":
+			# Held for the front of the reservation queue, or back to Available
+			release_books_to_queue(books)
+
+	def fulfil_reservation(self):
+		"""Fulfil the member's reservation that was holding the issued copy"""
+		if self.transaction_type != "Issue":
+			return
+
+		reservations = frappe.db.sql_list("""
+			SELECT name
+			FROM `tabBook Reservation`
+			WHERE selected_book = %(book)s AND member = %(member)s
+			AND status = 'Active' AND docstatus = 1
+			FOR UPDATE
+		""", {'book': self.book, 'member': self.library_member})
+
+		if not reservations:
+			return
+
+		frappe.db.sql("""
+			UPDATE `tabBook Reservation`
+			SET status = 'Fulfilled', modified = %(modified)s, modified_by = %(user)s
+			WHERE name IN %(reservations)s
+		""", {'reservations': reservations, 'modified': now(), 'user': frappe.session.user})
+		clear_reservation_queue_cache([self.article])
+
+		queue_history_update(self.library_member, {
+			"transaction_type": "Reservation",
+			"article": self.article,
+			"status": "Active"
+		}, {
+			"status": "Reservation Fulfilled",
+			"return_date": now_datetime()
+		})
 
-			book_doc.save(ignore_permissions=True)
-		except Exception as e:
-			frappe.log_error(f"Error updating book status: {str(e)}")
+	def count_open_loan(self):
+		"""Count the issue against the member's borrowing limit"""
+		if self.transaction_type == "Issue":
+			if not getattr(self, 'loan_policy', None):
+				self.load_validation_context()
+			claim_loan_slots(self.library_member, 1, self.loan_policy.max_books_allowed)
 
-	def check_pending_reservations(self):
-		"""Check for pending reservations when a book becomes available"""
-		try:
-			# Import here to avoid circular imports
-			from library_management.library_management.doctype.book_reservation.book_reservation import check_article_availability_for_reservations
+	def register_open_loan(self):
+		"""Record the copy as on loan to the member"""
+		if self.transaction_type == "Issue":
+			register_open_loans([{
+				'book': self.book,
+				'article': self.article,
+				'library_member': self.library_member,
+				'issue_transaction': self.name,
+				'issue_date': self.date
+			}])
 
-			# Notify waiting reservations for this article
-			check_article_availability_for_reservations(self.article)
-		except Exception as e:
-			frappe.log_error(f"Error checking pending reservations: {str(e)}")
+	def close_issue(self):
+		"""Mark the issue this return settles as Returned"""
+		if self.transaction_type == "Return":
+			loan = get_open_loan(self.book)
+			if loan and loan.library_member == self.library_member:
+				close_issue_transactions([loan.issue_transaction])
 
-	def update_article_counts(self):
-		"""Update parent article's copy counts"""
-		try:
-			article_doc = frappe.get_doc('Article_New', self.article)
-			article_doc.update_copy_counts()
-			article_doc.save(ignore_permissions=True)
-		except Exception as e:
-			frappe.log_error(f"Error updating article counts: {str(e)}")
+	def accrue_fine(self):
+		"""Post the late-return fine to the member's fine ledger"""
+		if self.transaction_type == "Return" and flt(self.fine_amount) > 0:
+			make_fine_entry(self.library_member, 'Accrual', self.fine_amount,
+				library_transaction=self.name, remarks=f"Late return of {self.book}")
 
 	def create_member_history(self):
-		"""Create or update member history record"""
+		"""Queue the member history line, posted to the outbox before commit"""
 		try:
-			# Check if history record exists
-			history_name = frappe.db.get_value('Library Member History',
-				{'member_name': self.library_member}, 'name')
-
-			if history_name:
-				history_doc = frappe.get_doc('Library Member History', history_name)
-			else:
-				history_doc = frappe.new_doc('Library Member History')
-				history_doc.member_name = self.library_member
-
 			# Get article and book details
 			article_title = frappe.db.get_value('Article_New', self.article, 'title')
 			copy_number = frappe.db.get_value('Book', self.book, 'copy_number')
@@ -234,7 +332,7 @@ class LibraryTransaction(Document):
 				transaction_status = "Overdue"
 
 			# Add transaction to history
-			history_doc.append("transaction_history", {
+			queue_history_entry(self.library_member, {
 				"transaction_type": self.transaction_type,
 				"article": self.article,
 				"article_title": article_title,
@@ -247,40 +345,27 @@ class LibraryTransaction(Document):
 				"fine_amount": self.fine_amount or 0
 			})
 
-			history_doc.save(ignore_permissions=True)
-
 			# If this is a return transaction, update the corresponding issue entry status
 			if self.transaction_type == "Return":
-				self.update_issue_history_status(history_doc)
+				self.update_issue_history_status()
 
 		except Exception as e:
 			frappe.log_error(f"Error creating member history: {str(e)}")
 
-	def update_issue_history_status(self, history_doc):
-		"""Update the status of the corresponding issue entry"""
-		try:
-			# Find the corresponding issue entry
-			for row in history_doc.transaction_history:
-				if (row.transaction_type == "Issue" and
-					row.book == self.book and
-					row.status == "Active"):
-					row.status = "Completed"
-					row.return_date = self.return_date or self.date
-					if self.fine_amount:
-						row.fine_amount = self.fine_amount
-					break
-
-			history_doc.save(ignore_permissions=True)
-		except Exception as e:
-			frappe.log_error(f"Error updating issue history status: {str(e)}")
+	def update_issue_history_status(self):
+		"""Queue the status update of the corresponding issue entry"""
+		values = {
+			"status": "Completed",
+			"return_date": self.return_date or self.date
+		}
+		if self.fine_amount:
+			values["fine_amount"] = self.fine_amount
 
-	def update_book_last_issue_date(self):
-		"""Update book's last issue date"""
-		if self.transaction_type == "Issue":
-			try:
-				frappe.db.set_value('Book', self.book, 'last_issue_date', self.date)
-			except Exception as e:
-				frappe.log_error(f"Error updating book last issue date: {str(e)}")
+		queue_history_update(self.library_member, {
+			"transaction_type": "Issue",
+			"book": self.book,
+			"status": "Active"
+		}, values)
 
 	def check_overdue(self):
 		"""Check if return is overdue and calculate fine"""
@@ -292,12 +377,18 @@ class LibraryTransaction(Document):
 				self.is_overdue = 1
 				overdue_days = (return_date - due_date).days
 
-				# Calculate fine (configurable rate)
-				fine_per_day = frappe.db.get_single_value('Library Settings', 'fine_per_day') or 1.0
-				self.fine_amount = overdue_days * fine_per_day
+				# Member Type rate, falling back to the library-wide rate
+				self.days_overdue = overdue_days
+				self.fine_amount = overdue_days * self.get_fine_per_day()
 
 				frappe.msgprint(f"Book returned {overdue_days} days late. Fine: {self.fine_amount}")
 
+	def get_fine_per_day(self):
+		"""Late fee rate for this transaction's member"""
+		if not getattr(self, 'loan_policy', None):
+			self.load_validation_context()
+		return self.loan_policy.late_fee_per_day
+
 	@frappe.whitelist()
 	def get_available_books(self):
 		"""Get available books for selected article"""
@@ -312,6 +403,11 @@ class LibraryTransaction(Document):
 			fields=['name', 'copy_number', 'barcode', 'location', 'condition']
 		)
 
+def on_doctype_update():
+	# A member's open loans, and the open issue of a copy to a member
+	frappe.db.add_index('Library Transaction', ['library_member', 'status', 'docstatus'])
+	frappe.db.add_index('Library Transaction', ['book', 'library_member', 'transaction_type', 'status'])
+
 # Utility functions
 def get_member_issued_books(member):
 	"""Get all currently issued books for a member"""
@@ -325,7 +421,10 @@ def get_member_issued_books(member):
 	)
 
 def get_overdue_books(member=None):
-	"""Get all overdue books, optionally filtered by member"""
+	"""Get all overdue books, optionally filtered by member
+
+	Days overdue and accrued fines are as of the last accrual run.
+	"""
 	filters = {
 		'status': 'Issued',
 		'due_date': ['<', getdate()],
@@ -337,9 +436,49 @@ def get_overdue_books(member=None):
 
 	return frappe.get_all('Library Transaction',
 		filters=filters,
-		fields=['name', 'library_member', 'article', 'book', 'date', 'due_date']
+		fields=['name', 'library_member', 'article', 'book', 'date', 'due_date', 'days_overdue', 'accrued_fine']
 	)
 
+def accrue_overdue_fines(as_of=None):
+	"""Recompute days overdue and fines accrued on every open loan
+
+	Runs nightly. Each open Issue gets its days overdue and the fine accrued
+	so far at its member's Member Type rate in one UPDATE, then members'
+	accrued totals are rolled up in a second one. The accrual is kept in
+	accrued_fine; fine_amount stays the fine charged by the Return, which is
+	what gets posted to the fine ledger when the book comes back.
+	"""
+	params = {
+		'as_of': getdate(as_of),
+		'default_rate': get_loan_policy().late_fee_per_day
+	}
+
+	frappe.db.sql("""
+		UPDATE `tabLibrary Transaction` lt
+		INNER JOIN `tabLibrary Member` m ON m.name = lt.library_member
+		LEFT JOIN `tabMember Type` mt ON mt.name = m.member_type AND mt.disabled = 0
+		SET
+			lt.days_overdue = GREATEST(DATEDIFF(%(as_of)s, lt.due_date), 0),
+			lt.is_overdue = DATEDIFF(%(as_of)s, lt.due_date) > 0,
+			lt.accrued_fine = GREATEST(DATEDIFF(%(as_of)s, lt.due_date), 0)
+				* IFNULL(mt.late_fee_per_day, %(default_rate)s)
+		WHERE lt.transaction_type = 'Issue' AND lt.status = 'Issued'
+		AND lt.docstatus = 1 AND lt.due_date IS NOT NULL
+	""", params)
+
+	frappe.db.sql("""
+		UPDATE `tabLibrary Member` m
+		LEFT JOIN (
+			SELECT library_member, SUM(accrued_fine) AS accrued
+			FROM `tabLibrary Transaction`
+			WHERE transaction_type = 'Issue' AND status = 'Issued' AND docstatus = 1
+			GROUP BY library_member
+		) a ON a.library_member = m.name
+		SET m.accrued_fines = IFNULL(a.accrued, 0)
+	""")
+
+	frappe.db.commit()
+
 @frappe.whitelist()
 def get_available_books_for_member(article, member):
 	"""Get available books and member's reserved books for the selected article"""
@@ -373,16 +512,17 @@ def create_return_transaction(issue_transaction):
 	"""Create return transaction from issue transaction"""
 	issue_doc = frappe.get_doc('Library Transaction', issue_transaction)
 
-	# Validate that the issue transaction is actually issued
-	if issue_doc.transaction_type != 'Issue' or issue_doc.status != 'Issued':
+	# Validate that the issue transaction is the copy's open loan
+	loan = get_open_loan(issue_doc.book)
+	if issue_doc.transaction_type != 'Issue' or not loan or loan.issue_transaction != issue_doc.name:
 		frappe.throw(f"Cannot create return for transaction {issue_transaction}. Transaction type: {issue_doc.transaction_type}, Status: {issue_doc.status}")
 
-	# Check if return already exists
+	# Check if a return is already being prepared for this loan
 	existing_return = frappe.db.exists('Library Transaction', {
 		'book': issue_doc.book,
 		'library_member': issue_doc.library_member,
 		'transaction_type': 'Return',
-		'docstatus': ['!=', 2]  # Not cancelled
+		'docstatus': 0
 	})
 
 	if existing_return:
@@ -403,9 +543,406 @@ def create_return_transaction(issue_transaction):
 
 	return return_doc
 
+def make_transaction_names(count):
+	"""Reserve `count` consecutive names from the LT-.#### series in one go"""
+	from frappe.model.naming import getseries
+
+	# getseries creates the series row if needed and keeps it locked until
+	# commit, so the range below cannot interleave with other allocators
+	first = cint(getseries("LT-", 4))
+	if count > 1:
+		frappe.db.sql("UPDATE `tabSeries` SET `current` = `current` + %s WHERE `name` = %s",
+			(count - 1, "LT-"))
+
+	return [f"LT-{number:04d}" for number in range(first, first + count)]
+
+@frappe.whitelist()
+def issue_books(member, barcodes):
+	"""Issue several copies to one member in a single call
+
+	All barcodes are resolved and validated together; nothing is issued if
+	any of them fails. Transactions are inserted as submitted rows in bulk,
+	and book, article, reservation and history side effects are applied once
+	per article and once per member within the request's DB transaction.
+	"""
+	frappe.only_for(['Librarian', 'System Manager'])
+
+	if isinstance(barcodes, str):
+		barcodes = frappe.parse_json(barcodes) if barcodes.strip().startswith("[") else barcodes.split()
+	barcodes = [barcode.strip() for barcode in barcodes if barcode and barcode.strip()]
+	if not barcodes:
+		frappe.throw("Scan at least one barcode")
+
+	member_row = frappe.db.sql("""
+		SELECT m.name, m.member_type, m.open_loans, m.outstanding_fines
+		FROM `tabLibrary Member` m
+		WHERE m.name = %s
+	""", [member], as_dict=True)
+	if not member_row:
+		frappe.throw(f"Library Member {member} not found")
+	member_row = member_row[0]
+	policy = get_loan_policy(member_row.member_type)
+
+	# Lock every copy up front so the checks below cannot go stale. Reservations
+	# are grouped first so a copy more than one of them points at is read once
+	books = frappe.db.sql("""
+		SELECT
+			b.name, b.article, b.status, b.copy_number, b.barcode,
+			a.title AS article_title, a.primary_author AS author,
+			br.name AS reservation
+		FROM `tabBook` b
+		INNER JOIN `tabArticle_New` a ON a.name = b.article
+		LEFT JOIN (
+			SELECT selected_book, MIN(name) AS name
+			FROM `tabBook Reservation`
+			WHERE member = %(member)s AND status = 'Active' AND docstatus = 1
+			AND IFNULL(selected_book, '') != ''
+			GROUP BY selected_book
+		) br ON br.selected_book = b.name
+		WHERE b.barcode IN %(barcodes)s
+		FOR UPDATE
+	""", {'member': member, 'barcodes': barcodes}, as_dict=True)
+	books_by_barcode = {book.barcode: book for book in books}
+
+	errors = []
+	if len(set(barcodes)) != len(barcodes):
+		errors.append("The same barcode was scanned more than once")
+	for barcode in barcodes:
+		book = books_by_barcode.get(barcode)
+		if not book:
+			errors.append(f"{barcode}: no book copy with this barcode")
+		elif book.status == 'Reserved' and not book.reservation:
+			errors.append(f"{barcode}: reserved for another member")
+		elif book.status not in ('Available', 'Reserved'):
+			errors.append(f"{barcode}: not available for issue (status {book.status})")
+	if policy.max_books_allowed and cint(member_row.open_loans) + len(barcodes) > policy.max_books_allowed:
+		errors.append(f"Borrowing limit reached: member has {cint(member_row.open_loans)} of {policy.max_books_allowed} books allowed on loan")
+	if errors:
+		frappe.throw("<br>".join(errors), title="Cannot issue books")
+
+	claim_loan_slots(member, len(books), policy.max_books_allowed)
+
+	if member_row.outstanding_fines and member_row.outstanding_fines > 0:
+		frappe.msgprint(f"Member has outstanding fines of {member_row.outstanding_fines}")
+
+	issue_date = now_datetime()
+	due_date = add_days(getdate(issue_date), policy.loan_period_days)
+	timestamp = now()
+	user = frappe.session.user
+	names = make_transaction_names(len(books))
+
+	fields = ['name', 'creation', 'modified', 'owner', 'modified_by', 'docstatus', 'idx',
+		'article', 'book', 'library_member', 'transaction_type', 'date', 'article_title', 'author',
+		'copy_number', 'barcode', 'due_date', 'is_overdue', 'fine_amount', 'status', 'librarian']
+	values = [(
+		name, timestamp, timestamp, user, user, 1, 0,
+		book.article, book.name, member, 'Issue', issue_date, book.article_title, book.author,
+		book.copy_number, book.barcode, due_date, 0, 0, 'Issued', user
+	) for name, book in zip(names, books)]
+	frappe.db.bulk_insert('Library Transaction', fields, values)
+	register_open_loans({
+		'book': book.name,
+		'article': book.article,
+		'library_member': member,
+		'issue_transaction': name,
+		'issue_date': issue_date
+	} for name, book in zip(names, books))
+
+	update_books_status(books, 'Issued', {'last_issue_date': getdate(issue_date)})
+
+	# Reservations held for this member on the issued copies are now fulfilled
+	reserved_books = [book.name for book in books if book.reservation]
+	if reserved_books:
+		frappe.db.sql("""
+			UPDATE `tabBook Reservation`
+			SET status = 'Fulfilled', modified = %(modified)s, modified_by = %(user)s
+			WHERE selected_book IN %(books)s AND member = %(member)s
+			AND status = 'Active' AND docstatus = 1
+		""", {'books': reserved_books, 'member': member, 'modified': timestamp, 'user': user})
+		clear_reservation_queue_cache([book.article for book in books if book.reservation])
+
+	for book in books:
+		queue_history_entry(member, {
+			"transaction_type": "Issue",
+			"article": book.article,
+			"article_title": book.article_title,
+			"book": book.name,
+			"copy_number": book.copy_number,
+			"transaction_date": issue_date,
+			"due_date": due_date,
+			"return_date": None,
+			"status": "Active",
+			"fine_amount": 0
+		})
+		if book.reservation:
+			queue_history_update(member, {
+				"transaction_type": "Reservation",
+				"article": book.article,
+				"status": "Active"
+			}, {
+				"status": "Reservation Fulfilled",
+				"return_date": issue_date
+			})
+
+	frappe.msgprint(f"Issued {len(books)} books to {member}")
+
+	return [{'transaction': name, 'book': book.name, 'barcode': book.barcode, 'due_date': due_date}
+		for name, book in zip(names, books)]
+
+def close_issue_transactions(issue_names):
+	"""Mark settled issue transactions as Returned and release them from their members"""
+	if not issue_names:
+		return
+
+	params = {'issues': list(issue_names), 'modified': now(), 'user': frappe.session.user}
+
+	frappe.db.sql("""
+		UPDATE `tabLibrary Member` m
+		INNER JOIN (
+			SELECT library_member, COUNT(*) AS loans, SUM(accrued_fine) AS accrued
+			FROM `tabLibrary Transaction`
+			WHERE name IN %(issues)s AND status = 'Issued'
+			GROUP BY library_member
+		) a ON a.library_member = m.name
+		SET
+			m.open_loans = GREATEST(IFNULL(m.open_loans, 0) - a.loans, 0),
+			m.accrued_fines = GREATEST(IFNULL(m.accrued_fines, 0) - a.accrued, 0)
+	""", params)
+
+	frappe.db.sql("""
+		UPDATE `tabLibrary Transaction`
+		SET status = 'Returned', modified = %(modified)s, modified_by = %(user)s
+		WHERE name IN %(issues)s AND status = 'Issued'
+	""", params)
+
+	close_open_loans(issue_names)
+
+# Returns committed per batch by the book-drop check-in
+CHECKIN_BATCH_SIZE = 100
+
+@frappe.whitelist()
+def check_in_books(barcodes, return_date=None):
+	"""Process a book drop: return every scanned copy that is out on loan
+
+	Open loans are found for all barcodes in one query, which also computes
+	the overdue days of every loan in the same pass. Returns are inserted as
+	submitted rows and committed in batches of CHECKIN_BATCH_SIZE; returned
+	copies are held for waiting reservations before each batch commits.
+	"""
+	frappe.only_for(['Librarian', 'System Manager'])
+
+	if isinstance(barcodes, str):
+		barcodes = frappe.parse_json(barcodes) if barcodes.strip().startswith("[") else barcodes.split()
+	barcodes = list(dict.fromkeys(barcode.strip() for barcode in barcodes if barcode and barcode.strip()))
+	if not barcodes:
+		frappe.throw("Scan at least one barcode")
+
+	return_date = frappe.utils.get_datetime(return_date) if return_date else now_datetime()
+
+	loans = frappe.db.sql("""
+		SELECT
+			lt.name AS issue, lt.library_member, lt.due_date,
+			b.name AS book, b.article, b.status, b.copy_number, b.barcode,
+			a.title AS article_title, a.primary_author AS author,
+			GREATEST(DATEDIFF(%(return_date)s, lt.due_date), 0) AS overdue_days,
+			IFNULL(mt.late_fee_per_day, %(default_rate)s) AS fine_per_day
+		FROM `tabBook` b
+		INNER JOIN `tabOpen Loan` ol ON ol.name = b.name
+		INNER JOIN `tabLibrary Transaction` lt ON lt.name = ol.issue_transaction
+		INNER JOIN `tabArticle_New` a ON a.name = b.article
+		LEFT JOIN `tabLibrary Member` m ON m.name = lt.library_member
+		LEFT JOIN `tabMember Type` mt ON mt.name = m.member_type AND mt.disabled = 0
+		WHERE b.barcode IN %(barcodes)s
+	""", {
+		'barcodes': barcodes,
+		'return_date': getdate(return_date),
+		'default_rate': get_loan_policy().late_fee_per_day
+	}, as_dict=True)
+
+	for loan in loans:
+		loan.fine_amount = flt(loan.overdue_days * loan.fine_per_day)
+
+	returned = []
+	for start in range(0, len(loans), CHECKIN_BATCH_SIZE):
+		batch = loans[start:start + CHECKIN_BATCH_SIZE]
+		returned += commit_return_batch(batch, return_date)
+
+	# Includes copies a concurrent check-in returned first
+	returned_barcodes = {row['barcode'] for row in returned}
+	not_on_loan = [barcode for barcode in barcodes if barcode not in returned_barcodes]
+
+	return {
+		'returned': returned,
+		'not_on_loan': not_on_loan,
+		'total_fines': sum(flt(row['fine_amount']) for row in returned)
+	}
+
+def commit_return_batch(loans, return_date):
+	"""Insert and commit the returns of one check-in batch"""
+	# Lock the copies, then keep only loans still open under that lock, so a
+	# double scan or a retried drop cannot return the same loan twice
+	books = lock_books([loan.book for loan in loans])
+	open_issues = set(frappe.db.sql_list("""
+		SELECT issue_transaction
+		FROM `tabOpen Loan`
+		WHERE name IN %(books)s
+		FOR UPDATE
+	""", {'books': [loan.book for loan in loans]}))
+	loans = [loan for loan in loans if loan.issue in open_issues]
+	if not loans:
+		frappe.db.commit()
+		return []
+
+	returning = {loan.book for loan in loans}
+	timestamp = now()
+	user = frappe.session.user
+	names = make_transaction_names(len(loans))
+
+	fields = ['name', 'creation', 'modified', 'owner', 'modified_by', 'docstatus', 'idx',
+		'article', 'book', 'library_member', 'transaction_type', 'date', 'article_title', 'author',
+		'copy_number', 'barcode', 'due_date', 'return_date', 'is_overdue', 'days_overdue', 'fine_amount', 'status', 'librarian']
+	values = [(
+		name, timestamp, timestamp, user, user, 1, 0,
+		loan.article, loan.book, loan.library_member, 'Return', return_date, loan.article_title, loan.author,
+		loan.copy_number, loan.barcode, loan.due_date, return_date, cint(loan.overdue_days > 0), loan.overdue_days, loan.fine_amount,
+		'Returned', user
+	) for name, loan in zip(names, loans)]
+	frappe.db.bulk_insert('Library Transaction', fields, values)
+
+	close_issue_transactions([loan.issue for loan in loans])
+	release_books_to_queue([book for book in books if book.name in returning])
+
+	for name, loan in zip(names, loans):
+		if loan.fine_amount > 0:
+			make_fine_entry(loan.library_member, 'Accrual', loan.fine_amount,
+				library_transaction=name, remarks=f"Late return of {loan.book}")
+
+		queue_history_update(loan.library_member, {
+			"transaction_type": "Issue",
+			"book": loan.book,
+			"status": "Active"
+		}, {
+			"status": "Completed",
+			"return_date": return_date,
+			"fine_amount": loan.fine_amount
+		})
+		queue_history_entry(loan.library_member, {
+			"transaction_type": "Return",
+			"article": loan.article,
+			"article_title": loan.article_title,
+			"book": loan.book,
+			"copy_number": loan.copy_number,
+			"transaction_date": return_date,
+			"due_date": None,
+			"return_date": return_date,
+			"status": "Completed",
+			"fine_amount": loan.fine_amount
+		})
+
+	frappe.db.commit()
+
+	return [{'transaction': name, 'book': loan.book, 'barcode': loan.barcode,
+		'library_member': loan.library_member, 'fine_amount': loan.fine_amount}
+		for name, loan in zip(names, loans)]
+
+# Renewal period and limit of each open loan's member, defaults from the policy resolver
+RENEWAL_POLICY_JOIN = """
+	INNER JOIN `tabLibrary Member` m ON m.name = lt.library_member
+	LEFT JOIN `tabMember Type` mt ON mt.name = m.member_type AND mt.disabled = 0
+"""
+RENEWAL_PERIOD = "IFNULL(NULLIF(mt.renewal_period_days, 0), IFNULL(mt.loan_period_days, %(default_period)s))"
+MAX_RENEWALS = "IFNULL(mt.max_renewals_allowed, %(default_max_renewals)s)"
+
+@frappe.whitelist()
+def renew_loans(transactions=None, member=None):
+	"""Extend the due date of every eligible open loan in one pass
+
+	Renews the given Issue transactions, all open loans of `member`, or
+	every open loan in the library when neither is given (e.g. ahead of a
+	closure). A loan is eligible while it is not overdue, has renewals left
+	under its member's policy and nobody else is waiting for the article.
+	Due dates move by the renewal period and renewal_count goes up by one;
+	no documents are created.
+	"""
+	frappe.has_permission('Library Transaction', 'write', throw=True)
+	if isinstance(transactions, str):
+		transactions = frappe.parse_json(transactions)
+	if not transactions and not member:
+		frappe.only_for(['Librarian', 'System Manager'])
+
+	policy = get_loan_policy()
+	params = {
+		'today': getdate(),
+		'default_period': policy.renewal_period_days,
+		'default_max_renewals': policy.max_renewals_allowed,
+		'transactions': transactions or [''],
+		'member': member
+	}
+
+	conditions = []
+	if transactions:
+		conditions.append("lt.name IN %(transactions)s")
+	if member:
+		conditions.append("lt.library_member = %(member)s")
+	conditions = "".join(f" AND {condition}" for condition in conditions)
+
+	# Lock the loans and compute their new due dates in one statement
+	loans = frappe.db.sql(f"""
+		SELECT
+			lt.name, lt.library_member, lt.book,
+			DATE_ADD(lt.due_date, INTERVAL {RENEWAL_PERIOD} DAY) AS new_due_date
+		FROM `tabLibrary Transaction` lt
+		{RENEWAL_POLICY_JOIN}
+		WHERE lt.transaction_type = 'Issue' AND lt.status = 'Issued' AND lt.docstatus = 1
+		AND lt.due_date >= %(today)s
+		AND IFNULL(lt.renewal_count, 0) < {MAX_RENEWALS}
+		AND NOT EXISTS (
+			SELECT 1
+			FROM `tabBook Reservation` br
+			WHERE br.article = lt.article AND br.member != lt.library_member
+			AND br.status = 'Active' AND br.docstatus = 1
+		)
+		{conditions}
+		FOR UPDATE
+	""", params, as_dict=True)
+
+	if loans:
+		params['loans'] = [loan.name for loan in loans]
+		params['modified'] = now()
+		params['user'] = frappe.session.user
+		frappe.db.sql(f"""
+			UPDATE `tabLibrary Transaction` lt
+			{RENEWAL_POLICY_JOIN}
+			SET
+				lt.due_date = DATE_ADD(lt.due_date, INTERVAL {RENEWAL_PERIOD} DAY),
+				lt.renewal_count = IFNULL(lt.renewal_count, 0) + 1,
+				lt.modified = %(modified)s,
+				lt.modified_by = %(user)s
+			WHERE lt.name IN %(loans)s
+		""", params)
+
+		for loan in loans:
+			queue_history_update(loan.library_member, {
+				"transaction_type": "Issue",
+				"book": loan.book,
+				"status": "Active"
+			}, {
+				"due_date": loan.new_due_date
+			})
+
+	renewed = {loan.name for loan in loans}
+	return {
+		'renewed': [{'transaction': loan.name, 'due_date': loan.new_due_date} for loan in loans],
+		'not_renewed': [name for name in (transactions or []) if name not in renewed]
+	}
+
 @frappe.whitelist()
 def get_book_query(doctype, txt, searchfield, start, page_len, filters):
-	"""Filter books based on selected article and transaction type"""
+	"""Filter books based on selected article and transaction type
+
+	Runs on every keystroke of the Book picker: typed text goes through the
+	prefix/trigram search and member scoping is done with joins.
+	"""
 	if not filters:
 		filters = {}
 
@@ -414,64 +951,47 @@ def get_book_query(doctype, txt, searchfield, start, page_len, filters):
 	transaction_type = filters.get('transaction_type')
 	library_member = filters.get('library_member')
 
-	if not article:
-		# If no article selected, return all books
-		return frappe.db.sql("""
-			SELECT name, copy_number, barcode, status
-			FROM `tabBook`
-			WHERE name LIKE %(txt)s OR barcode LIKE %(txt)s
-			ORDER BY copy_number
-			LIMIT %(start)s, %(page_len)s
-		""", {
-			'txt': f"%{txt}%",
-			'start': start,
-			'page_len': page_len
-		})
-
-	# Build dynamic query conditions
-	conditions = ["article = %(article)s"]
 	query_params = {
-		'txt': f"%{txt}%",
 		'article': article,
-		'start': start,
-		'page_len': page_len
+		'library_member': library_member,
+		'start': cint(start),
+		'page_len': cint(page_len)
 	}
-
-	if transaction_type == 'Issue':
-		# For issue transactions, show available books and reserved books for this member
-		if library_member:
-			conditions.append("""
-				(status = 'Available' OR
-				 (status = 'Reserved' AND name IN (
-					SELECT selected_book FROM `tabBook Reservation`
-					WHERE member = %(library_member)s
-					AND status = 'Active'
-					AND docstatus = 1
-					AND selected_book IS NOT NULL
-				 )))
-			""")
-		else:
-			conditions.append("status = 'Available'")
-	elif transaction_type == 'Return' and library_member:
-		# For return transactions, only show books issued to this member
-		conditions.append("""
-			status = 'Issued' AND name IN (
-				SELECT book FROM `tabLibrary Transaction`
-				WHERE library_member = %(library_member)s
-				AND status = 'Issued'
-				AND docstatus = 1
-			)
-		""")
-		query_params['library_member'] = library_member
+	search_join, search_condition = get_book_search(txt, query_params)
+	conditions = [search_condition]
+	joins = ""
+
+	if article:
+		conditions.append("b.article = %(article)s")
+
+		if transaction_type == 'Issue':
+			# For issue transactions, show available books and reserved books for this member
+			if library_member:
+				joins = """
+					LEFT JOIN `tabBook Reservation` br ON br.selected_book = b.name
+						AND br.member = %(library_member)s AND br.status = 'Active' AND br.docstatus = 1
+				"""
+				conditions.append("(b.status = 'Available' OR (b.status = 'Reserved' AND br.name IS NOT NULL))")
+			else:
+				conditions.append("b.status = 'Available'")
+		elif transaction_type == 'Return' and library_member:
+			# For return transactions, only show books issued to this member
+			joins = """
+				INNER JOIN `tabLibrary Transaction` lt ON lt.book = b.name
+					AND lt.library_member = %(library_member)s AND lt.transaction_type = 'Issue'
+					AND lt.status = 'Issued' AND lt.docstatus = 1
+			"""
+			conditions.append("b.status = 'Issued'")
 
 	where_clause = " AND ".join(conditions)
 
 	return frappe.db.sql(f"""
-		SELECT name, copy_number, barcode, status, `condition`
-		FROM `tabBook`
+		SELECT DISTINCT b.name, b.copy_number, b.barcode, b.status, b.`condition`
+		FROM `tabBook` b
+		{search_join}
+		{joins}
 		WHERE {where_clause}
-		AND (name LIKE %(txt)s OR barcode LIKE %(txt)s)
-		ORDER BY copy_number
+		ORDER BY b.copy_number
 		LIMIT %(start)s, %(page_len)s
 	""", query_params)
 
@@ -0,0 +1,61 @@
+// Copyright (c) 2026, Vtech Technologies and contributors
+// For license information, please see license.txt
+
+frappe.listview_settings['Library Transaction'] = {
+	onload: function(listview) {
+		listview.page.add_inner_button(__('Book Drop Check-in'), function() {
+			frappe.prompt([
+				{
+					fieldname: 'barcodes',
+					fieldtype: 'Small Text',
+					label: __('Barcodes'),
+					description: __('Scan one barcode per line'),
+					reqd: 1
+				}
+			],
+			function(data) {
+				frappe.call({
+					method: 'library_management.library_management.doctype.library_transaction.library_transaction.check_in_books',
+					args: {
+						barcodes: data.barcodes
+					},
+					freeze: true,
+					freeze_message: __('Processing returns...'),
+					callback: function(r) {
+						if (!r.message) {
+							return;
+						}
+
+						let message = __('Returned {0} books. Fines: {1}', [
+							r.message.returned.length,
+							format_currency(r.message.total_fines)
+						]);
+						if (r.message.not_on_loan.length) {
+							message += '<br>' + __('Not on loan: {0}', [r.message.not_on_loan.join(', ')]);
+						}
+						frappe.msgprint(message, __('Book Drop Check-in'));
+						listview.refresh();
+					}
+				});
+			},
+			__('Book Drop Check-in'),
+			__('Check In')
+			);
+		});
+
+		listview.page.add_inner_button(__('Renew All Eligible Loans'), function() {
+			frappe.confirm(__('Extend the due date of every eligible open loan in the library?'), function() {
+				frappe.call({
+					method: 'library_management.library_management.doctype.library_transaction.library_transaction.renew_loans',
+					freeze: true,
+					callback: function(r) {
+						if (r.message) {
+							frappe.msgprint(__('Renewed {0} loans', [r.message.renewed.length]));
+							listview.refresh();
+						}
+					}
+				});
+			});
+		});
+	}
+};
@@ -1,8 +1,234 @@
 # Copyright (c) 2022, Vtech Technologies and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 import unittest
+from unittest.mock import patch
+from library_management.library_management.doctype.member_type.member_type import get_loan_policy
+
+def make_article(title="_Test Circulation Article", copies=2):
+	"""Article with `copies` Available book copies"""
+	from library_management.library_management.doctype.article_new.article_new import provision_book_copies
+
+	article = frappe.get_doc({
+		"doctype": "Article_New",
+		"title": title,
+		"copies_to_create": copies
+	}).insert(ignore_permissions=True)
+	provision_book_copies(article.name, copies)
+	return article
+
+def make_member(first_name="_Test Borrower"):
+	return frappe.get_doc({
+		"doctype": "Library Member",
+		"first_name": first_name
+	}).insert(ignore_permissions=True)
+
+def make_issue(article, book, member, submit=True):
+	transaction = frappe.get_doc({
+		"doctype": "Library Transaction",
+		"article": article,
+		"book": book,
+		"library_member": member,
+		"transaction_type": "Issue"
+	}).insert(ignore_permissions=True)
+	if submit:
+		transaction.submit()
+	return transaction
 
 class TestLibraryTransaction(unittest.TestCase):
-	pass
+	def setUp(self):
+		frappe.db.rollback()
+		self.article = make_article()
+		self.books = frappe.get_all("Book", filters={"article": self.article.name},
+			pluck="name", order_by="copy_number")
+		self.member = make_member()
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_validate_loads_context_in_one_query(self):
+		"""All validators share a single context query"""
+		transaction = frappe.get_doc({
+			"doctype": "Library Transaction",
+			"article": self.article.name,
+			"book": self.books[0],
+			"library_member": self.member.name,
+			"transaction_type": "Issue"
+		})
+
+		# Warm the policy cache; resolved policies are shared across requests
+		get_loan_policy()
+
+		with patch.object(frappe.db, "sql", wraps=frappe.db.sql) as sql:
+			transaction.validate()
+
+		self.assertEqual(sql.call_count, 1)
+		self.assertIsNotNone(transaction.due_date)
+
+	def test_issue_books_in_one_call(self):
+		"""Batch issue inserts every transaction and applies side effects per article"""
+		from library_management.library_management.doctype.library_transaction.library_transaction import issue_books
+
+		barcodes = frappe.get_all("Book", filters={"name": ["in", self.books]}, pluck="barcode")
+		issued = issue_books(self.member.name, barcodes)
+
+		self.assertEqual(len(issued), len(self.books))
+		for row in issued:
+			self.assertEqual(frappe.db.get_value("Library Transaction", row["transaction"], "status"), "Issued")
+			self.assertEqual(frappe.db.get_value("Book", row["book"], "status"), "Issued")
+
+		available, issued_copies = frappe.db.get_value("Article_New", self.article.name,
+			["available_copies", "issued_copies"])
+		self.assertEqual(available, 0)
+		self.assertEqual(issued_copies, len(self.books))
+
+	def test_issue_books_is_all_or_nothing(self):
+		"""A single unavailable copy rejects the whole batch"""
+		from library_management.library_management.doctype.library_transaction.library_transaction import issue_books
+
+		make_issue(self.article.name, self.books[0], self.member.name)
+		barcodes = frappe.get_all("Book", filters={"name": ["in", self.books]}, pluck="barcode")
+
+		self.assertRaises(frappe.ValidationError, issue_books, self.member.name, barcodes)
+		self.assertEqual(frappe.db.get_value("Book", self.books[1], "status"), "Available")
+
+	def test_check_in_books_returns_open_loans(self):
+		"""Book drop closes each issue, frees the copy and reports unknown barcodes"""
+		from library_management.library_management.doctype.library_transaction.library_transaction import check_in_books
+
+		issue = make_issue(self.article.name, self.books[0], self.member.name)
+		barcode = frappe.db.get_value("Book", self.books[0], "barcode")
+
+		with patch.object(frappe.db, "commit"):
+			result = check_in_books([barcode, "_Test Unknown Barcode"])
+
+		self.assertEqual([row["book"] for row in result["returned"]], [self.books[0]])
+		self.assertEqual(result["not_on_loan"], ["_Test Unknown Barcode"])
+		self.assertEqual(frappe.db.get_value("Library Transaction", issue.name, "status"), "Returned")
+		self.assertEqual(frappe.db.get_value("Book", self.books[0], "status"), "Available")
+
+	def test_check_in_skips_loans_returned_concurrently(self):
+		"""A batch planned before another drop returned the copy inserts nothing"""
+		from library_management.library_management.doctype.library_transaction.library_transaction import (
+			check_in_books,
+			commit_return_batch
+		)
+
+		issue = make_issue(self.article.name, self.books[0], self.member.name)
+		barcode = frappe.db.get_value("Book", self.books[0], "barcode")
+		stale_loan = frappe._dict(issue=issue.name, book=self.books[0], barcode=barcode)
+
+		with patch.object(frappe.db, "commit"):
+			check_in_books([barcode])
+			self.assertEqual(commit_return_batch([stale_loan], frappe.utils.now_datetime()), [])
+
+		self.assertEqual(frappe.db.count("Library Transaction", {
+			"book": self.books[0],
+			"transaction_type": "Return"
+		}), 1)
+
+	def test_accrue_overdue_fines_on_open_loans(self):
+		"""The nightly job prices open overdue loans at the member's rate"""
+		from library_management.library_management.doctype.library_transaction.library_transaction import accrue_overdue_fines
+
+		issue = make_issue(self.article.name, self.books[0], self.member.name)
+		frappe.db.set_value("Library Transaction", issue.name, "due_date", frappe.utils.add_days(frappe.utils.today(), -3))
+		frappe.db.set_single_value("Library Settings", "fine_per_day", 2)
+
+		with patch.object(frappe.db, "commit"):
+			accrue_overdue_fines()
+
+		days_overdue, accrued_fine, is_overdue, fine_amount = frappe.db.get_value("Library Transaction", issue.name,
+			["days_overdue", "accrued_fine", "is_overdue", "fine_amount"])
+		self.assertEqual((days_overdue, accrued_fine, is_overdue), (3, 6, 1))
+		# The fine charged is left to the Return
+		self.assertEqual(fine_amount, 0)
+		self.assertEqual(frappe.db.get_value("Library Member", self.member.name, "accrued_fines"), 6)
+
+	def test_member_type_borrowing_limit(self):
+		"""Issues count against the member's open loans up to their Member Type limit"""
+		member_type = frappe.get_doc({
+			"doctype": "Member Type",
+			"member_type_name": "_Test Single Loan",
+			"priority_level": 1,
+			"max_books_allowed": 1,
+			"loan_period_days": 7,
+			"max_renewals_allowed": 0,
+			"renewal_period_days": 0,
+			"membership_fee_annual": 0,
+			"late_fee_per_day": 0,
+			"reservation_fee": 0,
+			"processing_fee": 0
+		}).insert(ignore_permissions=True)
+		frappe.db.set_value("Library Member", self.member.name, "member_type", member_type.name)
+
+		issue = make_issue(self.article.name, self.books[0], self.member.name)
+		self.assertEqual(frappe.db.get_value("Library Member", self.member.name, "open_loans"), 1)
+		self.assertEqual(frappe.utils.date_diff(issue.due_date, issue.date), 7)
+
+		self.assertRaises(frappe.ValidationError, make_issue, self.article.name, self.books[1], self.member.name)
+
+	def test_renew_loans_extends_due_date_in_place(self):
+		"""Renewals move the due date without new documents, up to the allowed count"""
+		from library_management.library_management.doctype.library_transaction.library_transaction import renew_loans
+
+		issue = make_issue(self.article.name, self.books[0], self.member.name)
+		transactions = frappe.db.count("Library Transaction")
+		policy = get_loan_policy()
+
+		for renewal in range(policy.max_renewals_allowed):
+			result = renew_loans([issue.name])
+			self.assertEqual(len(result["renewed"]), 1)
+
+		due_date, renewal_count = frappe.db.get_value("Library Transaction", issue.name, ["due_date", "renewal_count"])
+		self.assertEqual(renewal_count, policy.max_renewals_allowed)
+		self.assertEqual(frappe.utils.date_diff(due_date, issue.due_date),
+			policy.max_renewals_allowed * policy.renewal_period_days)
+
+		self.assertEqual(renew_loans([issue.name])["not_renewed"], [issue.name])
+		self.assertEqual(frappe.db.count("Library Transaction"), transactions)
+
+	def test_cancel_issue_releases_the_loan(self):
+		"""Cancelling an open issue removes its registry row, frees the copy and the member's slot"""
+		issue = make_issue(self.article.name, self.books[0], self.member.name)
+		issue.cancel()
+
+		self.assertFalse(frappe.db.exists("Open Loan", self.books[0]))
+		self.assertEqual(frappe.db.get_value("Book", self.books[0], "status"), "Available")
+		self.assertEqual(frappe.db.get_value("Library Member", self.member.name, "open_loans"), 0)
+
+	def test_cancel_return_reverses_its_fine(self):
+		"""Cancelling a late return waives the fine it posted"""
+		from library_management.library_management.doctype.library_transaction.library_transaction import create_return_transaction
+
+		issue = make_issue(self.article.name, self.books[0], self.member.name)
+		frappe.db.set_value("Library Transaction", issue.name, "due_date", frappe.utils.add_days(frappe.utils.today(), -3))
+		return_doc = create_return_transaction(issue.name)
+		return_doc.submit()
+		self.assertGreater(frappe.db.get_value("Library Member", self.member.name, "outstanding_fines"), 0)
+
+		return_doc.cancel()
+
+		self.assertEqual(frappe.db.get_value("Library Member", self.member.name, "outstanding_fines"), 0)
+		self.assertTrue(frappe.db.exists("Fine Ledger Entry", {
+			"library_transaction": return_doc.name, "entry_type": "Waiver"
+		}))
+
+	def test_reconciler_closes_stale_issues(self):
+		"""An issue left open after its return is found by the windowed pass and closed"""
+		from library_management.library_management.doctype.library_transaction.library_transaction import create_return_transaction
+		from library_management.reconciler import reconcile_circulation
+
+		issue = make_issue(self.article.name, self.books[0], self.member.name)
+		create_return_transaction(issue.name).submit()
+		frappe.db.set_value("Library Transaction", issue.name, "status", "Issued", update_modified=False)
+
+		report = reconcile_circulation(repair=False, article=self.article.name)
+		self.assertEqual(report.stale_issues, [issue.name])
+
+		with patch.object(frappe.db, "commit"):
+			reconcile_circulation(article=self.article.name)
+
+		self.assertEqual(frappe.db.get_value("Library Transaction", issue.name, "status"), "Returned")
+		self.assertEqual(reconcile_circulation(repair=False, article=self.article.name).stale_issues, [])
@@ -3,6 +3,14 @@
 
 import frappe
 from frappe.model.document import Document
+from frappe.utils import cint, flt
+
+# Redis hash of resolved loan policies, keyed by Member Type ('' for the defaults)
+LOAN_POLICY_CACHE_KEY = 'library_loan_policy'
+# Used when neither the Member Type nor Library Settings set a loan period
+DEFAULT_LOAN_PERIOD_DAYS = 14
+# Renewals allowed to members without a Member Type
+DEFAULT_MAX_RENEWALS = 1
 
 class MemberType(Document):
 	def validate(self):
@@ -48,6 +56,11 @@ class MemberType(Document):
 		if self.has_value_changed('disabled') and self.disabled:
 			self.validate_disable()
 
+		clear_loan_policy_cache(self.name)
+
+	def on_trash(self):
+		clear_loan_policy_cache(self.name)
+
 	def validate_disable(self):
 		"""Validate before disabling member type"""
 		active_members = frappe.db.count('Library Member', {
@@ -93,6 +106,57 @@ class MemberType(Document):
 
 		return stats
 
+def get_loan_policy(member_type=None):
+	"""Borrowing rules for a Member Type, or the library-wide defaults
+
+	Resolved policies are cached per Member Type in LOAN_POLICY_CACHE_KEY
+	(Redis, fronted by the request-local cache) and dropped whenever the
+	Member Type or Library Settings change.
+	"""
+	return frappe._dict(frappe.cache().hget(LOAN_POLICY_CACHE_KEY, member_type or '',
+		generator=lambda: load_loan_policy(member_type)))
+
+def load_loan_policy(member_type=None):
+	"""Resolve a policy from the database"""
+	settings = frappe.db.get_values_from_single(
+		['loan_period', 'maximum_number_of_issued_articles', 'fine_per_day'],
+		None, 'Library Settings', as_dict=True)
+	settings = settings[0] if settings else frappe._dict()
+
+	loan_period_days = cint(settings.loan_period) or DEFAULT_LOAN_PERIOD_DAYS
+	policy = {
+		'member_type': None,
+		'loan_period_days': loan_period_days,
+		# 0 means no limit
+		'max_books_allowed': cint(settings.maximum_number_of_issued_articles),
+		'late_fee_per_day': flt(settings.fine_per_day) or 1.0,
+		'max_renewals_allowed': DEFAULT_MAX_RENEWALS,
+		'renewal_period_days': loan_period_days
+	}
+
+	rules = member_type and frappe.db.get_value('Member Type', member_type,
+		['loan_period_days', 'max_books_allowed', 'late_fee_per_day',
+		'max_renewals_allowed', 'renewal_period_days', 'disabled'], as_dict=True)
+
+	if rules and not rules.disabled:
+		policy.update({
+			'member_type': member_type,
+			'loan_period_days': cint(rules.loan_period_days),
+			'max_books_allowed': cint(rules.max_books_allowed),
+			'late_fee_per_day': flt(rules.late_fee_per_day),
+			'max_renewals_allowed': cint(rules.max_renewals_allowed),
+			'renewal_period_days': cint(rules.renewal_period_days) or cint(rules.loan_period_days)
+		})
+
+	return policy
+
+def clear_loan_policy_cache(member_type=None):
+	"""Drop one cached policy, or all of them"""
+	if member_type:
+		frappe.cache().hdel(LOAN_POLICY_CACHE_KEY, member_type)
+	else:
+		frappe.cache().delete_key(LOAN_POLICY_CACHE_KEY)
+
 def get_default_member_type():
 	"""Get the default member type (lowest priority level)"""
 	member_type = frappe.db.get_value('Member Type',
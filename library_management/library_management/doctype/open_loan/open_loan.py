@@ -0,0 +1,77 @@
+# Copyright (c) 2026, Vtech Technologies and contributors
+# For license information, please see license.txt
+
+"""Registry of the copies currently on loan
+
+One row per copy out on loan, named by the Book, written when the issue is
+submitted and removed when the copy comes back. Finding the active loan of
+a copy is a primary-key read, and the primary key also makes it impossible
+to register a second loan for a copy that is already out.
+"""
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import now
+
+class OpenLoan(Document):
+	pass
+
+def register_open_loans(loans):
+	"""Record issued copies, given as dicts with book, article, library_member, issue_transaction and issue_date"""
+	loans = list(loans)
+	if not loans:
+		return
+
+	timestamp = now()
+	user = frappe.session.user
+	values = [(
+		loan['book'], timestamp, timestamp, user, user,
+		loan['book'], loan.get('article'), loan['library_member'], loan['issue_transaction'], loan.get('issue_date')
+	) for loan in loans]
+
+	try:
+		frappe.db.bulk_insert('Open Loan',
+			['name', 'creation', 'modified', 'owner', 'modified_by',
+			'book', 'article', 'library_member', 'issue_transaction', 'issue_date'], values)
+	except Exception as e:
+		if frappe.db.is_duplicate_entry(e):
+			frappe.throw("One or more of these copies are already on loan")
+		raise
+
+def close_open_loans(issue_names):
+	"""Remove the registry rows of settled issues"""
+	if issue_names:
+		frappe.db.sql("""
+			DELETE FROM `tabOpen Loan`
+			WHERE issue_transaction IN %(issues)s
+		""", {'issues': list(issue_names)})
+
+def get_open_loan(book):
+	"""The active loan of a copy, or None"""
+	if not book:
+		return None
+
+	return frappe.db.get_value('Open Loan', book,
+		['book', 'article', 'library_member', 'issue_transaction', 'issue_date'], as_dict=True)
+
+def rebuild_open_loan_registry():
+	"""Rebuild the registry from submitted, open Issue transactions"""
+	frappe.db.sql("DELETE FROM `tabOpen Loan`")
+	frappe.db.sql("""
+		INSERT INTO `tabOpen Loan`
+			(name, creation, modified, owner, modified_by, docstatus, idx,
+			book, article, library_member, issue_transaction, issue_date)
+		SELECT
+			lt.book, NOW(), NOW(), 'Administrator', 'Administrator', 0, 0,
+			lt.book, lt.article, lt.library_member, lt.name, lt.date
+		FROM `tabLibrary Transaction` lt
+		WHERE lt.transaction_type = 'Issue' AND lt.status = 'Issued' AND lt.docstatus = 1
+		AND lt.name = (
+			SELECT latest.name
+			FROM `tabLibrary Transaction` latest
+			WHERE latest.book = lt.book AND latest.transaction_type = 'Issue'
+			AND latest.status = 'Issued' AND latest.docstatus = 1
+			ORDER BY latest.date DESC, latest.name DESC
+			LIMIT 1
+		)
+	""")
@@ -0,0 +1,31 @@
+# Copyright (c) 2026, Vtech Technologies and Contributors
+# See license.txt
+
+import frappe
+import unittest
+from library_management.library_management.doctype.library_transaction.test_library_transaction import (
+	make_article,
+	make_issue,
+	make_member
+)
+from library_management.library_management.doctype.open_loan.open_loan import get_open_loan
+
+class TestOpenLoan(unittest.TestCase):
+	def setUp(self):
+		frappe.db.rollback()
+		self.article = make_article("_Test Open Loan Article", copies=1)
+		self.book = frappe.db.get_value("Book", {"article": self.article.name}, "name")
+		self.member = make_member()
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_loan_is_registered_on_issue_and_removed_on_return(self):
+		from library_management.library_management.doctype.library_transaction.library_transaction import create_return_transaction
+
+		issue = make_issue(self.article.name, self.book, self.member.name)
+		loan = get_open_loan(self.book)
+		self.assertEqual((loan.library_member, loan.issue_transaction), (self.member.name, issue.name))
+
+		create_return_transaction(issue.name).submit()
+		self.assertIsNone(get_open_loan(self.book))
@@ -0,0 +1,130 @@
+# Copyright (c) 2026, Vtech Technologies and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import cint, now, today
+
+# Pending notifications claimed per worker run
+NOTIFICATION_BATCH_SIZE = 200
+NOTIFICATION_TEMPLATE = 'templates/emails/reservation_available.html'
+
+class ReservationNotification(Document):
+	pass
+
+def queue_availability_notification(reservation, member, article):
+	"""Queue an availability email for a reservation, at most one pending per member and article"""
+	if frappe.db.exists('Reservation Notification', {
+		'member': member,
+		'article': article,
+		'status': 'Pending'
+	}):
+		return
+
+	frappe.get_doc({
+		'doctype': 'Reservation Notification',
+		'reservation': reservation,
+		'member': member,
+		'article': article,
+		'status': 'Pending'
+	}).insert(ignore_permissions=True)
+
+	# Wake a worker once per transaction; the scheduler picks up anything missed
+	if not getattr(frappe.local, 'library_notifications_pending', False):
+		frappe.local.library_notifications_pending = True
+		frappe.db.after_commit.add(enqueue_notification_processing)
+		frappe.db.after_rollback.add(reset_notification_flag)
+
+def reset_notification_flag():
+	frappe.local.library_notifications_pending = False
+
+def enqueue_notification_processing():
+	reset_notification_flag()
+	frappe.enqueue('library_management.library_management.doctype.reservation_notification.reservation_notification.send_reservation_notifications',
+		queue='short')
+
+def send_reservation_notifications(limit=NOTIFICATION_BATCH_SIZE):
+	"""Send a batch of pending availability emails, one per member and article
+
+	Reservations that are no longer Active or were already notified are
+	skipped. Reservations and notifications are flagged with one UPDATE per
+	outcome instead of a save per document.
+	"""
+	rows = frappe.db.sql("""
+		SELECT
+			n.name, n.reservation, n.member, n.article,
+			r.status AS reservation_status, r.notification_sent, r.article_title, r.author,
+			r.selected_book, r.expiry_date,
+			m.email_address, m.full_name
+		FROM `tabReservation Notification` n
+		INNER JOIN `tabBook Reservation` r ON r.name = n.reservation
+		INNER JOIN `tabLibrary Member` m ON m.name = n.member
+		WHERE n.status = 'Pending'
+		ORDER BY n.creation
+		LIMIT %s
+		FOR UPDATE
+	""", [cint(limit)], as_dict=True)
+
+	if not rows:
+		return 0
+
+	groups = {}
+	for row in rows:
+		groups.setdefault((row.member, row.article), []).append(row)
+
+	outcomes = {'Sent': [], 'Skipped': []}
+	notified = []
+	for (member, article), group in groups.items():
+		names = [row.name for row in group]
+		reservations = {row.reservation: row for row in group
+			if row.reservation_status == 'Active' and not cint(row.notification_sent)}
+
+		if not reservations or not group[0].email_address:
+			outcomes['Skipped'] += names
+			continue
+
+		try:
+			frappe.sendmail(
+				recipients=[group[0].email_address],
+				subject=f"Article Available for Pickup: {group[0].article_title}",
+				message=frappe.render_template(NOTIFICATION_TEMPLATE, {
+					'member_name': group[0].full_name or member,
+					'reservations': list(reservations.values())
+				}),
+				reference_doctype='Book Reservation',
+				reference_name=next(iter(reservations))
+			)
+		except Exception as e:
+			frappe.log_error(f"Error sending availability notification to {member}: {str(e)}")
+			frappe.db.sql("""
+				UPDATE `tabReservation Notification`
+				SET status = 'Failed', error = %(error)s, modified = %(modified)s
+				WHERE name IN %(names)s
+			""", {'names': names, 'error': str(e), 'modified': now()})
+			continue
+
+		outcomes['Sent'] += names
+		notified += list(reservations)
+
+	if notified:
+		frappe.db.sql("""
+			UPDATE `tabBook Reservation`
+			SET notification_sent = 1, notified_date = %(today)s, modified = %(modified)s
+			WHERE name IN %(reservations)s
+		""", {'reservations': notified, 'today': today(), 'modified': now()})
+
+	for status, names in outcomes.items():
+		if names:
+			frappe.db.sql("""
+				UPDATE `tabReservation Notification`
+				SET status = %(status)s, sent_on = %(sent_on)s, modified = %(modified)s
+				WHERE name IN %(names)s
+			""", {
+				'names': names,
+				'status': status,
+				'sent_on': now() if status == 'Sent' else None,
+				'modified': now()
+			})
+
+	frappe.db.commit()
+	return len(outcomes['Sent'])
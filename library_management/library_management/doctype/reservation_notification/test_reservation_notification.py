@@ -0,0 +1,55 @@
+# Copyright (c) 2026, Vtech Technologies and Contributors
+# See license.txt
+
+import frappe
+import unittest
+from unittest.mock import patch
+from library_management.library_management.doctype.book_reservation.test_book_reservation import make_reservation
+from library_management.library_management.doctype.library_transaction.test_library_transaction import (
+	make_article,
+	make_member
+)
+from library_management.library_management.doctype.reservation_notification.reservation_notification import (
+	queue_availability_notification,
+	send_reservation_notifications
+)
+
+class TestReservationNotification(unittest.TestCase):
+	def setUp(self):
+		frappe.db.rollback()
+		self.article = make_article("_Test Notification Article", copies=0)
+		self.member = make_member("_Test Notified Member")
+		frappe.db.set_value("Library Member", self.member.name, "email_address", "_test_notified@example.com")
+		self.reservation = make_reservation(self.article.name, self.member.name)
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_notifications_are_deduplicated_and_flagged(self):
+		"""Repeated triggers send one email and flag the reservation in bulk"""
+		for i in range(3):
+			queue_availability_notification(self.reservation.name, self.member.name, self.article.name)
+
+		self.assertEqual(frappe.db.count("Reservation Notification", {
+			"member": self.member.name,
+			"article": self.article.name,
+			"status": "Pending"
+		}), 1)
+
+		with patch("frappe.sendmail") as sendmail, patch.object(frappe.db, "commit"):
+			self.assertEqual(send_reservation_notifications(), 1)
+
+		sendmail.assert_called_once()
+		self.assertEqual(sendmail.call_args.kwargs["recipients"], ["_test_notified@example.com"])
+		self.assertIn("_Test Notification Article", sendmail.call_args.kwargs["message"])
+
+		notification_sent, notified_date = frappe.db.get_value("Book Reservation", self.reservation.name,
+			["notification_sent", "notified_date"])
+		self.assertEqual(notification_sent, 1)
+		self.assertEqual(str(notified_date), frappe.utils.today())
+
+		# Already notified: a new trigger is recorded but skipped by the worker
+		queue_availability_notification(self.reservation.name, self.member.name, self.article.name)
+		with patch("frappe.sendmail") as sendmail, patch.object(frappe.db, "commit"):
+			self.assertEqual(send_reservation_notifications(), 0)
+		sendmail.assert_not_called()
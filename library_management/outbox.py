@@ -0,0 +1,112 @@
+# Copyright (c) 2026, Vtech Technologies and contributors
+# For license information, please see license.txt
+
+"""Transactional outbox for circulation side effects
+
+post_event() writes a Library Outbox Event row in the caller's transaction,
+so an event exists if and only if the change that caused it was committed.
+Background workers pick pending events up after commit, run the handler
+registered for the topic and retry failures with backoff. Events that keep
+failing are parked as Failed with their traceback instead of being lost.
+"""
+
+import json
+
+import frappe
+from frappe.utils import add_days, add_to_date, cint, now, now_datetime
+
+# Topic -> dotted path of its handler, called as handler(payload)
+OUTBOX_HANDLERS = {
+	'Member History': 'library_management.library_management.doctype.library_member_history.library_member_history.apply_history_event',
+}
+
+# Events claimed per worker run
+OUTBOX_BATCH_SIZE = 100
+# Attempts before an event is parked as Failed
+OUTBOX_MAX_ATTEMPTS = 5
+# Days processed events are kept for auditing
+OUTBOX_RETENTION_DAYS = 7
+
+def post_event(topic, payload, reference_doctype=None, reference_name=None):
+	"""Record a side effect to run once the current transaction commits"""
+	if topic not in OUTBOX_HANDLERS:
+		frappe.throw(f"No outbox handler registered for {topic}")
+
+	frappe.get_doc({
+		'doctype': 'Library Outbox Event',
+		'topic': topic,
+		'payload': json.dumps(payload, default=str),
+		'reference_doctype': reference_doctype,
+		'reference_name': reference_name,
+		'status': 'Pending'
+	}).insert(ignore_permissions=True)
+
+	# Wake a worker once per transaction; the scheduler picks up anything missed
+	if not getattr(frappe.local, 'library_outbox_pending', False):
+		frappe.local.library_outbox_pending = True
+		frappe.db.after_commit.add(enqueue_outbox_processing)
+		frappe.db.after_rollback.add(reset_outbox_flag)
+
+def reset_outbox_flag():
+	frappe.local.library_outbox_pending = False
+
+def enqueue_outbox_processing():
+	reset_outbox_flag()
+	frappe.enqueue('library_management.outbox.process_outbox', queue='short')
+
+def process_outbox(limit=OUTBOX_BATCH_SIZE):
+	"""Run due outbox events, oldest first"""
+	events = frappe.db.sql_list("""
+		SELECT name
+		FROM `tabLibrary Outbox Event`
+		WHERE status = 'Pending'
+		AND (next_attempt_at IS NULL OR next_attempt_at <= %s)
+		ORDER BY creation
+		LIMIT %s
+	""", [now(), cint(limit)])
+
+	return sum(process_outbox_event(name) for name in events)
+
+def process_outbox_event(name):
+	"""Run one event in its own transaction; returns True if it succeeded"""
+	# The row lock makes concurrent workers run each event at most once
+	event = frappe.db.sql("""
+		SELECT name, topic, payload, attempts
+		FROM `tabLibrary Outbox Event`
+		WHERE name = %s AND status = 'Pending'
+		FOR UPDATE
+	""", [name], as_dict=True)
+
+	if not event:
+		frappe.db.commit()
+		return False
+
+	event = event[0]
+	attempts = cint(event.attempts) + 1
+
+	frappe.db.savepoint('outbox_event')
+	try:
+		handler = frappe.get_attr(OUTBOX_HANDLERS[event.topic])
+		handler(json.loads(event.payload or '{}'))
+		values = {'status': 'Done', 'attempts': attempts, 'last_error': None}
+	except Exception as e:
+		frappe.db.rollback(save_point='outbox_event')
+		frappe.log_error(f"Error processing outbox event {name} ({event.topic}): {str(e)}")
+		values = {
+			'status': 'Failed' if attempts >= OUTBOX_MAX_ATTEMPTS else 'Pending',
+			'attempts': attempts,
+			'last_error': frappe.get_traceback(),
+			# Back off 2, 4, 8... minutes between attempts
+			'next_attempt_at': add_to_date(now_datetime(), minutes=2 ** attempts)
+		}
+
+	frappe.db.set_value('Library Outbox Event', name, values)
+	frappe.db.commit()
+	return values['status'] == 'Done'
+
+def purge_processed_events(days=OUTBOX_RETENTION_DAYS):
+	"""Delete processed events older than `days`"""
+	frappe.db.sql("""
+		DELETE FROM `tabLibrary Outbox Event`
+		WHERE status = 'Done' AND modified < %s
+	""", [add_days(now_datetime(), -cint(days))])
@@ -0,0 +1,6 @@
+import frappe
+
+def execute():
+	"""Create the composite indexes behind the circulation hot paths"""
+	for module in ('book', 'book_reservation', 'library_transaction'):
+		frappe.get_attr(f'library_management.library_management.doctype.{module}.{module}.on_doctype_update')()
@@ -0,0 +1,5 @@
+import frappe
+
+def execute():
+	"""Create the index behind the reservation expiry sweep"""
+	frappe.get_attr('library_management.library_management.doctype.book_reservation.book_reservation.on_doctype_update')()
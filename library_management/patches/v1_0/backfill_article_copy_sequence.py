@@ -0,0 +1,14 @@
+import frappe
+
+def execute():
+	"""Start each article's copy number sequence after its highest existing copy"""
+	frappe.reload_doc('library_management', 'doctype', 'article_new')
+	frappe.db.sql("""
+		UPDATE `tabArticle_New` a
+		INNER JOIN (
+			SELECT article, MAX(copy_number) AS last_copy_number
+			FROM `tabBook`
+			GROUP BY article
+		) b ON b.article = a.name
+		SET a.last_copy_number = GREATEST(IFNULL(a.last_copy_number, 0), b.last_copy_number)
+	""")
@@ -0,0 +1,19 @@
+import frappe
+from library_management.library_management.doctype.library_member.library_member import rebuild_open_loans
+
+def execute():
+	"""Close issues already settled by a return and seed members' open-loan counters"""
+	frappe.reload_doc('library_management', 'doctype', 'library_member')
+
+	# Returns used to leave their issue marked as Issued
+	frappe.db.sql("""
+		UPDATE `tabLibrary Transaction` issue
+		INNER JOIN `tabLibrary Transaction` ret ON ret.book = issue.book
+			AND ret.library_member = issue.library_member
+			AND ret.transaction_type = 'Return' AND ret.docstatus = 1
+			AND ret.date >= issue.date
+		SET issue.status = 'Returned'
+		WHERE issue.transaction_type = 'Issue' AND issue.status = 'Issued' AND issue.docstatus = 1
+	""")
+
+	rebuild_open_loans()
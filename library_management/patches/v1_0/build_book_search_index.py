@@ -0,0 +1,7 @@
+import frappe
+from library_management.library_management.doctype.book_search_trigram.book_search_trigram import rebuild_book_search_index
+
+def execute():
+	"""Index existing book copies for the Book picker search"""
+	frappe.reload_doc('library_management', 'doctype', 'book_search_trigram')
+	rebuild_book_search_index()
@@ -0,0 +1,7 @@
+import frappe
+from library_management.library_management.doctype.open_loan.open_loan import rebuild_open_loan_registry
+
+def execute():
+	"""Register the copies currently on loan"""
+	frappe.reload_doc('library_management', 'doctype', 'open_loan')
+	rebuild_open_loan_registry()
@@ -0,0 +1,7 @@
+import frappe
+from library_management.library_management.doctype.article_new.article_new import rebuild_copy_counts
+
+def execute():
+	"""Seed the delta-maintained copy counters from a full recount"""
+	frappe.reload_doc('library_management', 'doctype', 'article_new')
+	rebuild_copy_counts()
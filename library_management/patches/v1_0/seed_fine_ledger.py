@@ -0,0 +1,26 @@
+import frappe
+from library_management.library_management.doctype.fine_ledger_entry.fine_ledger_entry import (
+	make_fine_entry,
+	rebuild_outstanding_fines
+)
+
+def execute():
+	"""Post existing late-return fines to the fine ledger and seed member balances"""
+	frappe.reload_doc('library_management', 'doctype', 'library_member')
+	frappe.reload_doc('library_management', 'doctype', 'fine_ledger_entry')
+
+	fines = frappe.db.sql("""
+		SELECT lt.name, lt.library_member, lt.fine_amount, DATE(lt.date) AS posting_date
+		FROM `tabLibrary Transaction` lt
+		WHERE lt.transaction_type = 'Return' AND lt.fine_amount > 0 AND lt.docstatus = 1
+		AND NOT EXISTS (
+			SELECT 1 FROM `tabFine Ledger Entry` fle
+			WHERE fle.library_transaction = lt.name AND fle.entry_type = 'Accrual'
+		)
+	""", as_dict=True)
+
+	for fine in fines:
+		make_fine_entry(fine.library_member, 'Accrual', fine.fine_amount,
+			library_transaction=fine.name, posting_date=fine.posting_date)
+
+	rebuild_outstanding_fines()
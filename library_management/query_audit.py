@@ -0,0 +1,115 @@
+# Copyright (c) 2026, Vtech Technologies and contributors
+# For license information, please see license.txt
+
+"""EXPLAIN audit of the app's hot queries
+
+HOT_QUERIES mirrors the statements circulation runs on every request:
+pickers, validation, issue/return and the reservation queue. The audit
+runs EXPLAIN on each one and flags tables read by a full table or index
+scan without any usable index, which is what a dropped or never-created
+index looks like regardless of how much data the site holds.
+"""
+
+import frappe
+from library_management.library_management.doctype.book_search_trigram.book_search_trigram import get_book_search
+
+# Placeholder values; plans depend on the indexes, not on matching rows
+AUDIT_PARAMS = {
+	'member': '_audit_member',
+	'book': '_audit_book',
+	'article': '_audit_article',
+	'barcode': '_audit_barcode'
+}
+
+HOT_QUERIES = [
+	("Member's open loans", """
+		SELECT name
+		FROM `tabLibrary Transaction`
+		WHERE library_member = %(member)s AND status = 'Issued' AND docstatus = 1
+	"""),
+	("Open issue of a copy to a member", """
+		SELECT name
+		FROM `tabLibrary Transaction`
+		WHERE book = %(book)s AND library_member = %(member)s
+		AND transaction_type = 'Issue' AND status = 'Issued' AND docstatus = 1
+	"""),
+	("Available copies of an article", """
+		SELECT name
+		FROM `tabBook`
+		WHERE article = %(article)s AND status = 'Available'
+	"""),
+	("Barcode resolution", """
+		SELECT name, article, status, copy_number
+		FROM `tabBook`
+		WHERE barcode = %(barcode)s
+	"""),
+	("Reservation queue head", """
+		SELECT name
+		FROM `tabBook Reservation`
+		WHERE article = %(article)s AND status = 'Active' AND docstatus = 1
+		ORDER BY priority_level DESC, reservation_date ASC
+		LIMIT 1
+	"""),
+	("Member's reservation on a copy", """
+		SELECT name
+		FROM `tabBook Reservation`
+		WHERE selected_book = %(book)s AND member = %(member)s AND status = 'Active' AND docstatus = 1
+	"""),
+	("Return picker", """
+		SELECT DISTINCT b.name
+		FROM `tabBook` b
+		INNER JOIN `tabLibrary Transaction` lt ON lt.book = b.name
+			AND lt.library_member = %(member)s AND lt.transaction_type = 'Issue'
+			AND lt.status = 'Issued' AND lt.docstatus = 1
+		WHERE b.article = %(article)s AND b.status = 'Issued'
+	"""),
+	("Book picker substring search", lambda params: book_picker_search_query('audit-001', params)),
+	("Member's fine ledger", """
+		SELECT name, entry_type, amount
+		FROM `tabFine Ledger Entry`
+		WHERE member = %(member)s
+	"""),
+	("Pending outbox events", """
+		SELECT name
+		FROM `tabLibrary Outbox Event`
+		WHERE status = 'Pending'
+		ORDER BY creation
+		LIMIT 100
+	"""),
+]
+
+def book_picker_search_query(txt, params):
+	join, condition = get_book_search(txt, params)
+	return f"""
+		SELECT b.name
+		FROM `tabBook` b
+		{join}
+		WHERE b.article = %(article)s AND {condition}
+	"""
+
+def explain(query, params):
+	return frappe.db.sql(f"EXPLAIN {query}", params, as_dict=True)
+
+def is_unindexed_scan(plan_row):
+	"""Full table or index scan with no index the optimizer could have used"""
+	table = plan_row.get('table') or ''
+	return (plan_row.get('type') in ('ALL', 'index')
+		and not plan_row.get('possible_keys')
+		and not table.startswith('<'))
+
+def audit_hot_queries():
+	"""EXPLAIN every hot query; returns one result per query with the flagged tables"""
+	results = []
+	for label, query in HOT_QUERIES:
+		params = dict(AUDIT_PARAMS)
+		if callable(query):
+			query = query(params)
+
+		plan = explain(query, params)
+		results.append(frappe._dict({
+			'label': label,
+			'plan': plan,
+			'full_scans': [row.get('table') for row in plan if is_unindexed_scan(row)]
+		}))
+
+	return results
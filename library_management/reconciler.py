@@ -0,0 +1,148 @@
+# Copyright (c) 2026, Vtech Technologies and contributors
+# For license information, please see license.txt
+
+"""Library-wide circulation reconciler
+
+Pairs every submitted transaction with the next one on the same copy in a
+single windowed query and reports what disagrees:
+
+- stale issues: still marked Issued although a later return or issue
+  moved the copy on
+- open loans whose copy is not marked Issued, or which are missing from
+  the Open Loan registry
+- copies marked Issued with no open loan at all
+
+With repair=True the fixes are applied in batches of RECONCILE_BATCH_SIZE,
+each in its own transaction, through the same helpers circulation uses so
+copy counters, member counters and the registry stay in step.
+"""
+
+import frappe
+from library_management.library_management.doctype.book.book import lock_books, update_books_status
+from library_management.library_management.doctype.library_member.library_member import rebuild_open_loans
+from library_management.library_management.doctype.library_transaction.library_transaction import close_issue_transactions
+from library_management.library_management.doctype.open_loan.open_loan import register_open_loans
+
+# Rows repaired per transaction
+RECONCILE_BATCH_SIZE = 1000
+
+def find_issue_anomalies(article=None, member=None):
+	"""Issues that are stale, or open but not reflected on their copy or in the registry"""
+	article_condition = "AND lt.article = %(article)s" if article else ""
+	member_condition = "AND seq.library_member = %(member)s" if member else ""
+
+	return frappe.db.sql(f"""
+		SELECT
+			seq.name, seq.book, seq.article, seq.library_member, seq.date,
+			seq.next_transaction, seq.next_type,
+			b.status AS book_status, ol.name AS registered
+		FROM (
+			SELECT
+				lt.name, lt.book, lt.article, lt.library_member, lt.date,
+				lt.transaction_type, lt.status,
+				LEAD(lt.name) OVER copy_events AS next_transaction,
+				LEAD(lt.transaction_type) OVER copy_events AS next_type
+			FROM `tabLibrary Transaction` lt
+			WHERE lt.docstatus = 1 {article_condition}
+			WINDOW copy_events AS (PARTITION BY lt.book ORDER BY lt.date, lt.creation, lt.name)
+		) seq
+		LEFT JOIN `tabBook` b ON b.name = seq.book
+		LEFT JOIN `tabOpen Loan` ol ON ol.name = seq.book AND ol.issue_transaction = seq.name
+		WHERE seq.transaction_type = 'Issue' AND seq.status = 'Issued'
+		AND (
+			seq.next_transaction IS NOT NULL
+			OR b.status != 'Issued'
+			OR ol.name IS NULL
+		)
+		{member_condition}
+	""", {'article': article, 'member': member}, as_dict=True)
+
+def find_unloaned_issued_books(article=None, member=None):
+	"""Copies marked Issued that have no open loan
+
+	With `member`, only copies last issued to that member.
+	"""
+	article_condition = "AND b.article = %(article)s" if article else ""
+	member_condition = """AND %(member)s = (
+		SELECT lt.library_member
+		FROM `tabLibrary Transaction` lt
+		WHERE lt.book = b.name AND lt.transaction_type = 'Issue' AND lt.docstatus = 1
+		ORDER BY lt.date DESC
+		LIMIT 1
+	)""" if member else ""
+	return frappe.db.sql_list(f"""
+		SELECT b.name
+		FROM `tabBook` b
+		LEFT JOIN `tabOpen Loan` ol ON ol.name = b.name
+		WHERE b.status = 'Issued' AND ol.name IS NULL
+		{article_condition}
+		{member_condition}
+	""", {'article': article, 'member': member})
+
+def reconcile_circulation(repair=True, article=None, member=None):
+	"""Report circulation inconsistencies and, unless repair is False, fix them"""
+	anomalies = find_issue_anomalies(article, member)
+
+	stale = [row for row in anomalies if row.next_transaction]
+	open_loans = [row for row in anomalies if not row.next_transaction]
+	to_mark_issued = [row for row in open_loans if row.book_status == 'Available']
+	to_register = [row for row in open_loans if not row.registered]
+	# Open loans on copies in maintenance, reserved or disposed need a person
+	conflicts = [row for row in open_loans if row.book_status not in ('Issued', 'Available')]
+
+	report = frappe._dict({
+		'stale_issues': [row.name for row in stale],
+		'books_to_mark_issued': [row.book for row in to_mark_issued],
+		'loans_to_register': [row.name for row in to_register],
+		'conflicts': [{'issue': row.name, 'book': row.book, 'book_status': row.book_status} for row in conflicts],
+		'books_to_release': []
+	})
+
+	if not repair:
+		report.books_to_release = find_unloaned_issued_books(article, member)
+		return report
+
+	for batch in batches(stale):
+		close_issue_transactions([row.name for row in batch])
+		frappe.db.commit()
+
+	for batch in batches(to_register):
+		frappe.db.sql("""
+			DELETE FROM `tabOpen Loan`
+			WHERE name IN %(books)s
+		""", {'books': [row.book for row in batch]})
+		register_open_loans({
+			'book': row.book,
+			'article': row.article,
+			'library_member': row.library_member,
+			'issue_transaction': row.name,
+			'issue_date': row.date
+		} for row in batch)
+		frappe.db.commit()
+
+	for batch in batches(to_mark_issued):
+		update_books_status(lock_books([row.book for row in batch]), 'Issued')
+		frappe.db.commit()
+
+	# Computed after the registry is repaired, so only copies nobody holds are released
+	report.books_to_release = find_unloaned_issued_books(article, member)
+	for batch in batches(report.books_to_release):
+		update_books_status(lock_books(batch), 'Available')
+		frappe.db.commit()
+
+	if stale or to_register:
+		rebuild_open_loans(member)
+		frappe.db.commit()
+
+	return report
+
+def batches(rows):
+	for start in range(0, len(rows), RECONCILE_BATCH_SIZE):
+		yield rows[start:start + RECONCILE_BATCH_SIZE]
+
+def run_nightly_reconciliation():
+	"""Scheduled entry point"""
+	report = reconcile_circulation()
+	repaired = sum(len(report[key]) for key in ('stale_issues', 'loans_to_register', 'books_to_mark_issued', 'books_to_release'))
+	if repaired or report.conflicts:
+		frappe.log_error(f"Circulation reconciler repaired {repaired} records, {len(report.conflicts)} conflicts need review: {report.conflicts[:20]}")
@@ -0,0 +1,53 @@
+# Copyright (c) 2026, Vtech Technologies and contributors
+# For license information, please see license.txt
+
+"""Request-scoped write-behind for derived aggregates
+
+Controllers call mark_dirty() instead of saving a derived document right
+away. Changes are collected per aggregate and key for the current
+transaction and each dirty aggregate is handed to its flusher once, just
+before the transaction commits. A rollback discards everything that was collected.
+"""
+
+import frappe
+
+# Aggregate name -> dotted path of its flusher, called as flusher(key, changes)
+AGGREGATE_FLUSHERS = {
+	'Library Member History': 'library_management.library_management.doctype.library_member_history.library_member_history.post_history_changes',
+}
+
+def get_dirty_aggregates():
+	return getattr(frappe.local, 'library_dirty_aggregates', None)
+
+def mark_dirty(aggregate, key, change=None):
+	"""Record that `key` of `aggregate` has to be written before commit
+
+	`change` is handed to the aggregate's flusher along with every other
+	change recorded for the same key in this transaction, in order.
+	"""
+	dirty = get_dirty_aggregates()
+	if dirty is None:
+		dirty = frappe.local.library_dirty_aggregates = {}
+		frappe.db.before_commit.add(flush_dirty_aggregates)
+		frappe.db.after_rollback.add(discard_dirty_aggregates)
+
+	changes = dirty.setdefault(aggregate, {}).setdefault(key, [])
+	if change is not None:
+		changes.append(change)
+
+def flush_dirty_aggregates():
+	"""Write every dirty aggregate once
+
+	Errors are not caught: a flusher that fails aborts the commit, so the
+	transaction never lands without its derived writes.
+	"""
+	dirty = get_dirty_aggregates()
+	frappe.local.library_dirty_aggregates = None
+
+	for aggregate, keys in (dirty or {}).items():
+		flusher = frappe.get_attr(AGGREGATE_FLUSHERS[aggregate])
+		for key, changes in keys.items():
+			flusher(key, changes)
+
+def discard_dirty_aggregates():
+	frappe.local.library_dirty_aggregates = None